@@ -3,6 +3,7 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 # Temporarily disable summarizer import due to PyTorch issues
 # from app.utils.summarizer import summarize_topic
 from app.utils.news_fetcher import fetch_articles, TECH_KEYWORDS
+from app.utils.compaction import trim_to_budget, AI_CONTEXT_SUMMARY_TOKENS
 import logging
 
 # Setup logging
@@ -29,13 +30,12 @@ from app.core.auth import (
     get_current_user_email, oauth2_scheme,
     ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM
 )
-from app.db.mongodb import (
-    db, create_user, get_user_by_email, get_user_by_id,
-    update_user_read_log, get_user_stats, get_user_dashboard_analytics,
-    follow_user, unfollow_user, get_user_followers, get_user_following, get_all_users,
-    get_user_top_topics, get_recent_activity, calculate_reading_streak
-)
+# Async data access so handlers awaiting MongoDB do not block the event loop;
+# remaining blocking work (SQLite likes, embeddings, bcrypt, jobs) runs in the threadpool
+from app.db import mongodb_async
+from fastapi.concurrency import run_in_threadpool
 from app.utils.personalized_feed import get_personalized_feed
+from app.utils.user_preferences import update_user_preference
 from app.db.likes_db import like_article, unlike_article, get_liked_articles
 from datetime import timedelta, datetime
 import random
@@ -60,7 +60,12 @@ try:
 except Exception as e:
     print(f"⚠️ Warning: Gemini configuration error: {e}")
 
-summaries_collection = db['summaries']
+def record_preference(user_filter: dict, item_id: str, interaction: str):
+    """Fold an interaction into the user's preference vector without failing the request"""
+    try:
+        update_user_preference(user_filter, item_id, interaction)
+    except Exception as e:
+        logger.error(f"Error updating preference for {user_filter} ({interaction} {item_id}): {e}")
 
 class ReadSummaryRequest(BaseModel):
     summary_id: str
@@ -76,21 +81,24 @@ async def health_check():
     return {"status": "ok"}
 
 @router.get("/health/mongodb")
-def mongodb_health_check():
-    from app.db.mongodb import get_mongo_client
+async def mongodb_health_check():
     try:
-        client = get_mongo_client()
         # The 'ping' command is the most basic way to check connection
-        client.admin.command('ping')
+        await mongodb_async.ping()
         return {"mongodb": "connected"}
     except Exception as e:
         return {"mongodb": "error", "detail": str(e)}
 
+@router.get("/health/embedding-cache")
+def embedding_cache_stats():
+    from app.utils.embedder import get_cache_stats
+    return get_cache_stats()
+
 @router.post("/auth/register", response_model=Token)
 async def register(user: UserCreate):
     logger.info(f"Registration attempt for user: {user.email}")
     # Check if user already exists
-    existing_user = get_user_by_email(user.email)
+    existing_user = await mongodb_async.get_user_by_email(user.email)
     if existing_user:
         logger.warning(f"Registration failed - email already exists: {user.email}")
         raise HTTPException(
@@ -100,8 +108,8 @@ async def register(user: UserCreate):
     
     try:
         # Create new user with proper password hashing
-        hashed_password = get_password_hash(user.password)
-        new_user = create_user(user.email, hashed_password)
+        hashed_password = await run_in_threadpool(get_password_hash, user.password)
+        new_user = await mongodb_async.create_user(user.email, hashed_password)
         
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -124,7 +132,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     logger.info(f"Login attempt for user: {form_data.username}")
     
     # Get user by email
-    user = get_user_by_email(form_data.username)
+    user = await mongodb_async.get_user_by_email(form_data.username)
     if not user:
         logger.warning(f"Login failed - user not found: {form_data.username}")
         raise HTTPException(
@@ -134,7 +142,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
 
     # Verify password
-    if not verify_password(form_data.password, user["hashed_password"]):
+    if not await run_in_threadpool(verify_password, form_data.password, user["hashed_password"]):
         logger.warning(f"Login failed - incorrect password for user: {form_data.username}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -198,13 +206,13 @@ async def get_todays_summaries_for_ai():
         }
         
         # Get today's summaries, sorted by timestamp (latest first)
-        todays_summaries = list(summaries_collection.find(query).sort("date", -1).limit(10))
+        todays_summaries = await mongodb_async.find_summaries(query, 10)
         
         return [
             {
                 "topic": s.get("topic", ""),
                 "title": s.get("title", ""),
-                "summary": s.get("summary", "")[:300] + "..." if len(s.get("summary", "")) > 300 else s.get("summary", "")  # Truncate for prompt brevity
+                "summary": trim_to_budget(s.get("summary", ""), AI_CONTEXT_SUMMARY_TOKENS)  # Whole sentences within the prompt budget
             }
             for s in todays_summaries
         ]
@@ -216,22 +224,22 @@ async def get_user_liked_topics_context(user_id: str):
     """Get user's liked topics and reading preferences for AI context"""
     try:
         # Get user's top topics
-        top_topics = get_user_top_topics(user_id, limit=5)
+        top_topics = await mongodb_async.get_user_top_topics(user_id, limit=5)
         
         # Get liked articles to understand preferences
-        liked_articles = get_liked_articles(user_id)
+        liked_articles = await run_in_threadpool(get_liked_articles, user_id)
         
         # Get topics from liked articles
         liked_topics = set()
         for article_id in liked_articles[-10:]:  # Last 10 liked articles
             try:
                 # Try to find summary by ObjectId first
-                summary = summaries_collection.find_one({"_id": ObjectId(article_id)})
+                summary = await mongodb_async.find_summary(ObjectId(article_id))
                 if summary and summary.get("topic"):
                     liked_topics.add(summary["topic"])
             except:
                 # If ObjectId fails, try as string
-                summary = summaries_collection.find_one({"_id": article_id})
+                summary = await mongodb_async.find_summary(article_id)
                 if summary and summary.get("topic"):
                     liked_topics.add(summary["topic"])
         
@@ -299,7 +307,7 @@ async def ask_ai(
                 raise Exception("GEMINI_API_KEY not configured")
                 
             model = genai.GenerativeModel("models/gemini-1.5-flash-latest")
-            response = model.generate_content(full_prompt)
+            response = await model.generate_content_async(full_prompt)
             
             if response and response.text:
                 ai_response = response.text.strip()
@@ -354,7 +362,7 @@ async def ai_agent(
         user_email = current_user.get("email", "")
         
         # Get user stats
-        user_stats = get_user_stats(user_id)
+        user_stats = await mongodb_async.get_user_stats(user_id)
         total_reads = user_stats.get("total_summaries_read", 0) if user_stats else 0
         user_points = user_stats.get("points", 0) if user_stats else 0
         
@@ -408,7 +416,7 @@ async def ai_agent(
                 raise Exception("GEMINI_API_KEY not configured")
                 
             model = genai.GenerativeModel("models/gemini-1.5-pro-latest")
-            response = model.generate_content(full_prompt)
+            response = await model.generate_content_async(full_prompt)
             
             if response and response.text:
                 ai_response = response.text.strip()
@@ -467,7 +475,7 @@ async def get_summaries(
     
     # Personalized feed if user is authenticated
     if user_id:
-        summaries = get_personalized_feed(user_id)
+        summaries = await run_in_threadpool(get_personalized_feed, user_id)
         if summaries:
             return [
                 {
@@ -484,7 +492,7 @@ async def get_summaries(
         query["topic"] = topic
     
     # Get unique summaries, limit to 3 most recent, unique by title
-    recent = list(summaries_collection.find(query).sort("date", -1).limit(10))
+    recent = await mongodb_async.find_summaries(query, 10)
       # Remove duplicates and limit results
     seen_titles = set()
     unique_summaries = []
@@ -516,7 +524,7 @@ async def get_past_summaries(topic: str = None):
     query = {}
     if topic:
         query["topic"] = topic    # Return all summaries for the topic, sorted by date descending
-    past = list(summaries_collection.find(query).sort("date", -1))
+    past = await mongodb_async.find_summaries(query)
     
     return [
         {
@@ -538,7 +546,8 @@ async def like(article_id: str, token: str = Depends(oauth2_scheme)):
         user_id = payload.get("sub")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
-    like_article(user_id, article_id)
+    if await run_in_threadpool(like_article, user_id, article_id):
+        await run_in_threadpool(record_preference, {"email": user_id}, article_id, "like")
     return {"status": "liked", "article_id": article_id}
 
 @router.post("/unlike/{article_id}")
@@ -548,7 +557,8 @@ async def unlike(article_id: str, token: str = Depends(oauth2_scheme)):
         user_id = payload.get("sub")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
-    unlike_article(user_id, article_id)
+    if await run_in_threadpool(unlike_article, user_id, article_id):
+        await run_in_threadpool(record_preference, {"email": user_id}, article_id, "unlike")
     return {"status": "unliked", "article_id": article_id}
 
 @router.get("/likes")
@@ -558,7 +568,7 @@ async def get_likes(token: str = Depends(oauth2_scheme)):
         user_id = payload.get("sub")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
-    liked = get_liked_articles(user_id)
+    liked = await run_in_threadpool(get_liked_articles, user_id)
     return {"liked": liked}
 
 @router.post("/summaries/generate")
@@ -567,9 +577,10 @@ async def generate_summaries():
     try:
         # Import the function to generate summaries
         from app.utils.prefetch_job import prefetch_and_cache, check_todays_summaries
+        from app.db.mongodb import llm_cache
         
         # Check if summaries already exist for today
-        existing_count = check_todays_summaries()
+        existing_count = await run_in_threadpool(check_todays_summaries)
         
         if existing_count > 0:
             return {
@@ -579,15 +590,16 @@ async def generate_summaries():
             }
         
         # Generate new summaries
-        result = prefetch_and_cache(force=True)
+        result = await run_in_threadpool(prefetch_and_cache, force=True)
         
         # Check how many were generated
-        new_count = check_todays_summaries()
+        new_count = await run_in_threadpool(check_todays_summaries)
         
         return {
             "success": True,
             "message": f"Successfully generated {new_count} summaries",
-            "count": new_count
+            "count": new_count,
+            "llm_cache": llm_cache.stats()
         }
     except Exception as e:
         import traceback
@@ -636,7 +648,7 @@ async def get_todays_summaries():
         ]
     }
       # Get today's summaries, sorted by timestamp (latest first)
-    todays_summaries = list(summaries_collection.find(query).sort("date", -1))
+    todays_summaries = await mongodb_async.find_summaries(query)
     
     # Remove duplicates by checking title and content
     seen_titles = set()
@@ -669,7 +681,7 @@ async def get_todays_summaries():
 @router.get("/auth/me", response_model=UserResponse)
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """Get current user information"""
-    stats = get_user_stats(current_user["user_id"])
+    stats = await mongodb_async.get_user_stats(current_user["user_id"])
     if not stats:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -690,12 +702,14 @@ async def mark_summary_read(
     current_user: dict = Depends(get_current_user)
 ):
     """Mark a summary as read by the current user"""
-    result = update_user_read_log(current_user["user_id"], summary_id)
+    result = await mongodb_async.update_user_read_log(current_user["user_id"], summary_id)
     if not result["success"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=result.get("error", "Failed to update read log")
         )
+    if not result["already_read"]:
+        await run_in_threadpool(record_preference, {"user_id": current_user["user_id"]}, summary_id, "read")
     
     return {
         "message": "Summary marked as read", 
@@ -707,7 +721,7 @@ async def mark_summary_read(
 @router.get("/dashboard")
 async def get_dashboard(current_user: dict = Depends(get_current_user)):
     """Return dashboard analytics for the current user"""
-    analytics = get_user_dashboard_analytics(current_user["user_id"])
+    analytics = await mongodb_async.get_user_dashboard_analytics(current_user["user_id"])
     if not analytics:
         raise HTTPException(status_code=404, detail="Dashboard data not found")
     return {"analytics": analytics}
@@ -715,7 +729,7 @@ async def get_dashboard(current_user: dict = Depends(get_current_user)):
 @router.get("/users")
 async def get_users(limit: int = 100, current_user: dict = Depends(get_current_user)):
     """Return a list of users for discovery"""
-    users_data = get_all_users(current_user["user_id"], limit=limit)
+    users_data = await mongodb_async.get_all_users(current_user["user_id"], limit=limit)
     if users_data["success"] and "users" in users_data:
         return {"users": users_data["users"]}
     else:
@@ -725,20 +739,20 @@ async def get_users(limit: int = 100, current_user: dict = Depends(get_current_u
 @router.get("/user/{user_id}/profile")
 async def get_user_profile(user_id: str, current_user: dict = Depends(get_current_user)):
     """Return profile info for a user"""
-    user = get_user_by_id(user_id)
+    user = await mongodb_async.get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    stats = get_user_stats(user_id)
+    stats = await mongodb_async.get_user_stats(user_id)
     return {"user": {"user_id": user_id, "email": user["email"], "points": stats.get("points", 0) if stats else 0, "is_self": user_id == current_user["user_id"]}}
 
 @router.get("/user/{user_id}/followers")
 async def get_user_followers(user_id: str, current_user: dict = Depends(get_current_user)):
     """Return followers of a user"""
-    user = get_user_by_id(user_id)
+    user = await mongodb_async.get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    followers_data = get_user_followers(user_id)
+    followers_data = await mongodb_async.get_user_followers(user_id)
     if followers_data["success"]:
         return followers_data
     else:
@@ -747,11 +761,11 @@ async def get_user_followers(user_id: str, current_user: dict = Depends(get_curr
 @router.get("/user/{user_id}/following")
 async def get_user_following(user_id: str, current_user: dict = Depends(get_current_user)):
     """Return users that this user is following"""
-    user = get_user_by_id(user_id)
+    user = await mongodb_async.get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    following_data = get_user_following(user_id)
+    following_data = await mongodb_async.get_user_following(user_id)
     if following_data["success"]:
         return following_data
     else:
@@ -760,11 +774,11 @@ async def get_user_following(user_id: str, current_user: dict = Depends(get_curr
 @router.post("/follow/{target_user_id}")
 async def follow(target_user_id: str, current_user: dict = Depends(get_current_user)):
     """Follow another user"""
-    follow_user(current_user["user_id"], target_user_id)
+    await mongodb_async.follow_user(current_user["user_id"], target_user_id)
     return {"status": "followed", "target_user_id": target_user_id}
 
 @router.post("/unfollow/{target_user_id}")
 async def unfollow(target_user_id: str, current_user: dict = Depends(get_current_user)):
     """Unfollow another user"""
-    unfollow_user(current_user["user_id"], target_user_id)
+    await mongodb_async.unfollow_user(current_user["user_id"], target_user_id)
     return {"status": "unfollowed", "target_user_id": target_user_id}
\ No newline at end of file
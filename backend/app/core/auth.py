@@ -107,12 +107,12 @@ def get_current_user_email(token: str = Depends(oauth2_scheme)) -> str:
     
     return email
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     """Dependency to get current user data"""
-    from app.db.mongodb import get_user_by_email
+    from app.db.mongodb_async import get_user_by_email
     
     email = get_current_user_email(token)
-    user = get_user_by_email(email)
+    user = await get_user_by_email(email)
     
     if user is None:
         raise HTTPException(
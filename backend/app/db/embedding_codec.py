@@ -0,0 +1,71 @@
+import os
+import struct
+from typing import Optional
+
+import numpy as np
+from bson.binary import Binary
+
+#how save_summary persists embeddings: "list" (BSON array of doubles), "float32",
+#"float16" or "int8" (packed into BSON Binary). Readers accept every format.
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "list")
+
+#user-defined BSON binary subtype for packed embeddings
+EMBEDDING_BINARY_SUBTYPE = 0x80
+
+_FORMAT_TAGS = {"float32": 1, "float16": 2, "int8": 3}
+_TAG_FORMATS = {tag: name for name, tag in _FORMAT_TAGS.items()}
+
+
+def encode_embedding(embedding, storage: str = None):
+    """Pack an embedding for MongoDB in the requested storage format."""
+    storage = storage or EMBEDDING_STORAGE
+    if embedding is None:
+        return None
+    if storage == "list":
+        return [float(x) for x in embedding]
+    if storage not in _FORMAT_TAGS:
+        raise ValueError(f"Unknown embedding storage format: {storage}")
+
+    vector = np.asarray(embedding, dtype=np.float32)
+    header = bytes([_FORMAT_TAGS[storage]])
+    if storage == "float32":
+        payload = vector.astype("<f4").tobytes()
+    elif storage == "float16":
+        payload = vector.astype("<f2").tobytes()
+    else:
+        #symmetric int8 quantization with one float32 scale per vector
+        peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        payload = struct.pack("<f", scale) + quantized.tobytes()
+    return Binary(header + payload, EMBEDDING_BINARY_SUBTYPE)
+
+
+def embedding_format(value) -> Optional[str]:
+    """Name of the storage format a stored embedding is in, or None if absent."""
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return _TAG_FORMATS.get(value[0]) if len(value) else None
+    return "list"
+
+
+def decode_embedding(value) -> Optional[np.ndarray]:
+    """Turn a stored embedding (array or packed Binary) back into a float32 vector."""
+    if value is None:
+        return None
+    if not isinstance(value, (bytes, bytearray)):
+        return np.asarray(value, dtype=np.float32)
+    if not len(value):
+        return None
+
+    storage = _TAG_FORMATS.get(value[0])
+    body = memoryview(value)[1:]
+    if storage == "float32":
+        return np.frombuffer(body, dtype="<f4").astype(np.float32)
+    if storage == "float16":
+        return np.frombuffer(body, dtype="<f2").astype(np.float32)
+    if storage == "int8":
+        (scale,) = struct.unpack("<f", body[:4])
+        return np.frombuffer(body[4:], dtype=np.int8).astype(np.float32) * np.float32(scale)
+    raise ValueError(f"Unknown embedding format tag: {value[0]}")
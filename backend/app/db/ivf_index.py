@@ -0,0 +1,167 @@
+import os
+import logging
+import tempfile
+from array import array
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("ivf_index")
+
+#rows scored per block when assigning vectors to centroids
+_ASSIGN_CHUNK = 16384
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN structure over the rows of a SummaryIndex matrix.
+
+    Rows are clustered around spherical k-means centroids; a query only scores
+    the rows in its `nprobe` closest lists, so raising nprobe trades latency
+    for recall. The index stores row positions, not vectors, and is kept in
+    step with the owning matrix through add() and compact().
+    """
+
+    def __init__(self, nprobe: int = 8, nlist: Optional[int] = None):
+        self.nprobe = nprobe
+        self.nlist = nlist
+        self.centroids = None
+        self._assignments = array("i")
+        self._lists: List[array] = []
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self._assignments)
+
+    def train(self, matrix: np.ndarray, nlist: Optional[int] = None, iterations: int = 20,
+              sample_size: int = 100_000, seed: int = 0):
+        """Fit centroids with spherical k-means on (a sample of) normalized rows, then assign every row."""
+        rng = np.random.default_rng(seed)
+        n = matrix.shape[0]
+        nlist = nlist or self.nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+        sample = matrix if n <= sample_size else matrix[rng.choice(n, sample_size, replace=False)]
+
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = self._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                #re-seed empty clusters from random sample rows
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        self.centroids = centroids
+        self.nlist = nlist
+        self._assignments = array("i")
+        self._lists = [array("q") for _ in range(nlist)]
+        self.add(matrix, 0)
+        logger.info(f"Trained IVF index with {nlist} lists over {n} rows")
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        labels = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], _ASSIGN_CHUNK):
+            block = vectors[start:start + _ASSIGN_CHUNK]
+            labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return labels
+
+    def add(self, vectors: np.ndarray, start_row: int):
+        """Assign rows start_row.. (already appended to the owning matrix) to their lists."""
+        if not self.trained or not len(vectors):
+            return
+        if start_row != len(self._assignments):
+            raise ValueError(f"IVF index out of step: expected row {len(self._assignments)}, got {start_row}")
+        labels = self._nearest(vectors, self.centroids)
+        self._assignments.extend(labels.astype(np.int32).tolist())
+        for offset, label in enumerate(labels.tolist()):
+            self._lists[label].append(start_row + offset)
+
+    def _labels(self) -> np.ndarray:
+        if not len(self._assignments):
+            return np.empty(0, dtype=np.int32)
+        return np.frombuffer(self._assignments, dtype=np.int32)
+
+    def set_assignments(self, assignments: np.ndarray):
+        self._assignments = array("i", np.asarray(assignments, dtype=np.int32).tolist())
+        self._rebuild_lists()
+
+    def _rebuild_lists(self):
+        labels = self._labels()
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(self.nlist + 1))
+        self._lists = [array("q", order[bounds[i]:bounds[i + 1]].tolist()) for i in range(self.nlist)]
+
+    def compact(self, keep: List[int]):
+        """Mirror a row compaction in the owning matrix (rows `keep` survive, in order)."""
+        if not self.trained:
+            return
+        self.set_assignments(self._labels()[keep])
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Row positions in the `nprobe` lists closest to a normalized query."""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        sims = self.centroids @ query
+        probe = np.argpartition(-sims, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        parts = [np.frombuffer(self._lists[i], dtype=np.int64) for i in probe if len(self._lists[i])]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+    def assignments(self) -> np.ndarray:
+        """Copy of each row's list id, safe to use while rows keep being added."""
+        return self._labels().copy()
+
+    def save(self, path: str, ids: list, assignments: np.ndarray):
+        """Persist centroids and row assignments keyed by summary id (atomic replace)."""
+        #a temp file of our own, so processes saving at the same time never share one
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                        prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    centroids=self.centroids,
+                    ids=np.array([str(i) for i in ids[:len(assignments)]]),
+                    assignments=assignments,
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def load(self, path: str, ids: list, matrix: np.ndarray) -> bool:
+        """
+        Restore a saved index for the current rows. Rows the file does not know
+        about are assigned fresh; returns False if no usable file exists.
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as data:
+                centroids = data["centroids"]
+                saved = dict(zip(data["ids"].tolist(), data["assignments"].tolist()))
+        except Exception as e:
+            logger.warning(f"Could not read IVF index {path}: {e}")
+            return False
+        if centroids.shape[1] != matrix.shape[1]:
+            logger.warning(f"IVF index {path} has dim {centroids.shape[1]}, expected {matrix.shape[1]}")
+            return False
+
+        self.centroids = centroids.astype(np.float32)
+        self.nlist = centroids.shape[0]
+        assignments = np.array([saved.get(str(i), -1) for i in ids], dtype=np.int32)
+        unknown = np.flatnonzero(assignments < 0)
+        if len(unknown):
+            assignments[unknown] = self._nearest(matrix[unknown], self.centroids)
+        self.set_assignments(assignments)
+        logger.info(f"Loaded IVF index from {path} ({len(unknown)} of {len(ids)} rows newly assigned)")
+        return True
@@ -0,0 +1,183 @@
+"""
+Checkpoint records for the batch jobs.
+
+A run document in `job_runs` tracks one execution of a job. Each unit of
+work (an article, a topic) is a document in `job_run_items` whose `state`
+advances through the job's stages, with whatever the stage produced stored
+alongside it. A job restarted with --resume picks up the latest unfinished
+run and only redoes items that had not reached the final state.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import pytz
+from bson import ObjectId
+from pymongo import UpdateOne, ASCENDING, DESCENDING
+
+from app.db.mongodb import db
+
+logger = logging.getLogger("job_runs")
+
+runs_collection = db['job_runs']
+items_collection = db['job_run_items']
+
+#per-article stages of the summary pipelines, in order
+ARTICLE_STATES = ("fetched", "summarized", "embedded", "stored")
+
+_indexed = False
+
+
+def _ensure_indexes():
+    global _indexed
+    if _indexed:
+        return
+    runs_collection.create_index([("job", ASCENDING), ("started_at", DESCENDING)])
+    items_collection.create_index([("run_id", ASCENDING), ("key", ASCENDING)], unique=True)
+    items_collection.create_index([("run_id", ASCENDING), ("state", ASCENDING)])
+    _indexed = True
+
+
+def start_run(job: str, params: dict = None) -> str:
+    """Create a run record and return its id."""
+    _ensure_indexes()
+    now = datetime.now(pytz.UTC)
+    run_id = str(ObjectId())
+    runs_collection.insert_one({
+        "_id": run_id,
+        "job": job,
+        "status": "running",
+        "params": params or {},
+        "started_at": now,
+        "updated_at": now,
+    })
+    return run_id
+
+
+def latest_run(job: str, unfinished_only: bool = False) -> Optional[dict]:
+    """Most recent run of `job`; with unfinished_only, one that crashed or failed."""
+    query = {"job": job}
+    if unfinished_only:
+        query["status"] = {"$in": ["running", "failed"]}
+    return runs_collection.find_one(query, sort=[("started_at", DESCENDING)])
+
+
+def resume_or_start(job: str, resume: bool, params: dict = None):
+    """(run_id, resumed) — the latest unfinished run when resuming, else a new one."""
+    if resume:
+        run = latest_run(job, unfinished_only=True)
+        if run:
+            runs_collection.update_one(
+                {"_id": run["_id"]},
+                {"$set": {"status": "running", "updated_at": datetime.now(pytz.UTC)}, "$inc": {"attempts": 1}}
+            )
+            logger.info(f"Resuming {job} run {run['_id']}")
+            return run["_id"], True
+        logger.info(f"No unfinished {job} run to resume; starting a new one")
+    return start_run(job, params), False
+
+
+def add_items(run_id: str, items: Dict[str, dict], state: str):
+    """Record new work items (key -> payload); items already in the run are left as they are."""
+    if not items:
+        return
+    now = datetime.now(pytz.UTC)
+    ops = [
+        UpdateOne(
+            {"run_id": run_id, "key": key},
+            {"$setOnInsert": {"run_id": run_id, "key": key, "state": state, "payload": payload, "updated_at": now}},
+            upsert=True
+        )
+        for key, payload in items.items()
+    ]
+    items_collection.bulk_write(ops, ordered=False)
+
+
+def advance_items(run_id: str, results: Dict[str, dict], state: str):
+    """Move items to `state`, storing each item's stage output under `result`."""
+    if not results:
+        return
+    now = datetime.now(pytz.UTC)
+    ops = [
+        UpdateOne(
+            {"run_id": run_id, "key": key},
+            {"$set": {"state": state, "result": result, "updated_at": now}}
+        )
+        for key, result in results.items()
+    ]
+    items_collection.bulk_write(ops, ordered=False)
+    runs_collection.update_one({"_id": run_id}, {"$set": {"updated_at": now}})
+
+
+def get_items(run_id: str, states: Iterable[str] = None, keys: Iterable[str] = None) -> List[dict]:
+    query = {"run_id": run_id}
+    if states is not None:
+        query["state"] = {"$in": list(states)}
+    if keys is not None:
+        query["key"] = {"$in": list(keys)}
+    return list(items_collection.find(query).sort("_id", ASCENDING))
+
+
+def update_run(run_id: str, **fields):
+    """Set extra fields on a run record."""
+    runs_collection.update_one({"_id": run_id}, {"$set": {**fields, "updated_at": datetime.now(pytz.UTC)}})
+
+
+def _finish_update(status: str, summary: dict = None) -> dict:
+    update = {"status": status, "updated_at": datetime.now(pytz.UTC)}
+    if status == "completed":
+        update["finished_at"] = update["updated_at"]
+    if summary:
+        update["summary"] = summary
+    return update
+
+
+def finish_run(run_id: str, status: str = "completed", summary: dict = None):
+    runs_collection.update_one({"_id": run_id}, {"$set": _finish_update(status, summary)})
+
+
+def finish_run_once(run_id: str, status: str = "completed", summary: dict = None) -> bool:
+    """Finish a running run; when several workers race to finish it, True only for the one that did."""
+    result = runs_collection.update_one(
+        {"_id": run_id, "status": "running"}, {"$set": _finish_update(status, summary)}
+    )
+    return result.modified_count == 1
+
+
+def run_status(run: dict) -> dict:
+    """Run record plus a count of its items in each state."""
+    counts = {
+        row["_id"]: row["count"]
+        for row in items_collection.aggregate([
+            {"$match": {"run_id": run["_id"]}},
+            {"$group": {"_id": "$state", "count": {"$sum": 1}}},
+        ])
+    }
+    return {
+        "run_id": run["_id"],
+        "job": run["job"],
+        "status": run["status"],
+        "started_at": run["started_at"],
+        "updated_at": run.get("updated_at"),
+        "attempts": run.get("attempts", 0) + 1,
+        "items": counts,
+        "summary": run.get("summary", {}),
+    }
+
+
+def format_run_status(job: str) -> str:
+    """Human-readable status of the latest run of `job`, for the jobs' --status flag."""
+    run = latest_run(job)
+    if not run:
+        return f"No {job} runs recorded"
+    status = run_status(run)
+    lines = [
+        f"{job} run {status['run_id']}: {status['status']} (attempt {status['attempts']})",
+        f"  started {status['started_at'].isoformat()}, last update {status['updated_at'].isoformat()}",
+    ]
+    order = {state: i for i, state in enumerate(ARTICLE_STATES)}
+    for state, count in sorted(status["items"].items(), key=lambda item: order.get(item[0], len(order))):
+        lines.append(f"  {state}: {count}")
+    if status["summary"]:
+        lines.append("  summary: " + ", ".join(f"{key}={value}" for key, value in status["summary"].items()))
+    return "\n".join(lines)
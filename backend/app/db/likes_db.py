@@ -1,7 +1,5 @@
 import sqlite3
 import os
-import numpy as np
-from app.utils.embedder import get_embedding
 
 db_path = os.path.join(os.path.dirname(__file__), "likes.db")
 
@@ -20,12 +18,14 @@ def like_article(user_id: str, article_id: str):
         c = conn.cursor()
         c.execute("INSERT OR IGNORE INTO likes (user_id, article_id) VALUES (?, ?)", (user_id, article_id))
         conn.commit()
+        return c.rowcount > 0
 
 def unlike_article(user_id: str, article_id: str):
     with sqlite3.connect(db_path) as conn:
         c = conn.cursor()
         c.execute("DELETE FROM likes WHERE user_id = ? AND article_id = ?", (user_id, article_id))
         conn.commit()
+        return c.rowcount > 0
 
 def get_liked_articles(user_id: str):
     with sqlite3.connect(db_path) as conn:
@@ -0,0 +1,99 @@
+import os
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import pytz
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger("llm_cache")
+
+#cached results older than this are dropped by a TTL index; 0 keeps them forever
+LLM_CACHE_TTL_DAYS = int(os.getenv("LLM_CACHE_TTL_DAYS", "30"))
+#set to "false" to always call the model (e.g. when iterating on prompts)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() != "false"
+
+
+def llm_cache_key(prompt_version: str, model_name: str, source: str, content: str) -> str:
+    """Content hash identifying one LLM result: prompt template version, model, source URL and text."""
+    return hashlib.sha256(
+        "\0".join((prompt_version, model_name, source or "", content or "")).encode("utf-8")
+    ).hexdigest()
+
+
+class LLMResultCache:
+    """
+    Persistent cache of generated summaries keyed by llm_cache_key, so reruns
+    only pay for new or changed articles. Lookups count hits and misses for
+    the run summary; MongoDB errors are logged and treated as misses.
+    """
+
+    def __init__(self, collection, enabled: bool = LLM_CACHE_ENABLED, ttl_days: int = LLM_CACHE_TTL_DAYS):
+        self.collection = collection
+        self.enabled = enabled
+        self.ttl_days = ttl_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._indexed = False
+
+    def _ensure_index(self):
+        if self._indexed or not self.ttl_days:
+            return
+        self.collection.create_index("created_at", expireAfterSeconds=int(timedelta(days=self.ttl_days).total_seconds()))
+        self._indexed = True
+
+    def _count(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        """Cached results for the keys that have one."""
+        if not self.enabled or not keys:
+            return {}
+        try:
+            found = {doc["_id"]: doc["result"] for doc in self.collection.find({"_id": {"$in": list(set(keys))}})}
+        except PyMongoError as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            found = {}
+        hits = sum(1 for key in keys if key in found)
+        self._count(hits, len(keys) - hits)
+        return found
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, entries: Dict[str, dict]):
+        if not self.enabled or not entries:
+            return
+        now = datetime.now(pytz.UTC)
+        ops = [
+            UpdateOne({"_id": key}, {"$set": {"result": result, "created_at": now}}, upsert=True)
+            for key, result in entries.items()
+        ]
+        try:
+            self._ensure_index()
+            self.collection.bulk_write(ops, ordered=False)
+        except PyMongoError as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def put(self, key: str, result: dict):
+        self.put_many({key: result})
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,67 @@
+"""
+Rewrite stored summary embeddings into another storage format, in batches.
+
+    python -m app.db.migrate_embeddings --format float32 --batch-size 500
+
+Documents already in the target format are skipped, so an interrupted run
+can simply be started again (or resumed from the last logged id with
+--start-after).
+"""
+import argparse
+import logging
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.db.mongodb import summaries_collection
+from app.db.embedding_codec import encode_embedding, decode_embedding, embedding_format
+
+logger = logging.getLogger("migrate_embeddings")
+
+
+def migrate_embeddings(storage: str, batch_size: int = 500, start_after: str = None, dry_run: bool = False) -> dict:
+    query = {"embedding": {"$exists": True}}
+    if start_after:
+        query["_id"] = {"$gt": ObjectId(start_after)}
+
+    cursor = summaries_collection.find(query, {"embedding": 1}, batch_size=batch_size).sort("_id", 1)
+    scanned = rewritten = 0
+    ops = []
+    last_id = None
+
+    def flush():
+        nonlocal ops
+        if ops and not dry_run:
+            summaries_collection.bulk_write(ops, ordered=False)
+        ops = []
+        logger.info(f"Scanned {scanned}, rewrote {rewritten}, last _id {last_id}")
+
+    for doc in cursor:
+        scanned += 1
+        last_id = doc["_id"]
+        value = doc.get("embedding")
+        if embedding_format(value) == storage:
+            continue
+        vector = decode_embedding(value)
+        if vector is None:
+            continue
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"embedding": encode_embedding(vector, storage)}}))
+        rewritten += 1
+        if len(ops) >= batch_size:
+            flush()
+    flush()
+
+    return {"scanned": scanned, "rewritten": rewritten, "last_id": str(last_id) if last_id else None}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert stored summary embeddings to another format")
+    parser.add_argument("--format", required=True, choices=["list", "float32", "float16", "int8"],
+                        help="Target storage format")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per bulk_write")
+    parser.add_argument("--start-after", help="Resume after this summary _id")
+    parser.add_argument("--dry-run", action="store_true", help="Count documents without writing")
+
+    args = parser.parse_args()
+    result = migrate_embeddings(args.format, args.batch_size, args.start_after, args.dry_run)
+    print(f"Migration finished: {result}")
@@ -8,6 +8,9 @@ from typing import Optional, Dict, List
 from collections import defaultdict, Counter
 import statistics
 import logging
+from app.db.summary_index import SummaryIndex
+from app.db.embedding_codec import encode_embedding
+from app.db.llm_cache import LLMResultCache
 
 # Setup logging
 logging.basicConfig(
@@ -25,6 +28,12 @@ db = client.get_default_database()
 summaries_collection = db['summaries']
 users_collection = db['users']
 
+#resident embedding matrix used by get_similar_summaries, loaded lazily on first search
+summary_index = SummaryIndex(summaries_collection)
+
+#generated summaries keyed by content hash, consulted before calling Gemini
+llm_cache = LLMResultCache(db['llm_cache'])
+
 
 def save_summary(topic: str, summary: dict, embedding: list, articles: list):
     doc = {
@@ -33,149 +42,87 @@ def save_summary(topic: str, summary: dict, embedding: list, articles: list):
         "title": summary.get("title", topic.title()),
         "sources": summary.get("sources", []),
         "urlToImage": summary.get("urlToImage", ""),  # Include the image URL
-        "embedding": embedding,
+        "embedding": encode_embedding(embedding),
+        "embedded_at": datetime.now(pytz.UTC),
         "articles": articles,
         "date": datetime.now(pytz.UTC)  # Use timezone-aware datetime
     }
-    return summaries_collection.insert_one(doc)
+    result = summaries_collection.insert_one(doc)
+    summary_index.add(result.inserted_id, embedding)
+    return result
+
+
+def summary_embedding_text(doc: dict) -> str:
+    """Text a summary document is embedded from."""
+    return f"{doc.get('title', '')}\n{doc.get('summary', '')}"
+
+
+def attach_summary_embeddings(docs: list) -> int:
+    """Batch-embed summary documents in place (title + summary); returns how many were embedded."""
+    from app.utils.embedder import get_embeddings
+    if not docs:
+        return 0
+    vectors = get_embeddings([summary_embedding_text(doc) for doc in docs])
+    embedded_at = datetime.now(pytz.UTC)
+    for doc, vector in zip(docs, vectors):
+        doc["embedding"] = encode_embedding(vector)
+        doc["embedded_at"] = embedded_at
+    return len(docs)
 
 
 def get_recent_summaries(limit: int = 10):
     return list(summaries_collection.find().sort("date", -1).limit(limit))
 
+def _fetch_hits(hits: list, retry):
+    """Load summary documents for index hits, keeping the index's ranking."""
+    if not hits:
+        return []
+    ids = [summary_id for summary_id, _ in hits]
+    docs = {doc["_id"]: doc for doc in summaries_collection.find({"_id": {"$in": ids}})}
+    missing = [summary_id for summary_id in ids if summary_id not in docs]
+    if missing:
+        #summaries deleted since the index was loaded
+        summary_index.remove(missing)
+        if len(summary_index):
+            return retry()
+    return [docs[summary_id] for summary_id in ids if summary_id in docs]
+
 #get summaries by vector similarity (cosine)
 def get_similar_summaries(embedding: list, limit: int = 3):
-    import numpy as np
-    all_summaries = list(summaries_collection.find())
-    def cosine(a, b):
-        a, b = np.array(a), np.array(b)
-        return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
-    scored = [(cosine(embedding, s["embedding"]), s) for s in all_summaries if s.get("embedding")]
-    scored.sort(reverse=True, key=lambda x: x[0])
-    return [s for _, s in scored[:limit]]
+    hits = summary_index.search(embedding, limit=limit)
+    return _fetch_hits(hits, lambda: get_similar_summaries(embedding, limit))
+
+#top `limit` summaries for each query embedding, merged and deduplicated, scored in one pass
+def get_similar_summaries_many(embeddings, limit: int = 3):
+    hits = summary_index.search_many(embeddings, limit=limit)
+    return _fetch_hits(hits, lambda: get_similar_summaries_many(embeddings, limit))
 
 def get_mongo_client():
     return client
 
-# User Management Functions
-def create_user(email: str, hashed_password: str) -> Dict:
-    """Create a new user in MongoDB"""
-    try:
-        # Check for duplicate users first
-        if get_user_by_email(email):
-            logger.warning(f"Attempted to create duplicate user: {email}")
-            return None
-            
-        user_doc = {
-            "user_id": str(ObjectId()),
-            "email": email,
-            "hashed_password": hashed_password,
-            "points": 0,
-            "summaries_read": [],
-            "daily_read_log": {},
-            "streak": {
-                "current": 0,
-                "max": 0,
-                "last_read_date": None
-            },
-            "followers": [],
-            "following": [],
-            "created_at": datetime.now(pytz.UTC),
-            "updated_at": datetime.now(pytz.UTC)
-        }
-        
-        logger.info(f"Creating new user: {email}")
-        result = users_collection.insert_one(user_doc)
-        user_doc["_id"] = str(result.inserted_id)
-        logger.info(f"User created successfully: {email} (ID: {user_doc['user_id']})")
-        
-        return user_doc
-    except Exception as e:
-        logger.error(f"Error creating user {email}: {str(e)}")
-        return None
-
-def get_user_by_email(email: str) -> Optional[Dict]:
-    """Get user by email"""
-    try:
-        logger.debug(f"Looking up user by email: {email}")
-        user = users_collection.find_one({"email": email})
-        if user:
-            user["_id"] = str(user["_id"])
-            logger.debug(f"User found: {email}")
-            return user
-        logger.debug(f"User not found: {email}")
-        return None
-    except Exception as e:
-        logger.error(f"Error looking up user by email {email}: {str(e)}")
-        return None
-
-def get_user_by_id(user_id: str) -> Optional[Dict]:
-    """Get user by user_id"""
-    user = users_collection.find_one({"user_id": user_id})
-    if user:
-        user["_id"] = str(user["_id"])
-    return user
-
-def update_user_read_log(user_id: str, summary_id: str) -> Dict:
-    """Update user's read log when they read a summary"""
-    today = datetime.now(pytz.timezone('US/Central')).strftime('%Y-%m-%d')
-    read_time = datetime.now(pytz.timezone('US/Central'))
-    
-    # Check if summary is already read to avoid duplicate points
-    user = users_collection.find_one({"user_id": user_id})
-    if not user:
-        return {"success": False, "error": "User not found"}
-    
-    if summary_id in user.get("summaries_read", []):
-        return {"success": True, "already_read": True, "points_awarded": 0}
-    
-    # Add summary to read list if not already there
-    add_result = users_collection.update_one(
-        {"user_id": user_id},
-        {"$addToSet": {"summaries_read": summary_id}}
-    )
-      # Update daily read count and points only if summary was actually added
-    if add_result.modified_count > 0:
-        # Update reading streak
-        streak_result = update_reading_streak(user_id, read_time)
-        update_result = users_collection.update_one(
-            {"user_id": user_id},
-            {
-                "$inc": {f"daily_read_log.{today}": 1, "points": 1},
-                "$set": {"updated_at": datetime.now(pytz.UTC)}
-            }
-        )
-        return {
-            "success": True, 
-            "already_read": False, 
-            "points_awarded": 1,
-            "updated": update_result.modified_count > 0,
-            "streak": {
-                "current": streak_result.get("current_streak", 0),
-                "max": streak_result.get("max_streak", 0),
-                "updated": streak_result.get("streak_updated", False)
-            }
-        }
-    else:
-        # Summary already read, get current streak info
-        current_streak = user.get("streak", {"current": 0, "max": 0, "last_read_date": None})
-        return {
-            "success": True, 
-            "already_read": True, 
-            "points_awarded": 0,
-            "streak": {
-                "current": current_streak.get("current", 0),
-                "max": current_streak.get("max", 0),
-                "updated": False
-            }
-        }
+# Document building and analytics shared with app.db.mongodb_async; no I/O below until
+# the user management functions
+def new_user_doc(email: str, hashed_password: str) -> Dict:
+    return {
+        "user_id": str(ObjectId()),
+        "email": email,
+        "hashed_password": hashed_password,
+        "points": 0,
+        "summaries_read": [],
+        "daily_read_log": {},
+        "streak": {
+            "current": 0,
+            "max": 0,
+            "last_read_date": None
+        },
+        "followers": [],
+        "following": [],
+        "created_at": datetime.now(pytz.UTC),
+        "updated_at": datetime.now(pytz.UTC)
+    }
 
-def get_user_stats(user_id: str) -> Optional[Dict]:
-    """Get user statistics"""
-    user = get_user_by_id(user_id)
-    if not user:
-        return None
-    
+def user_stats(user: Dict) -> Dict:
+    """Statistics for a user document"""
     today = datetime.now(pytz.timezone('US/Central')).strftime('%Y-%m-%d')
     today_reads = user.get("daily_read_log", {}).get(today, 0)
     total_reads = len(user.get("summaries_read", []))
@@ -193,97 +140,51 @@ def get_user_stats(user_id: str) -> Optional[Dict]:
         "streak": streak_data
     }
 
-def get_user_dashboard_analytics(user_id: str) -> Optional[Dict]:
-    """Get comprehensive dashboard analytics for a user"""
-    user = get_user_by_id(user_id)
-    if not user:
-        return None
-    
-    central = pytz.timezone('US/Central')
+def read_averages(daily_read_log: Dict) -> tuple:
+    """(average daily reads, average weekly reads) from a daily read log"""
+    if not daily_read_log:
+        return 0, 0
     
-    # Basic stats
-    total_summaries_read = len(user.get("summaries_read", []))
-    total_points = user.get("points", 0)
-    daily_read_log = user.get("daily_read_log", {})
+    daily_counts = list(daily_read_log.values())
+    avg_daily_reads = round(statistics.mean(daily_counts), 2)
     
-    # Calculate average daily/weekly reads
-    if daily_read_log:
-        daily_counts = list(daily_read_log.values())
-        avg_daily_reads = round(statistics.mean(daily_counts), 2)
+    # Calculate weekly average (group days into weeks)
+    weekly_totals = []
+    sorted_dates = sorted(daily_read_log.keys())
+    if sorted_dates:
+        start_date = datetime.strptime(sorted_dates[0], '%Y-%m-%d').date()
+        end_date = datetime.strptime(sorted_dates[-1], '%Y-%m-%d').date()
         
-        # Calculate weekly average (group days into weeks)
-        weekly_totals = []
-        sorted_dates = sorted(daily_read_log.keys())
-        if sorted_dates:
-            start_date = datetime.strptime(sorted_dates[0], '%Y-%m-%d').date()
-            end_date = datetime.strptime(sorted_dates[-1], '%Y-%m-%d').date()
+        current_week_start = start_date
+        while current_week_start <= end_date:
+            week_end = current_week_start + timedelta(days=6)
+            week_total = 0
             
-            current_week_start = start_date
-            while current_week_start <= end_date:
-                week_end = current_week_start + timedelta(days=6)
-                week_total = 0
-                
-                for date_str, count in daily_read_log.items():
-                    date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-                    if current_week_start <= date_obj <= week_end:
-                        week_total += count
-                
-                if week_total > 0:  # Only count weeks with activity
-                    weekly_totals.append(week_total)
-                
-                current_week_start = week_end + timedelta(days=1)
-        
-        avg_weekly_reads = round(statistics.mean(weekly_totals), 2) if weekly_totals else 0
-    else:
-        avg_daily_reads = 0
-        avg_weekly_reads = 0
-    
-    # Get top liked topics by analyzing read summaries
-    top_topics = get_user_top_topics(user_id)
-      # Get most active time of day (mock data for now - would need read timestamps)
-    most_active_time = get_user_active_time_analysis(user_id)
-    
-    # Reading streak calculation
-    reading_streak = calculate_reading_streak(user)
-    
-    # Recent activity (last 7 days)
-    recent_activity = get_recent_activity(daily_read_log, 7)
+            for date_str, count in daily_read_log.items():
+                date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+                if current_week_start <= date_obj <= week_end:
+                    week_total += count
+            
+            if week_total > 0:  # Only count weeks with activity
+                weekly_totals.append(week_total)
+            
+            current_week_start = week_end + timedelta(days=1)
     
-    return {
-        "user_id": user_id,
-        "total_summaries_read": total_summaries_read,
-        "total_points": total_points,
-        "avg_daily_reads": avg_daily_reads,
-        "avg_weekly_reads": avg_weekly_reads,
-        "top_topics": top_topics,
-        "most_active_time": most_active_time,
-        "reading_streak": reading_streak,
-        "recent_activity": recent_activity,
-        "daily_read_log": daily_read_log
-    }
+    avg_weekly_reads = round(statistics.mean(weekly_totals), 2) if weekly_totals else 0
+    return avg_daily_reads, avg_weekly_reads
 
-def get_user_top_topics(user_id: str, limit: int = 5) -> List[Dict]:
-    """Get user's most read topics"""
-    user = get_user_by_id(user_id)
-    if not user:
-        return []
-    
-    summaries_read = user.get("summaries_read", [])
-    if not summaries_read:
-        return []
-    
-    # Get topics for read summaries
-    topic_counts = Counter()
-    
-    for summary_id in summaries_read:
+def summary_object_ids(summary_ids: List[str]) -> List[ObjectId]:
+    """ObjectIds for summary id strings, skipping invalid ones"""
+    ids = []
+    for summary_id in summary_ids:
         try:
-            summary = summaries_collection.find_one({"_id": ObjectId(summary_id)})
-            if summary and summary.get("topic"):
-                topic_counts[summary["topic"]] += 1
-        except:
+            ids.append(ObjectId(summary_id))
+        except Exception:
             continue  # Skip invalid ObjectIds
-    
-    # Convert to list of dicts with percentages
+    return ids
+
+def rank_topics(topic_counts: Counter, limit: int = 5) -> List[Dict]:
+    """Most common topics with their share of all reads"""
     total_reads = sum(topic_counts.values())
     top_topics = []
     
@@ -297,12 +198,10 @@ def get_user_top_topics(user_id: str, limit: int = 5) -> List[Dict]:
     
     return top_topics
 
-def get_user_active_time_analysis(user_id: str) -> Dict:
-    """Analyze most active reading times (simplified version)"""
+def active_time(user: Optional[Dict]) -> Dict:
+    """Most active reading time (simplified version)"""
     # For now, return mock data based on typical patterns
     # In a real implementation, you'd store read timestamps
-    
-    user = get_user_by_id(user_id)
     if not user:
         return {"hour": 9, "period": "morning", "description": "9:00 AM"}
     
@@ -316,6 +215,32 @@ def get_user_active_time_analysis(user_id: str) -> Dict:
     else:
         return {"hour": 19, "period": "evening", "description": "7:00 PM"}
 
+def dashboard_analytics(user_id: str, user: Dict, top_topics: List[Dict]) -> Dict:
+    """Dashboard analytics for a user document and their top topics"""
+    # Basic stats
+    total_summaries_read = len(user.get("summaries_read", []))
+    total_points = user.get("points", 0)
+    daily_read_log = user.get("daily_read_log", {})
+    
+    # Calculate average daily/weekly reads
+    avg_daily_reads, avg_weekly_reads = read_averages(daily_read_log)
+    
+    return {
+        "user_id": user_id,
+        "total_summaries_read": total_summaries_read,
+        "total_points": total_points,
+        "avg_daily_reads": avg_daily_reads,
+        "avg_weekly_reads": avg_weekly_reads,
+        "top_topics": top_topics,
+        # Most active time of day (mock data for now - would need read timestamps)
+        "most_active_time": active_time(user),
+        # Reading streak calculation
+        "reading_streak": calculate_reading_streak(user),
+        # Recent activity (last 7 days)
+        "recent_activity": get_recent_activity(daily_read_log, 7),
+        "daily_read_log": daily_read_log
+    }
+
 def calculate_reading_streak(user_data: Dict) -> Dict:
     """Calculate current and longest reading streak using new streak field"""
     # First try to get streak data from the new field
@@ -408,23 +333,257 @@ def get_recent_activity(daily_read_log: Dict, days: int = 7) -> List[Dict]:
     
     return list(reversed(recent_activity))  # Oldest first
 
-# Follow/Unfollow Functions
-def follow_user(follower_id: str, target_user_id: str) -> Dict:
-    """Follow a user"""
-    # Check if both users exist
-    follower = get_user_by_id(follower_id)
-    target_user = get_user_by_id(target_user_id)
+def next_streak(user: Dict, read_date: datetime) -> Dict:
+    """
+    Streak after a read on `read_date`: current and max counts, the Central
+    Time date string, and whether anything changed (not for a same-day read)
+    """
+    # Get current streak data, with defaults if not present (for existing users)
+    current_streak = user.get("streak", {})
+    if not current_streak:
+        current_streak = {"current": 0, "max": 0, "last_read_date": None}
+    
+    current_count = current_streak.get("current", 0)
+    max_count = current_streak.get("max", 0)
+    last_read_date = current_streak.get("last_read_date")
+    
+    # Convert read_date to Central timezone date string for comparison
+    central_tz = pytz.timezone('US/Central')
+    read_date_central = read_date.astimezone(central_tz).date()
+    read_date_str = read_date_central.strftime('%Y-%m-%d')
+    
+    # Determine if this is a consecutive day
+    if last_read_date:
+        # Parse the last read date
+        if isinstance(last_read_date, str):
+            last_date = datetime.strptime(last_read_date, '%Y-%m-%d').date()
+        elif isinstance(last_read_date, datetime):
+            last_date = last_read_date.date()
+        else:
+            # Handle any other format by resetting
+            last_date = None
+        
+        if last_date:
+            days_diff = (read_date_central - last_date).days
+            
+            if days_diff == 0:
+                # Same day - no change to streak
+                return {"current": current_count, "max": max_count, "date": read_date_str, "changed": False}
+            elif days_diff == 1:
+                # Consecutive day - increment streak
+                current_count += 1
+            else:
+                # Gap in reading - reset streak to 1
+                current_count = 1
+        else:
+            # Invalid last date - reset streak
+            current_count = 1
+    else:
+        # First time reading - start streak
+        current_count = 1
     
+    # Update max streak if current exceeds it
+    max_count = max(max_count, current_count)
+    return {"current": current_count, "max": max_count, "date": read_date_str, "changed": True}
+
+def streak_update(streak: Dict) -> Dict:
+    """$set fields storing a changed streak"""
+    return {
+        "streak.current": streak["current"],
+        "streak.max": streak["max"],
+        "streak.last_read_date": streak["date"],
+        "updated_at": datetime.now(pytz.UTC)
+    }
+
+def follow_error(follower: Optional[Dict], target_user: Optional[Dict], follower_id: str,
+                 target_user_id: str, following: bool) -> Optional[str]:
+    """Why a follow (following=True) or unfollow cannot happen, or None"""
+    action = "follow" if following else "unfollow"
     if not follower:
-        return {"success": False, "error": "Follower user not found"}
+        return "Follower user not found"
     if not target_user:
-        return {"success": False, "error": "Target user not found"}
+        return "Target user not found"
     if follower_id == target_user_id:
-        return {"success": False, "error": "Cannot follow yourself"}
+        return f"Cannot {action} yourself"
+    
+    is_following = target_user_id in follower.get("following", [])
+    if following and is_following:
+        return "Already following this user"
+    if not following and not is_following:
+        return "Not following this user"
+    return None
+
+def user_card(user: Dict) -> Dict:
+    """Public details of a user in follower/following lists"""
+    return {
+        "user_id": user["user_id"],
+        "email": user["email"],
+        "points": user.get("points", 0),
+        "total_summaries_read": len(user.get("summaries_read", [])),
+        "created_at": user["created_at"]
+    }
+
+def discovery_card(user: Dict) -> Dict:
+    """Public details of a user in the discovery list"""
+    return {
+        **user_card(user),
+        "follower_count": len(user.get("followers", [])),
+        "following_count": len(user.get("following", []))
+    }
+
+def ordered_users(user_ids: List[str], users: List[Dict]) -> List[Dict]:
+    """Users in the order of `user_ids`, skipping ids with no user"""
+    by_id = {user["user_id"]: user for user in users}
+    return [by_id[user_id] for user_id in user_ids if user_id in by_id]
+
+# User Management Functions
+def create_user(email: str, hashed_password: str) -> Dict:
+    """Create a new user in MongoDB"""
+    try:
+        # Check for duplicate users first
+        if get_user_by_email(email):
+            logger.warning(f"Attempted to create duplicate user: {email}")
+            return None
+            
+        user_doc = new_user_doc(email, hashed_password)
+        
+        logger.info(f"Creating new user: {email}")
+        result = users_collection.insert_one(user_doc)
+        user_doc["_id"] = str(result.inserted_id)
+        logger.info(f"User created successfully: {email} (ID: {user_doc['user_id']})")
+        
+        return user_doc
+    except Exception as e:
+        logger.error(f"Error creating user {email}: {str(e)}")
+        return None
+
+def get_user_by_email(email: str) -> Optional[Dict]:
+    """Get user by email"""
+    try:
+        logger.debug(f"Looking up user by email: {email}")
+        user = users_collection.find_one({"email": email})
+        if user:
+            user["_id"] = str(user["_id"])
+            logger.debug(f"User found: {email}")
+            return user
+        logger.debug(f"User not found: {email}")
+        return None
+    except Exception as e:
+        logger.error(f"Error looking up user by email {email}: {str(e)}")
+        return None
+
+def get_user_by_id(user_id: str) -> Optional[Dict]:
+    """Get user by user_id"""
+    user = users_collection.find_one({"user_id": user_id})
+    if user:
+        user["_id"] = str(user["_id"])
+    return user
+
+def update_user_read_log(user_id: str, summary_id: str) -> Dict:
+    """Update user's read log when they read a summary"""
+    today = datetime.now(pytz.timezone('US/Central')).strftime('%Y-%m-%d')
+    read_time = datetime.now(pytz.timezone('US/Central'))
+    
+    # Check if summary is already read to avoid duplicate points
+    user = users_collection.find_one({"user_id": user_id})
+    if not user:
+        return {"success": False, "error": "User not found"}
+    
+    if summary_id in user.get("summaries_read", []):
+        return {"success": True, "already_read": True, "points_awarded": 0}
+    
+    # Add summary to read list if not already there
+    add_result = users_collection.update_one(
+        {"user_id": user_id},
+        {"$addToSet": {"summaries_read": summary_id}}
+    )
+      # Update daily read count and points only if summary was actually added
+    if add_result.modified_count > 0:
+        # Update reading streak
+        streak_result = update_reading_streak(user_id, read_time)
+        update_result = users_collection.update_one(
+            {"user_id": user_id},
+            {
+                "$inc": {f"daily_read_log.{today}": 1, "points": 1},
+                "$set": {"updated_at": datetime.now(pytz.UTC)}
+            }
+        )
+        return {
+            "success": True, 
+            "already_read": False, 
+            "points_awarded": 1,
+            "updated": update_result.modified_count > 0,
+            "streak": {
+                "current": streak_result.get("current_streak", 0),
+                "max": streak_result.get("max_streak", 0),
+                "updated": streak_result.get("streak_updated", False)
+            }
+        }
+    else:
+        # Summary already read, get current streak info
+        current_streak = user.get("streak", {"current": 0, "max": 0, "last_read_date": None})
+        return {
+            "success": True, 
+            "already_read": True, 
+            "points_awarded": 0,
+            "streak": {
+                "current": current_streak.get("current", 0),
+                "max": current_streak.get("max", 0),
+                "updated": False
+            }
+        }
+
+def get_user_stats(user_id: str) -> Optional[Dict]:
+    """Get user statistics"""
+    user = get_user_by_id(user_id)
+    if not user:
+        return None
+    return user_stats(user)
+
+def get_user_dashboard_analytics(user_id: str) -> Optional[Dict]:
+    """Get comprehensive dashboard analytics for a user"""
+    user = get_user_by_id(user_id)
+    if not user:
+        return None
     
-    # Check if already following
-    if target_user_id in follower.get("following", []):
-        return {"success": False, "error": "Already following this user"}
+    # Get top liked topics by analyzing read summaries
+    top_topics = get_user_top_topics(user_id)
+    return dashboard_analytics(user_id, user, top_topics)
+
+def get_user_top_topics(user_id: str, limit: int = 5) -> List[Dict]:
+    """Get user's most read topics"""
+    user = get_user_by_id(user_id)
+    if not user:
+        return []
+    
+    summaries_read = user.get("summaries_read", [])
+    if not summaries_read:
+        return []
+    
+    # Get topics for read summaries in one query
+    ids = summary_object_ids(summaries_read)
+    topic_counts = Counter(
+        summary["topic"]
+        for summary in summaries_collection.find({"_id": {"$in": ids}}, {"topic": 1})
+        if summary.get("topic")
+    )
+    
+    # Convert to list of dicts with percentages
+    return rank_topics(topic_counts, limit)
+
+def get_user_active_time_analysis(user_id: str) -> Dict:
+    """Analyze most active reading times (simplified version)"""
+    return active_time(get_user_by_id(user_id))
+
+# Follow/Unfollow Functions
+def follow_user(follower_id: str, target_user_id: str) -> Dict:
+    """Follow a user"""
+    # Check if both users exist and the follow is allowed
+    follower = get_user_by_id(follower_id)
+    target_user = get_user_by_id(target_user_id)
+    error = follow_error(follower, target_user, follower_id, target_user_id, following=True)
+    if error:
+        return {"success": False, "error": error}
     
     # Add to follower's following list
     users_collection.update_one(
@@ -448,20 +607,12 @@ def follow_user(follower_id: str, target_user_id: str) -> Dict:
 
 def unfollow_user(follower_id: str, target_user_id: str) -> Dict:
     """Unfollow a user"""
-    # Check if both users exist
+    # Check if both users exist and the unfollow is allowed
     follower = get_user_by_id(follower_id)
     target_user = get_user_by_id(target_user_id)
-    
-    if not follower:
-        return {"success": False, "error": "Follower user not found"}
-    if not target_user:
-        return {"success": False, "error": "Target user not found"}
-    if follower_id == target_user_id:
-        return {"success": False, "error": "Cannot unfollow yourself"}
-    
-    # Check if not following
-    if target_user_id not in follower.get("following", []):
-        return {"success": False, "error": "Not following this user"}
+    error = follow_error(follower, target_user, follower_id, target_user_id, following=False)
+    if error:
+        return {"success": False, "error": error}
     
     # Remove from follower's following list
     users_collection.update_one(
@@ -490,18 +641,8 @@ def get_user_followers(user_id: str) -> Dict:
         return {"success": False, "error": "User not found"}
     
     follower_ids = user.get("followers", [])
-    followers = []
-    
-    for follower_id in follower_ids:
-        follower = get_user_by_id(follower_id)
-        if follower:
-            followers.append({
-                "user_id": follower["user_id"],
-                "email": follower["email"],
-                "points": follower.get("points", 0),
-                "total_summaries_read": len(follower.get("summaries_read", [])),
-                "created_at": follower["created_at"]
-            })
+    users = list(users_collection.find({"user_id": {"$in": follower_ids}}))
+    followers = [user_card(follower) for follower in ordered_users(follower_ids, users)]
     
     return {
         "success": True,
@@ -516,18 +657,8 @@ def get_user_following(user_id: str) -> Dict:
         return {"success": False, "error": "User not found"}
     
     following_ids = user.get("following", [])
-    following = []
-    
-    for following_id in following_ids:
-        followed_user = get_user_by_id(following_id)
-        if followed_user:
-            following.append({
-                "user_id": followed_user["user_id"],
-                "email": followed_user["email"],
-                "points": followed_user.get("points", 0),
-                "total_summaries_read": len(followed_user.get("summaries_read", [])),
-                "created_at": followed_user["created_at"]
-            })
+    users = list(users_collection.find({"user_id": {"$in": following_ids}}))
+    following = [user_card(followed_user) for followed_user in ordered_users(following_ids, users)]
     
     return {
         "success": True,
@@ -542,18 +673,7 @@ def get_all_users(current_user_id: str = None, limit: int = 50) -> Dict:
         query["user_id"] = {"$ne": current_user_id}
     
     users = list(users_collection.find(query).limit(limit))
-    user_list = []
-    
-    for user in users:
-        user_list.append({
-            "user_id": user["user_id"],
-            "email": user["email"],
-            "points": user.get("points", 0),
-            "total_summaries_read": len(user.get("summaries_read", [])),
-            "follower_count": len(user.get("followers", [])),
-            "following_count": len(user.get("following", [])),
-            "created_at": user["created_at"]
-        })
+    user_list = [discovery_card(user) for user in users]
     
     return {
         "success": True,
@@ -567,76 +687,25 @@ def update_reading_streak(user_id: str, read_date: datetime) -> Dict:
     if not user:
         return {"success": False, "error": "User not found"}
     
-    # Get current streak data, with defaults if not present (for existing users)
-    current_streak = user.get("streak", {})
-    if not current_streak:
-        current_streak = {"current": 0, "max": 0, "last_read_date": None}
-    
-    current_count = current_streak.get("current", 0)
-    max_count = current_streak.get("max", 0)
-    last_read_date = current_streak.get("last_read_date")
-    
-    # Convert read_date to Central timezone date string for comparison
-    central_tz = pytz.timezone('US/Central')
-    read_date_central = read_date.astimezone(central_tz).date()
-    read_date_str = read_date_central.strftime('%Y-%m-%d')
-    
-    # Determine if this is a consecutive day
-    if last_read_date:
-        # Parse the last read date
-        if isinstance(last_read_date, str):
-            last_date = datetime.strptime(last_read_date, '%Y-%m-%d').date()
-        elif isinstance(last_read_date, datetime):
-            last_date = last_read_date.date()
-        else:
-            # Handle any other format by resetting
-            last_date = None
-        
-        if last_date:
-            days_diff = (read_date_central - last_date).days
-            
-            if days_diff == 0:
-                # Same day - no change to streak
-                return {
-                    "success": True,
-                    "streak_updated": False,
-                    "current_streak": current_count,
-                    "max_streak": max_count
-                }
-            elif days_diff == 1:
-                # Consecutive day - increment streak
-                current_count += 1
-            else:
-                # Gap in reading - reset streak to 1
-                current_count = 1
-        else:
-            # Invalid last date - reset streak
-            current_count = 1
-    else:
-        # First time reading - start streak
-        current_count = 1
-    
-    # Update max streak if current exceeds it
-    max_count = max(max_count, current_count)
+    streak = next_streak(user, read_date)
+    if not streak["changed"]:
+        return {
+            "success": True,
+            "streak_updated": False,
+            "current_streak": streak["current"],
+            "max_streak": streak["max"]
+        }
     
     # Update user's streak in database
     update_result = users_collection.update_one(
         {"user_id": user_id},
-        {
-            "$set": {
-                "streak.current": current_count,
-                "streak.max": max_count,
-                "streak.last_read_date": read_date_str,
-                "updated_at": datetime.now(pytz.UTC)
-            }
-        }
+        {"$set": streak_update(streak)}
     )
     
     return {
         "success": True,
         "streak_updated": True,
-        "current_streak": current_count,
-        "max_streak": max_count,
+        "current_streak": streak["current"],
+        "max_streak": streak["max"],
         "updated": update_result.modified_count > 0
     }
-
@@ -0,0 +1,293 @@
+"""
+Async MongoDB access for the FastAPI routes.
+
+Mirrors the user and summary functions of app.db.mongodb on an async
+client, so a request waiting on MongoDB no longer blocks the event loop and
+a worker serves other requests meanwhile. Document building, streak and
+analytics logic is shared with the sync module, which stays in use by the
+CLI jobs and the embedding/personalization code.
+
+Uses pymongo's AsyncMongoClient (pymongo >= 4.13), falling back to Motor.
+"""
+import os
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+from collections import Counter
+
+import pytz
+from dotenv import load_dotenv
+
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:
+    from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+
+from app.db.mongodb import (
+    new_user_doc, user_stats, summary_object_ids, rank_topics, active_time,
+    dashboard_analytics, next_streak, streak_update, follow_error,
+    user_card, discovery_card, ordered_users,
+)
+
+logger = logging.getLogger("mongodb_async")
+
+load_dotenv()
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/newt")
+#connects lazily, on the first operation inside the running event loop
+client = AsyncMongoClient(MONGO_URI)
+db = client.get_default_database()
+
+summaries_collection = db['summaries']
+users_collection = db['users']
+
+
+async def to_list(cursor, length: int = None) -> list:
+    return await cursor.to_list(length)
+
+async def find_summaries(query: dict, limit: int = 0, projection: dict = None) -> list:
+    """Summaries matching `query`, newest first"""
+    cursor = summaries_collection.find(query, projection).sort("date", -1)
+    if limit:
+        cursor = cursor.limit(limit)
+    return await to_list(cursor)
+
+async def find_summary(summary_id) -> Optional[Dict]:
+    return await summaries_collection.find_one({"_id": summary_id})
+
+async def get_recent_summaries(limit: int = 10):
+    return await find_summaries({}, limit)
+
+async def ping() -> dict:
+    return await client.admin.command('ping')
+
+# User Management Functions
+async def create_user(email: str, hashed_password: str) -> Dict:
+    """Create a new user in MongoDB"""
+    try:
+        # Check for duplicate users first
+        if await get_user_by_email(email):
+            logger.warning(f"Attempted to create duplicate user: {email}")
+            return None
+
+        user_doc = new_user_doc(email, hashed_password)
+
+        logger.info(f"Creating new user: {email}")
+        result = await users_collection.insert_one(user_doc)
+        user_doc["_id"] = str(result.inserted_id)
+        logger.info(f"User created successfully: {email} (ID: {user_doc['user_id']})")
+
+        return user_doc
+    except Exception as e:
+        logger.error(f"Error creating user {email}: {str(e)}")
+        return None
+
+async def get_user_by_email(email: str) -> Optional[Dict]:
+    """Get user by email"""
+    try:
+        user = await users_collection.find_one({"email": email})
+        if user:
+            user["_id"] = str(user["_id"])
+            return user
+        return None
+    except Exception as e:
+        logger.error(f"Error looking up user by email {email}: {str(e)}")
+        return None
+
+async def get_user_by_id(user_id: str) -> Optional[Dict]:
+    """Get user by user_id"""
+    user = await users_collection.find_one({"user_id": user_id})
+    if user:
+        user["_id"] = str(user["_id"])
+    return user
+
+async def update_user_read_log(user_id: str, summary_id: str) -> Dict:
+    """Update user's read log when they read a summary"""
+    today = datetime.now(pytz.timezone('US/Central')).strftime('%Y-%m-%d')
+    read_time = datetime.now(pytz.timezone('US/Central'))
+
+    # Check if summary is already read to avoid duplicate points
+    user = await users_collection.find_one({"user_id": user_id})
+    if not user:
+        return {"success": False, "error": "User not found"}
+
+    if summary_id in user.get("summaries_read", []):
+        return {"success": True, "already_read": True, "points_awarded": 0}
+
+    # Add summary to read list if not already there
+    add_result = await users_collection.update_one(
+        {"user_id": user_id},
+        {"$addToSet": {"summaries_read": summary_id}}
+    )
+    # Update daily read count and points only if summary was actually added
+    if add_result.modified_count > 0:
+        streak_result = await update_reading_streak(user_id, read_time)
+        update_result = await users_collection.update_one(
+            {"user_id": user_id},
+            {
+                "$inc": {f"daily_read_log.{today}": 1, "points": 1},
+                "$set": {"updated_at": datetime.now(pytz.UTC)}
+            }
+        )
+        return {
+            "success": True,
+            "already_read": False,
+            "points_awarded": 1,
+            "updated": update_result.modified_count > 0,
+            "streak": {
+                "current": streak_result.get("current_streak", 0),
+                "max": streak_result.get("max_streak", 0),
+                "updated": streak_result.get("streak_updated", False)
+            }
+        }
+
+    # Summary already read, get current streak info
+    current_streak = user.get("streak", {"current": 0, "max": 0, "last_read_date": None})
+    return {
+        "success": True,
+        "already_read": True,
+        "points_awarded": 0,
+        "streak": {
+            "current": current_streak.get("current", 0),
+            "max": current_streak.get("max", 0),
+            "updated": False
+        }
+    }
+
+async def get_user_stats(user_id: str) -> Optional[Dict]:
+    """Get user statistics"""
+    user = await get_user_by_id(user_id)
+    if not user:
+        return None
+    return user_stats(user)
+
+async def get_user_dashboard_analytics(user_id: str) -> Optional[Dict]:
+    """Get comprehensive dashboard analytics for a user"""
+    user = await get_user_by_id(user_id)
+    if not user:
+        return None
+    top_topics = await _top_topics(user)
+    return dashboard_analytics(user_id, user, top_topics)
+
+async def _top_topics(user: Dict, limit: int = 5) -> List[Dict]:
+    ids = summary_object_ids(user.get("summaries_read", []))
+    if not ids:
+        return []
+    summaries = await to_list(summaries_collection.find({"_id": {"$in": ids}}, {"topic": 1}))
+    topic_counts = Counter(summary["topic"] for summary in summaries if summary.get("topic"))
+    return rank_topics(topic_counts, limit)
+
+async def get_user_top_topics(user_id: str, limit: int = 5) -> List[Dict]:
+    """Get user's most read topics"""
+    user = await get_user_by_id(user_id)
+    if not user:
+        return []
+    return await _top_topics(user, limit)
+
+async def get_user_active_time_analysis(user_id: str) -> Dict:
+    """Analyze most active reading times (simplified version)"""
+    return active_time(await get_user_by_id(user_id))
+
+# Follow/Unfollow Functions
+async def _set_follow(follower_id: str, target_user_id: str, op: str):
+    now = datetime.now(pytz.UTC)
+    await users_collection.update_one(
+        {"user_id": follower_id},
+        {op: {"following": target_user_id}, "$set": {"updated_at": now}}
+    )
+    await users_collection.update_one(
+        {"user_id": target_user_id},
+        {op: {"followers": follower_id}, "$set": {"updated_at": now}}
+    )
+
+async def follow_user(follower_id: str, target_user_id: str) -> Dict:
+    """Follow a user"""
+    follower = await get_user_by_id(follower_id)
+    target_user = await get_user_by_id(target_user_id)
+    error = follow_error(follower, target_user, follower_id, target_user_id, following=True)
+    if error:
+        return {"success": False, "error": error}
+
+    await _set_follow(follower_id, target_user_id, "$addToSet")
+    return {"success": True, "message": "Successfully followed user"}
+
+async def unfollow_user(follower_id: str, target_user_id: str) -> Dict:
+    """Unfollow a user"""
+    follower = await get_user_by_id(follower_id)
+    target_user = await get_user_by_id(target_user_id)
+    error = follow_error(follower, target_user, follower_id, target_user_id, following=False)
+    if error:
+        return {"success": False, "error": error}
+
+    await _set_follow(follower_id, target_user_id, "$pull")
+    return {"success": True, "message": "Successfully unfollowed user"}
+
+async def _user_cards(user_ids: List[str]) -> List[Dict]:
+    users = await to_list(users_collection.find({"user_id": {"$in": user_ids}}))
+    return [user_card(user) for user in ordered_users(user_ids, users)]
+
+async def get_user_followers(user_id: str) -> Dict:
+    """Get list of user's followers with their details"""
+    user = await get_user_by_id(user_id)
+    if not user:
+        return {"success": False, "error": "User not found"}
+
+    followers = await _user_cards(user.get("followers", []))
+    return {
+        "success": True,
+        "followers": followers,
+        "follower_count": len(followers)
+    }
+
+async def get_user_following(user_id: str) -> Dict:
+    """Get list of users that this user is following with their details"""
+    user = await get_user_by_id(user_id)
+    if not user:
+        return {"success": False, "error": "User not found"}
+
+    following = await _user_cards(user.get("following", []))
+    return {
+        "success": True,
+        "following": following,
+        "following_count": len(following)
+    }
+
+async def get_all_users(current_user_id: str = None, limit: int = 50) -> Dict:
+    """Get list of all users for discovery (excluding current user)"""
+    query = {}
+    if current_user_id:
+        query["user_id"] = {"$ne": current_user_id}
+
+    users = await to_list(users_collection.find(query).limit(limit))
+    user_list = [discovery_card(user) for user in users]
+    return {
+        "success": True,
+        "users": user_list,
+        "total_count": len(user_list)
+    }
+
+async def update_reading_streak(user_id: str, read_date: datetime) -> Dict:
+    """Update user's reading streak based on read date"""
+    user = await users_collection.find_one({"user_id": user_id})
+    if not user:
+        return {"success": False, "error": "User not found"}
+
+    streak = next_streak(user, read_date)
+    if not streak["changed"]:
+        return {
+            "success": True,
+            "streak_updated": False,
+            "current_streak": streak["current"],
+            "max_streak": streak["max"]
+        }
+
+    update_result = await users_collection.update_one(
+        {"user_id": user_id},
+        {"$set": streak_update(streak)}
+    )
+    return {
+        "success": True,
+        "streak_updated": True,
+        "current_streak": streak["current"],
+        "max_streak": streak["max"],
+        "updated": update_result.modified_count > 0
+    }
@@ -0,0 +1,427 @@
+import os
+import threading
+import time
+import logging
+from typing import List, Tuple, Optional
+
+import numpy as np
+from bson import ObjectId
+
+from app.db.embedding_codec import decode_embedding
+from app.db.ivf_index import IVFIndex
+from app.db.summary_snapshot import SUMMARY_SNAPSHOT_DIR, current_version, load_snapshot
+
+logger = logging.getLogger("summary_index")
+
+#how often (seconds) a search may trigger a check for summaries inserted by other processes
+SUMMARY_INDEX_REFRESH_SECONDS = float(os.getenv("SUMMARY_INDEX_REFRESH_SECONDS", "60"))
+#"exact" scans every row; "ivf" switches to an approximate inverted-file index once large enough
+SUMMARY_INDEX_BACKEND = os.getenv("SUMMARY_INDEX_BACKEND", "exact")
+#below this many rows the exact scan is already fast, so no IVF index is built
+SUMMARY_INDEX_IVF_MIN_ROWS = int(os.getenv("SUMMARY_INDEX_IVF_MIN_ROWS", "50000"))
+#lists probed per query: the recall/latency knob of the IVF backend
+SUMMARY_INDEX_NPROBE = int(os.getenv("SUMMARY_INDEX_NPROBE", "8"))
+SUMMARY_INDEX_IVF_PATH = os.getenv("SUMMARY_INDEX_IVF_PATH", "summary_ivf.npz")
+#retrain the IVF centroids once the index has grown by this factor since training
+_IVF_RETRAIN_GROWTH = 4
+
+_INITIAL_CAPACITY = 1024
+#cap on the (queries x summaries) score block computed at once by search_many
+_MAX_SCORE_ELEMENTS = 8_000_000
+
+
+class _SnapshotIds:
+    """Summary ids of a memory-mapped snapshot, decoded to ObjectId only when accessed."""
+
+    def __init__(self, raw_ids: np.ndarray):
+        self._raw = raw_ids
+
+    def __len__(self):
+        return len(self._raw)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self._raw)))]
+        #the S12 dtype drops trailing NUL bytes on access, so pad them back
+        return ObjectId(bytes(self._raw[i]).ljust(12, b"\0"))
+
+    def positions(self, summary_ids) -> np.ndarray:
+        """Row positions of the given ids (ids not in the snapshot are skipped)."""
+        keys = np.array([oid.binary for oid in summary_ids if isinstance(oid, ObjectId)], dtype="S12")
+        if not len(keys) or not len(self._raw):
+            return np.empty(0, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._raw, keys), len(self._raw) - 1)
+        return pos[self._raw[pos] == keys]
+
+
+class SummaryIndex:
+    """
+    Resident similarity index over summary embeddings.
+
+    Holds a contiguous float32 matrix of L2-normalized embeddings plus the
+    matching summary ids, so top-k lookup is one matrix-vector product and
+    an argpartition instead of a full collection scan per request.
+
+    With a snapshot directory configured, the matrix is instead a read-only
+    memory map of the current exported snapshot, shared by every worker on
+    the host, and refresh() switches to newer snapshot versions.
+    """
+
+    def __init__(self, collection, refresh_seconds: float = SUMMARY_INDEX_REFRESH_SECONDS,
+                 backend: str = SUMMARY_INDEX_BACKEND, nprobe: int = SUMMARY_INDEX_NPROBE,
+                 ivf_path: str = SUMMARY_INDEX_IVF_PATH, snapshot_dir: str = SUMMARY_SNAPSHOT_DIR):
+        self.collection = collection
+        self.snapshot_dir = snapshot_dir
+        self._snapshot_version = None
+        #rows of a read-only snapshot whose summaries have since been deleted
+        self._removed_rows = None
+        self.refresh_seconds = refresh_seconds
+        self.backend = backend
+        self.nprobe = nprobe
+        self.ivf_path = ivf_path
+        self.ivf = None
+        self._ivf_trained_rows = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.RLock()
+        self._matrix = None
+        self._ids = []
+        self._id_set = set()
+        self._size = 0
+        self._dim = None
+        self._last_id = None
+        self._last_embedded_at = None
+        self._loaded = False
+        self._last_refresh = 0.0
+
+    def __len__(self):
+        return self._size
+
+    def _ensure_capacity(self, extra: int):
+        needed = self._size + extra
+        if self._matrix is not None and needed <= self._matrix.shape[0]:
+            return
+        capacity = max(_INITIAL_CAPACITY, self._matrix.shape[0] if self._matrix is not None else 0)
+        while capacity < needed:
+            capacity *= 2
+        grown = np.empty((capacity, self._dim), dtype=np.float32)
+        if self._size:
+            grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    def _append(self, ids: list, vectors: np.ndarray, replace: set = frozenset()):
+        """
+        Append already-normalized rows; ids in `replace` that are already
+        indexed (re-embedded summaries) have their old row dropped first.
+        Returns the number of rows replaced. Caller must hold the lock.
+        """
+        if not ids:
+            return 0
+        stale = self._id_set.intersection(replace)
+        if stale:
+            self._drop(stale)
+        fresh = [i for i, _id in enumerate(ids) if _id not in self._id_set]
+        if len(fresh) < len(ids):
+            ids = [ids[i] for i in fresh]
+            vectors = vectors[fresh]
+            if not ids:
+                return len(stale)
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+        self._ensure_capacity(len(ids))
+        self._matrix[self._size:self._size + len(ids)] = vectors
+        if self.ivf is not None:
+            self.ivf.add(vectors, self._size)
+        self._ids.extend(ids)
+        self._id_set.update(ids)
+        self._size += len(ids)
+        return len(stale)
+
+    def _prepare(self, ids: list, embeddings: list) -> Tuple[list, Optional[np.ndarray]]:
+        """Drop empty or mismatched embeddings and normalize the rest."""
+        kept_ids, rows = [], []
+        dim = self._dim
+        for _id, emb in zip(ids, embeddings):
+            vec = decode_embedding(emb)
+            if vec is None or vec.size == 0:
+                continue
+            if dim is None:
+                dim = vec.shape[0]
+            if vec.shape[0] != dim:
+                logger.warning(f"Skipping summary {_id}: embedding dim {vec.shape[0]} != {dim}")
+                continue
+            kept_ids.append(_id)
+            rows.append(vec)
+        if not rows:
+            return [], None
+        matrix = np.vstack(rows)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return kept_ids, matrix / norms
+
+    def _load_from(self, query: dict, batch_size: int = 1000) -> int:
+        cursor = self.collection.find(
+            query, {"embedding": 1, "embedded_at": 1}, batch_size=batch_size
+        ).sort("_id", 1)
+        loaded = 0
+        ids, embeddings = [], []
+        #summaries at or below the cursor only match again because they were re-embedded
+        scanned_to = self._last_id
+        last_id = None
+        for doc in cursor:
+            last_id = doc["_id"]
+            ids.append(doc["_id"])
+            embeddings.append(doc.get("embedding"))
+            embedded_at = doc.get("embedded_at")
+            if embedded_at and (self._last_embedded_at is None or embedded_at > self._last_embedded_at):
+                self._last_embedded_at = embedded_at
+            if len(ids) >= batch_size:
+                loaded += self._add_batch(ids, embeddings, scanned_to)
+                ids, embeddings = [], []
+        if ids:
+            loaded += self._add_batch(ids, embeddings, scanned_to)
+        self._scanned_through(last_id)
+        return loaded
+
+    def _scanned_through(self, last_id):
+        """Record that MongoDB has been scanned up to `last_id`; only scans may advance the refresh cursor."""
+        with self._lock:
+            if last_id is not None and (self._last_id is None or last_id > self._last_id):
+                self._last_id = last_id
+
+    def _add_batch(self, ids: list, embeddings: list, scanned_to=None) -> int:
+        if self._snapshot_version is not None:
+            #snapshot rows are read-only; new summaries arrive with the next export
+            return 0
+        kept_ids, vectors = self._prepare(ids, embeddings)
+        replace = {_id for _id in kept_ids if _id <= scanned_to} if scanned_to is not None else frozenset()
+        with self._lock:
+            before = self._size
+            replaced = self._append(kept_ids, vectors, replace)
+            return self._size - before + replaced
+
+    def load(self):
+        """(Re)build the index from every summary that has an embedding."""
+        if self.snapshot_dir and self._load_snapshot():
+            return
+        with self._refresh_lock:
+            with self._lock:
+                self._matrix = None
+                self._ids = []
+                self._id_set = set()
+                self._size = 0
+                self._dim = None
+                self._last_id = None
+                self._last_embedded_at = None
+                self._snapshot_version = None
+                self._removed_rows = None
+                self.ivf = None
+            start = time.time()
+            loaded = self._load_from({"embedding": {"$exists": True}})
+            self._loaded = True
+            self._last_refresh = time.time()
+            self._update_ivf(loaded)
+        logger.info(f"Summary index loaded {loaded} embeddings in {time.time() - start:.2f}s")
+
+    def _load_snapshot(self) -> bool:
+        """Map the current snapshot version; returns False if none has been exported yet."""
+        with self._refresh_lock:
+            snapshot = load_snapshot(self.snapshot_dir)
+            if snapshot is None:
+                logger.warning(f"No summary snapshot in {self.snapshot_dir}; loading from MongoDB")
+                return False
+            with self._lock:
+                self._matrix = snapshot.embeddings
+                self._ids = _SnapshotIds(snapshot.ids)
+                self._id_set = set()
+                self._size = snapshot.rows
+                self._dim = snapshot.dim
+                self._snapshot_version = snapshot.version
+                self._removed_rows = None
+                self.ivf = None
+            self._loaded = True
+            self._last_refresh = time.time()
+            self._update_ivf(snapshot.rows)
+        logger.info(f"Summary index mapped snapshot {snapshot.version} ({snapshot.rows} rows)")
+        return True
+
+    def refresh(self, load_if_missing: bool = True):
+        """
+        Pull in summaries inserted since the last load (e.g. by the prefetch job),
+        plus older summaries that have since been given an embedding by the backfill.
+        In snapshot mode, switch to a newer snapshot version if one was exported.
+        With load_if_missing=False an index that was never loaded stays unloaded.
+        """
+        with self._refresh_lock:
+            if not self._loaded:
+                if load_if_missing:
+                    self.load()
+                return
+            if self._snapshot_version is not None:
+                if current_version(self.snapshot_dir) != self._snapshot_version:
+                    self._load_snapshot()
+                self._last_refresh = time.time()
+                return
+            query = {"embedding": {"$exists": True}}
+            if self._last_id is not None:
+                embedded_since = ({"$gt": self._last_embedded_at} if self._last_embedded_at is not None
+                                  else {"$exists": True})
+                query["$or"] = [
+                    {"_id": {"$gt": self._last_id}},
+                    {"_id": {"$lte": self._last_id}, "embedded_at": embedded_since},
+                ]
+            added = self._load_from(query)
+            self._last_refresh = time.time()
+            self._update_ivf(added)
+        if added:
+            logger.info(f"Summary index refreshed with {added} new embeddings")
+
+    def _update_ivf(self, added: int):
+        """Build, retrain or persist the IVF index after a load/refresh. Caller holds the refresh lock."""
+        if self.backend != "ivf":
+            return
+        with self._lock:
+            size = self._size
+            matrix = self._matrix[:size] if size else None
+            ids = self._ids
+            ivf = self.ivf
+        if size < SUMMARY_INDEX_IVF_MIN_ROWS:
+            return
+
+        if ivf is not None and size < self._ivf_trained_rows * _IVF_RETRAIN_GROWTH:
+            #appended rows are assigned in memory (IVFIndex.add); the saved file is only
+            #rewritten on (re)training, and load() assigns rows it does not know about
+            return
+
+        #train (or restore) off to the side so searches keep running, then swap it in
+        start = time.time()
+        fresh = IVFIndex(nprobe=self.nprobe)
+        trained = ivf is not None or not fresh.load(self.ivf_path, ids[:size], matrix)
+        if trained:
+            fresh.train(matrix)
+        with self._lock:
+            if self._ids is not ids:
+                #rows were removed meanwhile; positions no longer line up, retry next refresh
+                return
+            if self._size > size:
+                fresh.add(self._matrix[size:self._size], size)
+            self.ivf = fresh
+            assignments = fresh.assignments()
+        self._ivf_trained_rows = size
+        if trained:
+            fresh.save(self.ivf_path, ids, assignments)
+        logger.info(f"IVF index ready over {size} rows in {time.time() - start:.2f}s")
+
+    def _maybe_refresh(self):
+        if not self._loaded or time.time() - self._last_refresh >= self.refresh_seconds:
+            self.refresh()
+
+    def add(self, summary_id, embedding):
+        """
+        Add a single freshly inserted summary without reloading. The refresh
+        cursor is left alone, so summaries other processes inserted before
+        this one are still picked up by the next refresh.
+        """
+        self._add_batch([summary_id], [embedding])
+
+    def remove(self, summary_ids):
+        """Drop ids from the index, e.g. after their summaries were deleted."""
+        drop = set(summary_ids)
+        if not drop:
+            return
+        with self._lock:
+            if self._snapshot_version is not None:
+                rows = self._ids.positions(drop)
+                if len(rows):
+                    existing = self._removed_rows if self._removed_rows is not None else np.empty(0, dtype=np.int64)
+                    self._removed_rows = np.union1d(existing, rows)
+                return
+            self._drop(drop)
+
+    def _drop(self, drop: set):
+        """Remove rows of in-memory ids. Caller must hold the lock."""
+        keep = [i for i, _id in enumerate(self._ids) if _id not in drop]
+        if len(keep) == self._size:
+            return
+        #copy rather than compact in place so concurrent searches keep a consistent view
+        self._matrix = self._matrix[keep]
+        self._ids = [self._ids[i] for i in keep]
+        self._id_set.difference_update(drop)
+        self._size = len(keep)
+        if self.ivf is not None:
+            self.ivf.compact(keep)
+
+    def search(self, embedding, limit: int = 3) -> List[Tuple[object, float]]:
+        """Return up to `limit` (summary_id, cosine score) pairs, best first."""
+        return self.search_many([embedding], limit=limit)
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        if k < scores.shape[-1]:
+            return np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        return np.broadcast_to(np.arange(scores.shape[-1]), scores.shape)
+
+    def search_many(self, embeddings, limit: int = 3) -> List[Tuple[object, float]]:
+        """
+        Top-`limit` neighbours for every query row, merged into one deduplicated list.
+
+        With the exact backend all queries are scored with one matrix-matrix
+        product (chunked to bound memory); with IVF each query only scores the
+        rows in its probed lists. Each summary keeps its best score across
+        queries, best first.
+        """
+        self._maybe_refresh()
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if not queries.size or limit <= 0:
+            return []
+        norms = np.linalg.norm(queries, axis=1)
+        queries = queries[norms > 0] / norms[norms > 0, None]
+        if not len(queries):
+            return []
+
+        with self._lock:
+            size = self._size
+            if not size:
+                return []
+            matrix = self._matrix[:size]
+            #appends only extend the list and removals swap in a new one, so indices < size stay valid
+            ids = self._ids
+            if queries.shape[1] != matrix.shape[1]:
+                logger.warning(f"Query dim {queries.shape[1]} does not match index dim {matrix.shape[1]}")
+                return []
+            candidates = [self.ivf.candidates(q) for q in queries] if self.ivf is not None else None
+            removed = self._removed_rows
+
+        top_idx, top_scores = [], []
+        if candidates is None:
+            k = min(limit, size)
+            rows_per_chunk = max(1, _MAX_SCORE_ELEMENTS // size)
+            for start in range(0, len(queries), rows_per_chunk):
+                scores = queries[start:start + rows_per_chunk] @ matrix.T
+                if removed is not None:
+                    scores[:, removed] = -np.inf
+                idx = self._top_k(scores, k)
+                top_idx.append(idx.ravel())
+                top_scores.append(np.take_along_axis(scores, idx, axis=1).ravel())
+        else:
+            for query, rows in zip(queries, candidates):
+                if removed is not None:
+                    rows = rows[~np.isin(rows, removed)]
+                if not len(rows):
+                    continue
+                scores = matrix[rows] @ query
+                idx = self._top_k(scores, min(limit, len(rows)))
+                top_idx.append(rows[idx])
+                top_scores.append(scores[idx])
+        if not top_idx:
+            return []
+        top_idx = np.concatenate(top_idx)
+        top_scores = np.concatenate(top_scores)
+        finite = np.isfinite(top_scores)
+        top_idx, top_scores = top_idx[finite], top_scores[finite]
+
+        #keep each summary's best score, then order by it
+        order = np.argsort(-top_scores, kind="stable")
+        _, first = np.unique(top_idx[order], return_index=True)
+        best = order[first]
+        best = best[np.argsort(-top_scores[best], kind="stable")]
+        return [(ids[top_idx[i]], float(top_scores[i])) for i in best]
@@ -0,0 +1,137 @@
+"""
+Versioned, memory-mapped snapshots of the summary embeddings.
+
+The exporter streams every embedded summary into flat binary files under
+SUMMARY_SNAPSHOT_DIR/<version>/ and then atomically repoints the CURRENT
+file at the new version. API workers np.memmap the current version
+read-only, so every worker on a host shares one page-cache copy.
+
+    python -m app.db.summary_snapshot
+"""
+import os
+import json
+import shutil
+import time
+import logging
+from typing import Optional
+
+import numpy as np
+
+from app.db.embedding_codec import decode_embedding
+
+logger = logging.getLogger("summary_snapshot")
+
+SUMMARY_SNAPSHOT_DIR = os.getenv("SUMMARY_SNAPSHOT_DIR", "")
+#versions kept on disk; older ones are deleted after a successful export
+SUMMARY_SNAPSHOT_KEEP = int(os.getenv("SUMMARY_SNAPSHOT_KEEP", "3"))
+
+_CURRENT = "CURRENT"
+
+
+class SummarySnapshot:
+    """Read-only view of one snapshot version; arrays are memory-mapped."""
+
+    def __init__(self, path: str, version: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        rows, dim = meta["rows"], meta["dim"]
+        self.version = version
+        self.rows = rows
+        self.dim = dim
+        if rows:
+            self.embeddings = np.memmap(os.path.join(path, "embeddings.f32"), dtype="<f4", mode="r", shape=(rows, dim))
+            #raw 12-byte ObjectIds, ascending
+            self.ids = np.memmap(os.path.join(path, "ids.bin"), dtype="S12", mode="r", shape=(rows,))
+            self.dates = np.memmap(os.path.join(path, "dates.i8"), dtype="<i8", mode="r", shape=(rows,)).view("datetime64[ms]")
+        else:
+            self.embeddings = np.empty((0, dim), dtype=np.float32)
+            self.ids = np.empty(0, dtype="S12")
+            self.dates = np.empty(0, dtype="datetime64[ms]")
+        self.topics = np.load(os.path.join(path, "topics.npy"), mmap_mode="r")
+
+
+def current_version(snapshot_dir: str = SUMMARY_SNAPSHOT_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(snapshot_dir, _CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_snapshot(snapshot_dir: str = SUMMARY_SNAPSHOT_DIR) -> Optional[SummarySnapshot]:
+    version = current_version(snapshot_dir)
+    if not version:
+        return None
+    return SummarySnapshot(os.path.join(snapshot_dir, version), version)
+
+
+def export_snapshot(collection, snapshot_dir: str = SUMMARY_SNAPSHOT_DIR, batch_size: int = 1000) -> Optional[str]:
+    """Write a new snapshot of every embedded summary and make it current; returns its version."""
+    if not snapshot_dir:
+        return None
+    start = time.time()
+    version = f"v{int(time.time() * 1000)}"
+    tmp_path = os.path.join(snapshot_dir, f".{version}.tmp")
+    os.makedirs(tmp_path, exist_ok=True)
+
+    rows = 0
+    dim = None
+    topics = []
+    cursor = collection.find(
+        {"embedding": {"$exists": True}}, {"embedding": 1, "date": 1, "topic": 1}, batch_size=batch_size
+    ).sort("_id", 1)
+    with open(os.path.join(tmp_path, "embeddings.f32"), "wb") as emb_f, \
+            open(os.path.join(tmp_path, "ids.bin"), "wb") as ids_f, \
+            open(os.path.join(tmp_path, "dates.i8"), "wb") as dates_f:
+        for doc in cursor:
+            vector = decode_embedding(doc.get("embedding"))
+            if vector is None or not vector.size:
+                continue
+            if dim is None:
+                dim = vector.shape[0]
+            if vector.shape[0] != dim:
+                continue
+            norm = np.linalg.norm(vector)
+            emb_f.write((vector / norm if norm else vector).astype("<f4").tobytes())
+            ids_f.write(doc["_id"].binary)
+            date = doc.get("date")
+            dates_f.write(np.array(
+                [np.datetime64(date.replace(tzinfo=None), "ms") if date else np.datetime64("NaT")]
+            ).view("<i8").tobytes())
+            topics.append(doc.get("topic") or "")
+            rows += 1
+
+    np.save(os.path.join(tmp_path, "topics.npy"), np.array(topics, dtype=str))
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"rows": rows, "dim": dim or 0, "created_at": time.time()}, f)
+
+    #publish: rename the finished directory into place, then atomically swap CURRENT
+    os.replace(tmp_path, os.path.join(snapshot_dir, version))
+    pointer_tmp = os.path.join(snapshot_dir, f".{_CURRENT}.tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(snapshot_dir, _CURRENT))
+    logger.info(f"Exported summary snapshot {version} ({rows} rows) in {time.time() - start:.2f}s")
+
+    _prune(snapshot_dir, version)
+    return version
+
+
+def _prune(snapshot_dir: str, current: str):
+    """Delete old versions; workers still mapping one keep their pages until they remap."""
+    versions = sorted(
+        name for name in os.listdir(snapshot_dir)
+        if name.startswith("v") and os.path.isdir(os.path.join(snapshot_dir, name))
+    )
+    for name in versions[:-SUMMARY_SNAPSHOT_KEEP]:
+        if name != current:
+            shutil.rmtree(os.path.join(snapshot_dir, name), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    from app.db.mongodb import summaries_collection
+
+    if not SUMMARY_SNAPSHOT_DIR:
+        print("Set SUMMARY_SNAPSHOT_DIR to export a snapshot")
+    else:
+        print(f"Exported snapshot {export_snapshot(summaries_collection)}")
@@ -0,0 +1,211 @@
+"""
+MongoDB-backed task queue for the batch jobs.
+
+Each task is one unit of work (e.g. an article of a prefetch run) in
+`job_tasks`. Workers claim tasks atomically with find_one_and_update, which
+sets a lease. Workers renew the leases of tasks they are still working on;
+a task whose lease expires without being completed (the worker crashed or
+hung) becomes claimable again, up to TASK_MAX_ATTEMPTS claims. A worker
+that fails a task releases it right away instead. Completion, renewal and
+release are only accepted from the worker holding the current lease, so a
+late worker cannot overwrite a task another worker has since taken over.
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import pytz
+from pymongo import UpdateOne, ASCENDING, ReturnDocument
+
+from app.db.mongodb import db
+
+logger = logging.getLogger("task_queue")
+
+tasks_collection = db['job_tasks']
+
+#how long a claimed task stays with its worker before others may reclaim it; workers
+#renew their leases every third of this, so it only bounds how long a crashed worker's tasks wait
+TASK_LEASE_SECONDS = int(os.getenv("TASK_LEASE_SECONDS", "120"))
+#claims (including reclaims after expired leases) before a task is marked failed
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+
+TASK_STATES = ("queued", "leased", "done", "failed")
+
+_indexed = False
+
+
+def _ensure_indexes():
+    global _indexed
+    if _indexed:
+        return
+    tasks_collection.create_index([("run_id", ASCENDING), ("key", ASCENDING)], unique=True)
+    tasks_collection.create_index([("job", ASCENDING), ("status", ASCENDING), ("lease_until", ASCENDING)])
+    _indexed = True
+
+
+def enqueue_tasks(job: str, run_id: str, keys: Iterable[str]) -> int:
+    """Queue one task per key for the run; keys already queued for it are left as they are."""
+    _ensure_indexes()
+    now = datetime.now(pytz.UTC)
+    ops = [
+        UpdateOne(
+            {"run_id": run_id, "key": key},
+            {"$setOnInsert": {"job": job, "run_id": run_id, "key": key, "status": "queued",
+                              "attempts": 0, "lease_until": None, "created_at": now}},
+            upsert=True
+        )
+        for key in keys
+    ]
+    if not ops:
+        return 0
+    return tasks_collection.bulk_write(ops, ordered=False).upserted_count
+
+
+def requeue_failed(run_id: str) -> int:
+    """Give the run's failed tasks a fresh set of attempts."""
+    result = tasks_collection.update_many(
+        {"run_id": run_id, "status": "failed"},
+        {"$set": {"status": "queued", "attempts": 0, "lease_until": None}, "$unset": {"error": ""}}
+    )
+    return result.modified_count
+
+
+def _fail_exhausted(job: str, now: datetime):
+    #tasks whose last allowed lease ran out are not handed out again
+    tasks_collection.update_many(
+        {"job": job, "status": "leased", "lease_until": {"$lt": now}, "attempts": {"$gte": TASK_MAX_ATTEMPTS}},
+        {"$set": {"status": "failed", "error": "lease expired", "updated_at": now}}
+    )
+
+
+def claim_task(job: str, worker_id: str, run_id: str = None,
+               lease_seconds: int = TASK_LEASE_SECONDS) -> Optional[dict]:
+    """
+    Lease the oldest available task of `job` (optionally of one run) to
+    `worker_id`; queued tasks and tasks with an expired lease qualify.
+    Returns the task, or None when nothing is available.
+    """
+    _ensure_indexes()
+    now = datetime.now(pytz.UTC)
+    _fail_exhausted(job, now)
+    query = {
+        "job": job,
+        "$or": [
+            {"status": "queued"},
+            {"status": "leased", "lease_until": {"$lt": now}},
+        ],
+        "attempts": {"$lt": TASK_MAX_ATTEMPTS},
+    }
+    if run_id is not None:
+        query["run_id"] = run_id
+    task = tasks_collection.find_one_and_update(
+        query,
+        {
+            "$set": {"status": "leased", "worker": worker_id, "updated_at": now,
+                     "lease_until": now + timedelta(seconds=lease_seconds)},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("_id", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+    if task and task["attempts"] > 1:
+        logger.info(f"Reclaimed task {task['key']} of run {task['run_id']} (attempt {task['attempts']})")
+    return task
+
+
+def claim_tasks(job: str, worker_id: str, limit: int, run_id: str = None,
+                lease_seconds: int = TASK_LEASE_SECONDS) -> List[dict]:
+    """
+    Lease up to `limit` available tasks of `job` to `worker_id`, all from
+    one run: `run_id`, or the run of the first task claimed.
+    """
+    tasks = []
+    while len(tasks) < limit:
+        task = claim_task(job, worker_id, run_id, lease_seconds)
+        if task is None:
+            break
+        run_id = task["run_id"]
+        tasks.append(task)
+    return tasks
+
+
+def extend_leases(task_ids: Iterable, worker_id: str, lease_seconds: int = TASK_LEASE_SECONDS) -> int:
+    """Push back the lease expiry of tasks still leased to `worker_id`."""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return 0
+    now = datetime.now(pytz.UTC)
+    result = tasks_collection.update_many(
+        {"_id": {"$in": task_ids}, "status": "leased", "worker": worker_id},
+        {"$set": {"lease_until": now + timedelta(seconds=lease_seconds), "updated_at": now}}
+    )
+    return result.modified_count
+
+
+def release_tasks(task_ids: Iterable, worker_id: str, error: str) -> int:
+    """
+    Hand back tasks `worker_id` failed to process: they are queued again
+    for any worker, or marked failed once their attempts are used up.
+    Returns the number of tasks marked failed.
+    """
+    task_ids = list(task_ids)
+    if not task_ids:
+        return 0
+    exhausted = [
+        task["_id"] for task in tasks_collection.find(
+            {"_id": {"$in": task_ids}, "status": "leased", "worker": worker_id,
+             "attempts": {"$gte": TASK_MAX_ATTEMPTS}}, {"_id": 1}
+        )
+    ]
+    tasks_collection.update_many(
+        {"_id": {"$in": task_ids}, "status": "leased", "worker": worker_id,
+         "attempts": {"$lt": TASK_MAX_ATTEMPTS}},
+        {"$set": {"status": "queued", "lease_until": None, "error": error,
+                  "updated_at": datetime.now(pytz.UTC)}}
+    )
+    return complete_tasks(exhausted, worker_id, status="failed", error=error)
+
+
+def complete_tasks(task_ids: Iterable, worker_id: str, status: str = "done", error: str = None) -> int:
+    """Mark tasks done (or failed); only tasks still leased to `worker_id` are updated."""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return 0
+    update = {"$set": {"status": status, "lease_until": None, "updated_at": datetime.now(pytz.UTC)}}
+    if error is None:
+        #an error from an earlier, released attempt no longer applies
+        update["$unset"] = {"error": ""}
+    else:
+        update["$set"]["error"] = error
+    result = tasks_collection.update_many(
+        {"_id": {"$in": task_ids}, "status": "leased", "worker": worker_id},
+        update
+    )
+    if result.modified_count < len(task_ids):
+        logger.warning(f"{len(task_ids) - result.modified_count} tasks were no longer leased to {worker_id}")
+    return result.modified_count
+
+
+def run_task_counts(run_id: str) -> Dict[str, int]:
+    """Number of the run's tasks in each state."""
+    counts = {
+        row["_id"]: row["count"]
+        for row in tasks_collection.aggregate([
+            {"$match": {"run_id": run_id}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ])
+    }
+    return {state: counts.get(state, 0) for state in TASK_STATES}
+
+
+def run_task_keys(run_id: str, status: str) -> List[str]:
+    """Keys of the run's tasks in `status`."""
+    return [task["key"] for task in tasks_collection.find({"run_id": run_id, "status": status}, {"key": 1})]
+
+
+def run_finished(run_id: str) -> bool:
+    """True once none of the run's tasks are queued or leased."""
+    return tasks_collection.count_documents(
+        {"run_id": run_id, "status": {"$in": ["queued", "leased"]}}, limit=1
+    ) == 0
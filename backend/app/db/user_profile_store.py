@@ -0,0 +1,109 @@
+import os
+import json
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+db_path = os.getenv(
+    "USER_PROFILE_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "user_profiles.db")
+)
+
+
+def _connect():
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    return conn
+
+
+def init_db():
+    with _connect() as conn:
+        #WAL lets readers proceed while a like is being written; the mode persists in the file
+        conn.execute("PRAGMA journal_mode=WAL")
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS liked_articles (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id TEXT NOT NULL,
+                        article TEXT NOT NULL
+                    )''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_liked_articles_user ON liked_articles (user_id)")
+        c.execute('''CREATE TABLE IF NOT EXISTS user_embeddings (
+                        user_id TEXT PRIMARY KEY,
+                        embedding BLOB NOT NULL,
+                        updated_at TEXT NOT NULL
+                    )''')
+        conn.commit()
+
+
+def add_liked_article(user_id: str, article: Dict):
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO liked_articles (user_id, article) VALUES (?, ?)",
+            (user_id, json.dumps(article))
+        )
+        conn.commit()
+
+
+def get_liked_articles(user_id: str) -> List[Dict]:
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT article FROM liked_articles WHERE user_id = ? ORDER BY id", (user_id,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+def set_user_embedding(user_id: str, embedding):
+    blob = np.asarray(embedding, dtype="<f4").tobytes()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO user_embeddings (user_id, embedding, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET embedding = excluded.embedding, updated_at = excluded.updated_at",
+            (user_id, blob, datetime.utcnow().isoformat())
+        )
+        conn.commit()
+
+
+def get_user_embedding(user_id: str) -> Optional[np.ndarray]:
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT embedding FROM user_embeddings WHERE user_id = ?", (user_id,)
+        ).fetchone()
+    if not row:
+        return None
+    return np.frombuffer(row[0], dtype="<f4").astype(np.float32)
+
+
+def import_json(path: str) -> int:
+    """Load users from the old user_data.json format; returns the number of users imported."""
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    with _connect() as conn:
+        for user_id, profile in data.items():
+            conn.execute("DELETE FROM liked_articles WHERE user_id = ?", (user_id,))
+            conn.executemany(
+                "INSERT INTO liked_articles (user_id, article) VALUES (?, ?)",
+                [(user_id, json.dumps(a)) for a in profile.get("liked_articles", [])]
+            )
+        conn.commit()
+
+    for user_id, profile in data.items():
+        if profile.get("user_embedding"):
+            set_user_embedding(user_id, profile["user_embedding"])
+    return len(data)
+
+
+init_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="User profile store maintenance")
+    parser.add_argument("--import-json", metavar="PATH", required=True,
+                        help="Import users from a legacy user_data.json file")
+
+    args = parser.parse_args()
+    count = import_json(args.import_json)
+    print(f"Imported {count} users into {db_path}")
@@ -45,6 +45,15 @@ async def startup_event():
         print(f"❌ Warning - SQLite database error: {e}")
         print("Continuing without SQLite initialization...")
 
+    # Load the embedding model (or connect to the embedding server) before the first request
+    if os.getenv("EMBEDDER_WARMUP", "true").lower() == "true":
+        try:
+            from app.utils.embedder import warmup
+            warmup()
+            print("✅ Embedding model warmed up")
+        except Exception as e:
+            print(f"❌ Warning - embedding warmup failed: {e}")
+
 try:
     app.include_router(routes.router, prefix="/api")
     print(f"✅ API routes mounted with prefix '/api'")
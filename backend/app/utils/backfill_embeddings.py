@@ -0,0 +1,106 @@
+"""
+Embed summaries that were stored without an `embedding` field.
+
+    python -m app.utils.backfill_embeddings --batch-size 256 --workers 4
+
+Summaries are paged by _id and only those still missing an embedding are
+selected, so an interrupted run resumes where it stopped when started again.
+Batches are embedded in parallel worker processes and written back with
+bulk_write.
+"""
+import os
+import argparse
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+import pytz
+from pymongo import UpdateOne
+
+from app.db.mongodb import summaries_collection, summary_embedding_text
+from app.db.embedding_codec import encode_embedding
+from app.db.summary_snapshot import export_snapshot
+
+logger = logging.getLogger("backfill_embeddings")
+
+
+def _embed_batch(ids: list, texts: list):
+    """Runs in a worker process; each worker loads the model once on first use."""
+    from app.utils.embedder import get_embeddings
+    return ids, get_embeddings(texts)
+
+
+def _write_batch(ids: list, vectors) -> int:
+    embedded_at = datetime.now(pytz.UTC)
+    ops = [
+        UpdateOne(
+            {"_id": _id, "embedding": {"$exists": False}},
+            {"$set": {"embedding": encode_embedding(vector), "embedded_at": embedded_at}},
+        )
+        for _id, vector in zip(ids, vectors)
+    ]
+    return summaries_collection.bulk_write(ops, ordered=False).modified_count
+
+
+def _missing_batches(batch_size: int):
+    """Yield (ids, texts) pages of summaries lacking embeddings, in _id order."""
+    last_id = None
+    while True:
+        query = {"embedding": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        page = list(
+            summaries_collection.find(query, {"title": 1, "summary": 1})
+            .sort("_id", 1)
+            .limit(batch_size)
+        )
+        if not page:
+            return
+        last_id = page[-1]["_id"]
+        yield [doc["_id"] for doc in page], [summary_embedding_text(doc) for doc in page]
+
+
+def backfill_embeddings(batch_size: int = 256, workers: int = 1) -> int:
+    #the API workers' summary index refresh looks up backfilled summaries by embedded_at
+    summaries_collection.create_index("embedded_at")
+    total = summaries_collection.count_documents({"embedding": {"$exists": False}})
+    logger.info(f"{total} summaries missing embeddings")
+    if not total:
+        return 0
+
+    written = 0
+    if workers <= 1:
+        for ids, texts in _missing_batches(batch_size):
+            written += _write_batch(*_embed_batch(ids, texts))
+            logger.info(f"Embedded {written}/{total}")
+        return written
+
+    #spawn rather than fork so workers do not inherit this process's MongoClient;
+    #keep a bounded number of batches in flight so memory stays flat
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = set()
+        for ids, texts in _missing_batches(batch_size):
+            pending.add(pool.submit(_embed_batch, ids, texts))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    written += _write_batch(*future.result())
+                logger.info(f"Embedded {written}/{total}")
+        for future in wait(pending).done:
+            written += _write_batch(*future.result())
+    logger.info(f"Embedded {written}/{total}")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed summaries that have no embedding yet")
+    parser.add_argument("--batch-size", type=int, default=256, help="Summaries per embedding batch")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Embedding worker processes")
+
+    args = parser.parse_args()
+    count = backfill_embeddings(args.batch_size, args.workers)
+    if count:
+        export_snapshot(summaries_collection)
+    print(f"Backfill finished: {count} summaries embedded")
@@ -0,0 +1,109 @@
+"""
+Article text compaction before prompting.
+
+Input tokens drive both LLM latency and cost, so article text is cleaned
+before it goes into a prompt: GNews "[1234 chars]" truncation tails are
+stripped, the description is dropped when the content already starts with
+it, repeated sentences are removed, and the result is trimmed at a sentence
+boundary to a per-article token budget. Estimated savings are counted
+process-wide and reported by the callers.
+"""
+import os
+import re
+import threading
+from typing import Tuple
+
+#estimated tokens of article text per prompt
+ARTICLE_TOKEN_BUDGET = int(os.getenv("ARTICLE_TOKEN_BUDGET", "400"))
+#estimated tokens per stored summary in the Ask AI context
+AI_CONTEXT_SUMMARY_TOKENS = int(os.getenv("AI_CONTEXT_SUMMARY_TOKENS", "75"))
+
+#'... [1234 chars]' / '[+1234 chars]' tails added by the news APIs
+_TRUNCATION_TAIL = re.compile(r"\s*(?:\.\.\.|…)?\s*\[\+?\d+\s*chars?\]\s*$", re.IGNORECASE)
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+_lock = threading.Lock()
+_stats = {"texts": 0, "tokens_before": 0, "tokens_after": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _norm(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def strip_boilerplate(text: str) -> str:
+    return _TRUNCATION_TAIL.sub("", text or "").strip()
+
+
+def merge_description(description: str, content: str) -> str:
+    """Description and content as one text, without repeating the description the content starts with."""
+    description, content = strip_boilerplate(description), strip_boilerplate(content)
+    if not description or not content:
+        return description or content
+    d, c = _norm(description), _norm(content)
+    if d in c:
+        return content
+    if c in d:
+        #the content is a truncated copy of the description
+        return description
+    return f"{description}\n{content}"
+
+
+def dedupe_sentences(text: str) -> str:
+    seen = set()
+    sentences = []
+    for sentence in _SENTENCE_BREAK.split(text):
+        sentence = sentence.strip()
+        key = _norm(sentence)
+        if key and key not in seen:
+            seen.add(key)
+            sentences.append(sentence)
+    return " ".join(sentences)
+
+
+def trim_to_budget(text: str, budget: int) -> str:
+    """Cut text to about `budget` tokens, at a sentence boundary where possible."""
+    if estimate_tokens(text) <= budget:
+        return text
+    max_chars = max(0, (budget - 1) * 4)
+    kept = ""
+    for sentence in _SENTENCE_BREAK.split(text):
+        candidate = f"{kept} {sentence.strip()}".strip()
+        if len(candidate) > max_chars:
+            break
+        kept = candidate
+    if not kept:
+        #first sentence alone is over budget; cut at a word
+        kept = text[:max_chars].rsplit(" ", 1)[0].rstrip(" ,;:") + "..."
+    return kept
+
+
+def compact_content(description: str, content: str = "", budget: int = ARTICLE_TOKEN_BUDGET) -> Tuple[str, int]:
+    """Compacted article text and the estimated tokens it saves over `description\\ncontent`."""
+    before = estimate_tokens(f"{description or ''}\n{content or ''}")
+    text = trim_to_budget(dedupe_sentences(merge_description(description, content)), budget)
+    after = estimate_tokens(text)
+    with _lock:
+        _stats["texts"] += 1
+        _stats["tokens_before"] += before
+        _stats["tokens_after"] += after
+    return text, max(0, before - after)
+
+
+def compaction_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+    saved = stats["tokens_before"] - stats["tokens_after"]
+    stats["tokens_saved"] = saved
+    stats["saved_rate"] = saved / stats["tokens_before"] if stats["tokens_before"] else 0.0
+    return stats
+
+
+def reset_compaction_stats():
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
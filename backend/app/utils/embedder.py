@@ -1,6 +1,188 @@
-from sentence_transformers import SentenceTransformer
+import os
+import threading
+import logging
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    from .embedding_cache import EmbeddingCache
+except ImportError:
+    from app.utils.embedding_cache import EmbeddingCache
+
+load_dotenv()
+
+logger = logging.getLogger("embedder")
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+#"local" loads the model in this process; "server" sends texts to a shared
+#embedding_server process so the weights are resident once per host
+EMBEDDER_MODE = os.getenv("EMBEDDER_MODE", "local")
+EMBEDDER_ADDRESS = os.getenv("EMBEDDER_ADDRESS", "127.0.0.1:6543")
+#shared secret between the server and its clients; required in server mode, since
+#multiprocessing connections unpickle whatever an authenticated peer sends
+EMBEDDER_AUTHKEY = os.getenv("EMBEDDER_AUTHKEY", "").encode()
+if EMBEDDER_MODE == "server" and not EMBEDDER_AUTHKEY:
+    raise RuntimeError("EMBEDDER_MODE=server requires EMBEDDER_AUTHKEY to be set")
+
+#texts per forward pass for get_embeddings; 64 keeps padding waste low on CPU
+DEFAULT_BATCH_SIZE = 64
+
+_model = None
+_cache = None
+_client = None
+_lock = threading.Lock()
+
+
+def parse_address(address: str):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def get_model():
+    """Load the SentenceTransformer on first use; safe to call from many threads."""
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                logger.info(f"Loading embedding model {MODEL_NAME}")
+                _model = SentenceTransformer(MODEL_NAME)
+    return _model
+
+
+class _ServerClient:
+    """Connection to app.utils.embedding_server, shared by the threads of one worker."""
+
+    def __init__(self, address: str):
+        self.address = address
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+    def _connect(self):
+        from multiprocessing.connection import Client
+        return Client(parse_address(self.address), authkey=EMBEDDER_AUTHKEY)
+
+    def _call(self, *request):
+        with self._lock:
+            try:
+                self._conn.send(request)
+                ok, payload = self._conn.recv()
+            except (EOFError, OSError) as e:
+                #the server restarted; reconnect once and resend
+                logger.warning(f"Lost connection to embedding server ({e}); reconnecting")
+                self._conn.close()
+                self._conn = self._connect()
+                self._conn.send(request)
+                ok, payload = self._conn.recv()
+        if not ok:
+            raise RuntimeError(f"embedding server error: {payload}")
+        return payload
+
+    def dimension(self) -> int:
+        return self._call("dim")
+
+    def encode(self, texts: list, batch_size: int) -> np.ndarray:
+        return self._call("encode", texts, batch_size)
+
+
+def _get_client():
+    """Connect to the embedding server, or return None to fall back to a local model."""
+    global _client, EMBEDDER_MODE
+    if EMBEDDER_MODE != "server":
+        return None
+    if _client is None:
+        with _lock:
+            if _client is None and EMBEDDER_MODE == "server":
+                try:
+                    _client = _ServerClient(EMBEDDER_ADDRESS)
+                    logger.info(f"Using embedding server at {EMBEDDER_ADDRESS}")
+                except Exception as e:
+                    logger.warning(f"Embedding server unavailable ({e}); loading model locally")
+                    EMBEDDER_MODE = "local"
+    return _client
+
+
+def _fall_back_to_local(e: Exception):
+    global _client, EMBEDDER_MODE
+    logger.warning(f"Embedding server unreachable after reconnecting ({e}); loading model locally")
+    with _lock:
+        EMBEDDER_MODE = "local"
+        _client = None
+
+
+def _dimension() -> int:
+    client = _get_client()
+    if client is not None:
+        try:
+            return client.dimension()
+        except (EOFError, OSError) as e:
+            _fall_back_to_local(e)
+    return get_model().get_sentence_embedding_dimension()
+
+
+def _encode(texts: list, batch_size: int) -> np.ndarray:
+    client = _get_client()
+    if client is not None:
+        try:
+            return client.encode(texts, batch_size)
+        except (EOFError, OSError) as e:
+            _fall_back_to_local(e)
+    return get_model().encode(texts, batch_size=batch_size, convert_to_numpy=True).astype(np.float32)
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        dim = _dimension()
+        with _lock:
+            if _cache is None:
+                _cache = EmbeddingCache(MODEL_NAME, dim)
+    return _cache
+
+
+def warmup():
+    """Load the model (or connect to the server) and run one encode so the first request is fast."""
+    _encode(["warmup"], 1)
+    get_cache()
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
 
 def get_embedding(text):
-    return model.encode(text).tolist()
+    cache = get_cache()
+    cached = cache.get(text)
+    if cached is not None:
+        return cached.tolist()
+    vector = _encode([text], 1)[0]
+    cache.put(text, vector)
+    return vector.tolist()
+
+def get_embeddings(texts: list, batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+    """
+    Embed many texts at once and return a (len(texts), dim) float32 array.
+
+    Cached texts are served from the embedding cache; the rest are sorted by
+    length so each batch pads to a similar size, then rows are put back in
+    the caller's order.
+    """
+    cache = get_cache()
+    result = np.empty((len(texts), cache.dim), dtype=np.float32)
+    if not texts:
+        return result
+
+    cached = cache.get_many(texts)
+    for i, vector in cached.items():
+        result[i] = vector
+
+    misses = [i for i in range(len(texts)) if i not in cached]
+    order = sorted(misses, key=lambda i: len(texts[i]))
+    for start in range(0, len(order), batch_size):
+        batch_idx = order[start:start + batch_size]
+        batch = [texts[i] for i in batch_idx]
+        vectors = _encode(batch, len(batch))
+        result[batch_idx] = vectors
+        cache.put_many(batch, vectors)
+    return result
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters for the embedding cache, used to size EMBEDDING_CACHE_SIZE."""
+    return get_cache().stats()
@@ -0,0 +1,182 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+#entries kept in the in-process LRU tier
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+#directory for the on-disk tier; set to an empty string to disable it
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+#rows kept in the on-disk tier (~1.5 KB each at 384 dims); new texts are only cached in memory beyond it
+EMBEDDING_CACHE_DISK_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "500000"))
+
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier, content-addressed cache of embeddings keyed by (model, text).
+
+    The memory tier is a bounded LRU. The disk tier is a flat float32 file
+    read through np.memmap, with a SQLite table mapping each key to its row,
+    so cached vectors survive restarts and are shared between processes.
+    The disk tier is append-only and stops growing at max_disk_entries rows;
+    delete the cache directory to reclaim the space.
+    """
+
+    def __init__(self, model_name: str, dim: int,
+                 max_entries: int = EMBEDDING_CACHE_SIZE,
+                 cache_dir: Optional[str] = EMBEDDING_CACHE_DIR,
+                 max_disk_entries: int = EMBEDDING_CACHE_DISK_MAX_ENTRIES):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        self._vectors_path = None
+        self._mmap = None
+        if cache_dir:
+            safe_name = model_name.replace("/", "_")
+            os.makedirs(cache_dir, exist_ok=True)
+            self._vectors_path = os.path.join(cache_dir, f"{safe_name}.{dim}.f32")
+            self._conn = sqlite3.connect(
+                os.path.join(cache_dir, f"{safe_name}.{dim}.sqlite"),
+                check_same_thread=False,
+                timeout=30,
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "row INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE NOT NULL)"
+            )
+            self._conn.commit()
+            if not os.path.exists(self._vectors_path):
+                open(self._vectors_path, "ab").close()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _read_rows(self, rows: List[int]) -> np.ndarray:
+        """Read rows from the vector file, remapping it if another writer grew it."""
+        needed = max(rows) + 1
+        if self._mmap is None or self._mmap.shape[0] < needed:
+            total = os.path.getsize(self._vectors_path) // (self.dim * 4)
+            if total < needed:
+                raise KeyError("embedding row not yet written")
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                   shape=(total, self.dim))
+        return np.array(self._mmap[rows], dtype=np.float32)
+
+    def get_many(self, texts: List[str]) -> Dict[int, np.ndarray]:
+        """Return {position: vector} for every text that is already cached."""
+        found = {}
+        disk_lookup = {}
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = cache_key(self.model_name, text)
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    found[i] = vector
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup and self._conn is not None:
+                keys = list(disk_lookup)
+                rows_by_key = {}
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    for row, key in self._conn.execute(
+                        f"SELECT row, key FROM embeddings WHERE key IN ({placeholders})", chunk
+                    ):
+                        rows_by_key[key] = row - 1
+                if rows_by_key:
+                    try:
+                        vectors = self._read_rows(list(rows_by_key.values()))
+                    except KeyError:
+                        vectors = None
+                    if vectors is not None:
+                        for key, vector in zip(rows_by_key, vectors):
+                            self._remember(key, vector)
+                            for i in disk_lookup.pop(key):
+                                found[i] = vector
+                                self.disk_hits += 1
+
+            self.misses += sum(len(positions) for positions in disk_lookup.values())
+        return found
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        return self.get_many([text]).get(0)
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+        with self._lock:
+            new = {}
+            for text, vector in zip(texts, vectors):
+                key = cache_key(self.model_name, text)
+                self._remember(key, vector)
+                new[key] = vector
+            if self._conn is None or not new:
+                return
+            with self._conn:
+                #BEGIN IMMEDIATE takes the write lock up front, so processes sharing the
+                #cache directory allocate rows one at a time
+                self._conn.execute("BEGIN IMMEDIATE")
+                (rows,) = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'embeddings'"
+                ).fetchone()
+                with open(self._vectors_path, "r+b") as f:
+                    for key, vector in new.items():
+                        if rows >= self.max_disk_entries:
+                            break
+                        #another process may have cached the same text meanwhile
+                        cursor = self._conn.execute(
+                            "INSERT OR IGNORE INTO embeddings (key) VALUES (?)", (key,)
+                        )
+                        if cursor.rowcount == 0:
+                            continue
+                        #the row is only visible to readers once this transaction commits,
+                        #after its vector has been written
+                        row = cursor.lastrowid - 1
+                        f.seek(row * self.dim * 4)
+                        f.write(vector.tobytes())
+                        rows = row + 1
+
+    def put(self, text: str, vector):
+        self.put_many([text], np.asarray(vector, dtype=np.float32).reshape(1, -1))
+
+    def stats(self) -> Dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        disk_entries = 0
+        if self._conn is not None:
+            with self._lock:
+                disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "model": self.model_name,
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._lru),
+            "memory_capacity": self.max_entries,
+            "disk_entries": disk_entries,
+        }
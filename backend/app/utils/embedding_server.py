@@ -0,0 +1,72 @@
+"""
+Dedicated embedding process shared by every API worker on a host.
+
+Run once per host:
+    EMBEDDER_AUTHKEY=<secret> python -m app.utils.embedding_server
+and start the API workers with EMBEDDER_MODE=server and the same
+EMBEDDER_AUTHKEY so they send texts here instead of each loading their own
+copy of the SentenceTransformer weights.
+"""
+import logging
+import threading
+from multiprocessing.connection import Listener
+
+import numpy as np
+
+from app.utils.embedder import (
+    EMBEDDER_ADDRESS, EMBEDDER_AUTHKEY, get_model, parse_address
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("embedding_server")
+
+
+def handle_connection(conn, model):
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            try:
+                if request[0] == "dim":
+                    conn.send((True, model.get_sentence_embedding_dimension()))
+                elif request[0] == "encode":
+                    _, texts, batch_size = request
+                    vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+                    conn.send((True, np.asarray(vectors, dtype=np.float32)))
+                else:
+                    conn.send((False, f"unknown request {request[0]!r}"))
+            except Exception as e:
+                logger.error(f"Error handling {request[0]!r}: {e}")
+                conn.send((False, str(e)))
+    finally:
+        conn.close()
+
+
+def serve(address: str = EMBEDDER_ADDRESS):
+    if not EMBEDDER_AUTHKEY:
+        #requests are unpickled, so an unauthenticated listener would run code for any local process
+        raise SystemExit("Set EMBEDDER_AUTHKEY to a secret shared with the API workers")
+    model = get_model()
+    listener = Listener(parse_address(address), authkey=EMBEDDER_AUTHKEY)
+    logger.info(f"Embedding server listening on {address}")
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                #a client with the wrong authkey should not take the server down
+                logger.warning(f"Rejected connection: {e}")
+                continue
+            threading.Thread(target=handle_connection, args=(conn, model), daemon=True).start()
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    serve()
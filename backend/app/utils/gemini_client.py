@@ -0,0 +1,112 @@
+"""
+Shared Gemini access for the batch jobs.
+
+One GenerativeModel per model name is created lazily and reused. Every call
+goes through process-wide token buckets for requests and tokens per minute
+and is retried with exponential backoff on 429 and 5xx responses, so many
+threads can summarize concurrently without tripping the API quotas.
+"""
+import os
+import time
+import random
+import threading
+import logging
+
+from dotenv import load_dotenv
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from app.utils.compaction import estimate_tokens
+
+load_dotenv()
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+logger = logging.getLogger("gemini_client")
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-1.5-pro-latest")
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+#first backoff in seconds; doubles per attempt up to GEMINI_MAX_BACKOFF
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "2"))
+GEMINI_MAX_BACKOFF = float(os.getenv("GEMINI_MAX_BACKOFF", "60"))
+
+#output tokens are unknown until the response arrives; reserve this many per call
+_OUTPUT_TOKENS_ESTIMATE = 512
+
+#429 and 5xx responses worth retrying
+_RETRYABLE = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1):
+        """Block until `amount` units are available, then take them."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_request_bucket = TokenBucket(GEMINI_REQUESTS_PER_MINUTE)
+_token_bucket = TokenBucket(GEMINI_TOKENS_PER_MINUTE)
+
+_models = {}
+_lock = threading.Lock()
+
+
+def get_model(model_name: str = GEMINI_MODEL):
+    """The shared GenerativeModel for `model_name`, created on first use."""
+    model = _models.get(model_name)
+    if model is None:
+        with _lock:
+            model = _models.get(model_name)
+            if model is None:
+                model = _models[model_name] = genai.GenerativeModel(model_name)
+    return model
+
+
+def generate_text(prompt: str, model_name: str = GEMINI_MODEL, generation_config: dict = None,
+                  output_tokens: int = _OUTPUT_TOKENS_ESTIMATE) -> str:
+    """
+    Rate-limited generate_content returning the stripped response text.
+    `generation_config` is passed through, e.g. {"response_mime_type": "application/json"};
+    `output_tokens` is the expected response size reserved against the token budget.
+    Retries 429/5xx with exponential backoff and jitter; other errors and the
+    final failed attempt are raised to the caller.
+    """
+    model = get_model(model_name)
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        _request_bucket.acquire()
+        _token_bucket.acquire(estimate_tokens(prompt) + output_tokens)
+        try:
+            return model.generate_content(prompt, generation_config=generation_config).text.strip()
+        except _RETRYABLE as e:
+            if attempt == GEMINI_MAX_RETRIES:
+                raise
+            delay = min(GEMINI_MAX_BACKOFF, GEMINI_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning(f"Gemini call failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
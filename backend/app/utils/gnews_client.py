@@ -0,0 +1,174 @@
+"""
+Shared GNews API client.
+
+All GNews calls go through one pooled keep-alive session with strict
+timeouts and retries on 429/5xx. Responses are cached per query (API token
+excluded) for GNEWS_CACHE_TTL_SECONDS, identical queries already in flight
+wait for that request instead of issuing their own, and search() walks
+result pages until it has enough articles.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("gnews_client")
+
+GNEWS_API_KEY = os.getenv("GNEWS_API_KEY")
+GNEWS_BASE_URL = os.getenv("GNEWS_BASE_URL", "https://gnews.io/api/v4")
+#(connect, read) timeouts in seconds
+GNEWS_TIMEOUT = (float(os.getenv("GNEWS_CONNECT_TIMEOUT", "3.05")), float(os.getenv("GNEWS_READ_TIMEOUT", "10")))
+GNEWS_CACHE_TTL_SECONDS = float(os.getenv("GNEWS_CACHE_TTL_SECONDS", "900"))
+GNEWS_CACHE_SIZE = int(os.getenv("GNEWS_CACHE_SIZE", "256"))
+#articles per request allowed by the plan (10 on the free plan, up to 100 on paid plans)
+GNEWS_PAGE_SIZE = int(os.getenv("GNEWS_PAGE_SIZE", "10"))
+GNEWS_MAX_PAGES = int(os.getenv("GNEWS_MAX_PAGES", "10"))
+
+
+def _new_session() -> requests.Session:
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        backoff_factor=1.0,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GNewsClient:
+    def __init__(self, api_key: str = GNEWS_API_KEY, base_url: str = GNEWS_BASE_URL,
+                 ttl_seconds: float = GNEWS_CACHE_TTL_SECONDS, cache_size: int = GNEWS_CACHE_SIZE):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.ttl_seconds = ttl_seconds
+        self.cache_size = cache_size
+        self.session = _new_session()
+        self._lock = threading.Lock()
+        #key -> (expires_at, data, validators); LRU ordered
+        self._cache = OrderedDict()
+        self._in_flight: Dict[tuple, _InFlight] = {}
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def _key(endpoint: str, params: dict) -> tuple:
+        return (endpoint,) + tuple(sorted((k, str(v)) for k, v in params.items() if k != "token"))
+
+    def _fetch(self, endpoint: str, params: dict, validators: dict) -> tuple:
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        with self._lock:
+            self.requests += 1
+        response = self.session.get(
+            f"{self.base_url}/{endpoint}",
+            params={**params, "token": self.api_key},
+            headers=headers,
+            timeout=GNEWS_TIMEOUT,
+        )
+        if response.status_code == 304:
+            return None, validators
+        response.raise_for_status()
+        return response.json(), {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+    def get(self, endpoint: str, params: dict) -> dict:
+        """GET an API endpoint, served from the TTL cache or a matching in-flight request when possible."""
+        key = self._key(endpoint, params)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return entry[1]
+            waiting = self._in_flight.get(key)
+            if waiting is None:
+                waiting = self._in_flight[key] = _InFlight()
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            waiting.done.wait()
+            if waiting.error is not None:
+                raise waiting.error
+            return waiting.result
+
+        try:
+            #an expired entry is revalidated with its ETag/Last-Modified if the API sent them
+            stale_data, validators = (entry[1], entry[2]) if entry else (None, {})
+            data, validators = self._fetch(endpoint, params, validators)
+            if data is None:
+                data = stale_data
+            with self._lock:
+                self._cache[key] = (time.monotonic() + self.ttl_seconds, data, validators)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            waiting.result = data
+            return data
+        except Exception as e:
+            waiting.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            waiting.done.set()
+
+    def iter_search(self, query: str, max_articles: int = 10, **params) -> Iterator[dict]:
+        """Yield up to `max_articles` search results, requesting further pages as needed."""
+        page_size = max(1, min(GNEWS_PAGE_SIZE, max_articles))
+        yielded = 0
+        for page in range(1, GNEWS_MAX_PAGES + 1):
+            data = self.get("search", {**params, "q": query, "max": page_size, "page": page})
+            articles = data.get("articles", [])
+            for article in articles[:max_articles - yielded]:
+                yield article
+            yielded += min(len(articles), max_articles - yielded)
+            total = data.get("totalArticles")
+            if yielded >= max_articles or len(articles) < page_size or (total is not None and page * page_size >= total):
+                return
+
+    def search(self, query: str, max_articles: int = 10, **params) -> List[dict]:
+        return list(self.iter_search(query, max_articles, **params))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "cache_hits": self.cache_hits,
+                "coalesced": self.coalesced,
+                "cached_queries": len(self._cache),
+            }
+
+
+#process-wide client shared by the fetchers
+gnews = GNewsClient()
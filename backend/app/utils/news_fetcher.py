@@ -1,10 +1,12 @@
-import os
+import string
 import requests
-from dotenv import load_dotenv
+from collections import Counter
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
-load_dotenv()
-
-GNEWS_API_KEY = os.getenv("GNEWS_API_KEY")
+try:
+    from .gnews_client import gnews
+except ImportError:
+    from app.utils.gnews_client import gnews
 
 #tech related keywords for filtering
 TECH_KEYWORDS = {
@@ -16,40 +18,93 @@ TECH_KEYWORDS = {
     '5g', 'iot', 'internet of things', 'startup', 'innovation'
 }
 
+#query parameters that only track where a click came from
+TRACKING_PARAMS = {'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref', 'ref_src', 'cmpid', 'ocid'}
+
+def canonical_url(url: str) -> str:
+    """Normalize an article URL so the same story from different links maps to one key."""
+    parts = urlsplit((url or '').strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith('utm_') and k.lower() not in TRACKING_PARAMS
+    ))
+    path = parts.path.rstrip('/') or '/'
+    #drop the fragment and treat http/https as the same article
+    return urlunsplit(('https', host, path, query, ''))
+
+#punctuation becomes whitespace, so str.split() yields the words of an article
+_WORD_SEPARATORS = str.maketrans({c: ' ' for c in string.punctuation + '‘’“”–—…'})
+#single-word keywords and their plurals ('startups' -> 'startup'); two-letter acronyms get
+#no plural, since 'mls' or 'ais' are far more often something else
+_KEYWORD_WORDS = {k: k for k in TECH_KEYWORDS if ' ' not in k}
+_KEYWORD_WORDS.update({f'{k}s': k for k in list(_KEYWORD_WORDS) if len(k) >= 3 and f'{k}s' not in _KEYWORD_WORDS})
+#multi-word keywords, space-padded so they only match whole words
+_KEYWORD_PHRASES = [(k, f' {k} ', f' {k}s ') for k in sorted(TECH_KEYWORDS) if ' ' in k]
+
+def _words(text: str) -> list:
+    return (text or '').lower().translate(_WORD_SEPARATORS).split()
+
+def match_tech_keywords(text: str) -> Counter:
+    """
+    Count of each TECH_KEYWORDS entry found in the text as a whole word or
+    phrase. The text is tokenized once and words are matched with dict
+    lookups, so short keys like 'ai' or 'api' no longer hit inside 'email'
+    or 'rapid'.
+    """
+    words = _words(text)
+    matches = Counter(_KEYWORD_WORDS[w] for w in words if w in _KEYWORD_WORDS)
+    joined = f" {' '.join(words)} "
+    for phrase, padded, plural in _KEYWORD_PHRASES:
+        count = joined.count(padded) + joined.count(plural)
+        if count:
+            matches[phrase] += count
+            #'software engineering' should not also count as 'software'
+            for word in phrase.split():
+                if word in matches:
+                    matches[word] -= count
+    return +matches
+
 def is_tech_related(text: str) -> bool:
     """Check if the article is tech-related based on its content."""
-    text = text.lower()
-    return any(keyword in text for keyword in TECH_KEYWORDS)
+    words = _words(text)
+    if not _KEYWORD_WORDS.keys().isdisjoint(words):
+        return True
+    joined = f" {' '.join(words)} "
+    return any(padded in joined or plural in joined for _, padded, plural in _KEYWORD_PHRASES)
 
-def fetch_articles(topic: str, max_articles: int = 5):
+def fetch_articles(topic: str, max_articles: int = 5, raise_errors: bool = False):
+    #with raise_errors, a failed request raises instead of looking like a topic with no news
     tech_topic = f"technology {topic}"
     
-    url = "https://gnews.io/api/v4/search"
     params = {
-        "q": tech_topic,
         "lang": "en",
-        "max": max_articles * 2,
         "topic": "technology",  #im using the gnews technology category
-        "token": GNEWS_API_KEY
     }
 
-    response = requests.get(url, params=params)
-    data = response.json()
-
     articles = []
-    for article in data.get("articles", []):
-        #combine title and content for keyword checking
-        full_text = f"{article['title']} {article.get('description', '')} {article.get('content', '')}"
-          #only include it if its tech-related
-        if is_tech_related(full_text):
-            articles.append({
-                "id": article["url"],
-                "title": article["title"],
-                "content": f"{article.get('description', '')}\n{article.get('content', '')}",
-                "urlToImage": article.get("image", "")  # Include the image URL from GNews API
-            })
-            
-            if len(articles) >= max_articles:
-                break
+    try:
+        #pages are requested lazily, so stopping early saves quota
+        for article in gnews.iter_search(tech_topic, max_articles * 2, **params):
+            #combine title and content for keyword checking
+            full_text = f"{article['title']} {article.get('description', '')} {article.get('content', '')}"
+            #only include it if its tech-related
+            if is_tech_related(full_text):
+                articles.append({
+                    "id": article["url"],
+                    "title": article["title"],
+                    #raw text; summarize_topic compacts it when building its prompt
+                    "content": f"{article.get('description', '')}\n{article.get('content', '')}",
+                    "urlToImage": article.get("image", "")  # Include the image URL from GNews API
+                })
+                
+                if len(articles) >= max_articles:
+                    break
+    except requests.RequestException as e:
+        if raise_errors:
+            raise
+        print(f"Error fetching articles for {topic}: {e}")
 
     return articles
@@ -2,8 +2,9 @@ from app.db.likes_db import get_liked_articles
 from app.utils.news_fetcher import fetch_articles
 from app.utils.retriever import ingest_articles
 from app.utils.summarizer import summarize_topic
-from app.utils.embedder import get_embedding
-from app.db.mongodb import get_similar_summaries
+from app.utils.embedder import get_embeddings
+from app.db.mongodb import get_similar_summaries, get_similar_summaries_many
+from app.utils.user_preferences import get_user_preference_vector
 from typing import List, Dict, Any
 
 def generate_tech_news_digest(user_id: str):
@@ -50,20 +51,15 @@ def get_personalized_feed(user_id: str, summaries_per_topic: int = 2) -> List[Di
     if not liked_articles:
         return []
 
-    all_summaries = []
-    for article_id in liked_articles:
-        topic_embedding = get_embedding(article_id)
-        similar_summaries = get_similar_summaries(topic_embedding, limit=summaries_per_topic)
-        all_summaries.extend(similar_summaries)
-
-    #remove duplicates
-    seen = set()
-    unique_summaries = []
-    for s in all_summaries:
-        sid = str(s.get('_id'))
-        if sid not in seen:
-            seen.add(sid)
-            unique_summaries.append(s)
+    #prefer the incrementally maintained preference vector: one dot product per summary, no re-embedding
+    preference = get_user_preference_vector({"email": user_id})
+    if preference is not None:
+        unique_summaries = get_similar_summaries(preference, limit=summaries_per_topic * len(liked_articles))
+    else:
+        #embed every liked item in one batch and score them all against the index in one pass;
+        #results come back already deduplicated across liked items
+        topic_embeddings = get_embeddings(liked_articles)
+        unique_summaries = get_similar_summaries_many(topic_embeddings, limit=summaries_per_topic)
 
     unique_summaries.sort(key=lambda x: x.get('date', ''), reverse=True)
     return unique_summaries
@@ -0,0 +1,197 @@
+"""
+Small streaming pipeline for the batch jobs.
+
+Stages run in their own worker threads and are connected by bounded queues,
+so a slow stage applies backpressure upstream instead of letting items pile
+up in memory. Each stage function takes a list of items (its batch) and
+returns the items to pass downstream, which lets one stage filter, dedupe
+or fan out. process() instead runs a single batch through every stage in
+the caller's thread. Per-stage throughput and queue depth are logged
+periodically and returned from run().
+"""
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Iterable, List
+
+logger = logging.getLogger("pipeline")
+
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[[list], Iterable], workers: int = 1,
+                 batch_size: int = 1, queue_size: int = None, batch_wait: float = 0.5):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        #input queue bound; enough to keep every worker's next batch ready
+        self.queue_size = queue_size or max(16, 2 * self.workers * self.batch_size)
+        #how long a worker waits to fill a partial batch before processing it
+        self.batch_wait = batch_wait
+
+        self.received = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def stats(self, elapsed: float, depth: int = 0) -> dict:
+        with self._lock:
+            return {
+                "received": self.received,
+                "emitted": self.emitted,
+                "errors": self.errors,
+                "per_second": round(self.received / elapsed, 2) if elapsed else 0.0,
+                "busy_seconds": round(self.busy_seconds, 2),
+                "queue_depth": depth,
+                "max_queue_depth": self.max_depth,
+                "queue_size": self.queue_size,
+            }
+
+
+class Pipeline:
+    def __init__(self, name: str, stages: List[Stage], report_seconds: float = 10.0,
+                 source_name: str = "source"):
+        self.name = name
+        self.stages = stages
+        self.report_seconds = report_seconds
+        self.source_name = source_name
+        self.source_items = 0
+        self.source_errors = 0
+        self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+        self._start = None
+        self._lock = threading.Lock()
+
+    def _put(self, index: int, item):
+        if index == len(self.stages):
+            return
+        q = self._queues[index]
+        q.put(item)
+        stage = self.stages[index]
+        depth = q.qsize()
+        if depth > stage.max_depth:
+            with stage._lock:
+                stage.max_depth = max(stage.max_depth, depth)
+
+    def _next_batch(self, index: int):
+        """Block for one item, then fill the batch for up to batch_wait; None once the input is done."""
+        stage, q = self.stages[index], self._queues[index]
+        first = q.get()
+        if first is _DONE:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + stage.batch_wait
+        while len(batch) < stage.batch_size:
+            try:
+                item = q.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _DONE:
+                #leave the marker for this stage's other workers / our next call
+                q.put(_DONE)
+                break
+            batch.append(item)
+        return batch
+
+    def _apply(self, stage: Stage, batch: list) -> list:
+        """Run one batch through `stage`; a failing batch is logged, counted and dropped."""
+        start = time.time()
+        try:
+            out = list(stage.fn(batch) or [])
+        except Exception as e:
+            out = []
+            with stage._lock:
+                stage.errors += 1
+            logger.error(f"{self.name}/{stage.name}: batch of {len(batch)} failed: {e}")
+        with stage._lock:
+            stage.received += len(batch)
+            stage.emitted += len(out)
+            stage.busy_seconds += time.time() - start
+        return out
+
+    def _worker(self, index: int, remaining: list):
+        stage = self.stages[index]
+        while True:
+            batch = self._next_batch(index)
+            if batch is None:
+                break
+            for item in self._apply(stage, batch):
+                self._put(index + 1, item)
+
+        #the last worker of a stage to finish closes the next stage's input
+        with stage._lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last and index + 1 < len(self.stages):
+            self._put(index + 1, _DONE)
+        elif not last:
+            self._queues[index].put(_DONE)
+
+    def stats(self) -> dict:
+        elapsed = time.time() - self._start if self._start else 0.0
+        stats = {self.source_name: {
+            "emitted": self.source_items,
+            "errors": self.source_errors,
+            "per_second": round(self.source_items / elapsed, 2) if elapsed else 0.0,
+        }}
+        for i, stage in enumerate(self.stages):
+            stats[stage.name] = stage.stats(elapsed, self._queues[i].qsize())
+        return stats
+
+    def _report(self, done: threading.Event):
+        while not done.wait(self.report_seconds):
+            stats = self.stats()
+            source = stats.pop(self.source_name)
+            logger.info(f"{self.name}: {self.source_name} {source['emitted']} out; " + "; ".join(
+                f"{name} {s['received']} in/{s['emitted']} out ({s['per_second']}/s, queue {s['queue_depth']}/{s['queue_size']})"
+                for name, s in stats.items()
+            ))
+
+    def process(self, batch: list) -> list:
+        """
+        Run one batch through every stage in the calling thread, for callers
+        that pull their own work instead of streaming a source through run().
+        Safe to call from several threads; returns what the last stage emitted.
+        """
+        if self._start is None:
+            self._start = time.time()
+        with self._lock:
+            self.source_items += len(batch)
+        for stage in self.stages:
+            if not batch:
+                break
+            batch = self._apply(stage, batch)
+        return batch
+
+    def run(self, source: Iterable) -> dict:
+        """Feed `source` through every stage and block until all of them drain; returns stats()."""
+        self._start = time.time()
+        remaining = [stage.workers for stage in self.stages]
+        threads = [
+            threading.Thread(target=self._worker, args=(i, remaining), name=f"{self.name}-{stage.name}-{w}", daemon=True)
+            for i, stage in enumerate(self.stages)
+            for w in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        done = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(done,), daemon=True)
+        reporter.start()
+
+        try:
+            for item in source:
+                self._put(0, item)
+                self.source_items += 1
+        except Exception as e:
+            self.source_errors += 1
+            logger.error(f"{self.name}: source failed: {e}")
+        finally:
+            self._put(0, _DONE)
+            for thread in threads:
+                thread.join()
+            done.set()
+        return self.stats()
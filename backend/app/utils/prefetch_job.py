@@ -1,95 +1,225 @@
 import os
+import json
+import threading
 import requests
 from datetime import datetime, timedelta
 import pytz
 from dotenv import load_dotenv
-import google.generativeai as genai
-from app.utils.news_fetcher import TECH_KEYWORDS, is_tech_related
-from app.db.mongodb import db
+from typing import Optional
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateOne
+from app.utils.news_fetcher import TECH_KEYWORDS, match_tech_keywords, canonical_url
+from app.utils.gnews_client import gnews, GNEWS_PAGE_SIZE, GNEWS_MAX_PAGES
+from app.utils.gemini_client import generate_text, GEMINI_MODEL
+from app.utils.compaction import compact_content, estimate_tokens, compaction_stats, reset_compaction_stats
+from app.utils.pipeline import Pipeline, Stage
+from app.utils.embedder import get_embeddings
+from app.utils.topic_classifier import TOPICS, normalize_topic, topic_classifier, article_topic_text
+from app.db.mongodb import db, summary_index, attach_summary_embeddings, llm_cache
+from app.db.llm_cache import llm_cache_key
+from app.db.job_runs import (resume_or_start, add_items, advance_items, get_items, finish_run,
+                              finish_run_once, update_run, runs_collection, format_run_status)
+from app.db.task_queue import enqueue_tasks, requeue_failed, run_task_counts, run_task_keys, run_finished
+from app.db.summary_snapshot import export_snapshot
+from app.db.embedding_codec import encode_embedding
 import re
 import sys
 import argparse
 
 load_dotenv()
 
-GNEWS_API_KEY = os.getenv("GNEWS_API_KEY")
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Concurrent Gemini calls; request/token rates are limited in gemini_client
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "8"))
+# Articles packed into one Gemini request (1 disables batching)
+PREFETCH_BATCH_SIZE = int(os.getenv("PREFETCH_BATCH_SIZE", "5"))
+# Raw GNews articles one run requests, across all of its fetch windows
+PREFETCH_MAX_ARTICLES = int(os.getenv("PREFETCH_MAX_ARTICLES", "100"))
+# Publish-time windows left to re-read later (fetch cut short, articles failed); oldest dropped beyond this
+PREFETCH_MAX_BACKLOG = int(os.getenv("PREFETCH_MAX_BACKLOG", "20"))
 
 summaries_collection = db['summaries']
+# Per-job bookkeeping such as the prefetch publishedAt high-water mark
+job_state_collection = db['job_state']
 
 # Central Time timezone
 CENTRAL_TZ = pytz.timezone('US/Central')
 
-def fetch_latest_tech_articles(max_articles: int = 50):
-    """Fetch all available tech articles from the last 24 hours"""
+def parse_published_at(value: str):
+    """Parse a GNews publishedAt timestamp (e.g. 2024-05-01T12:00:00Z) to an aware UTC datetime"""
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=pytz.UTC)
+    except (TypeError, ValueError):
+        return None
+
+def _gnews_time(value: datetime, round_up: bool = False) -> str:
+    """UTC timestamp for a GNews query, in whole minutes so repeated queries hit the client cache"""
+    value = value.astimezone(pytz.UTC)
+    if round_up and (value.second or value.microsecond):
+        value += timedelta(minutes=1)
+    return value.replace(second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def iter_gnews_articles(max_articles: int = 50, since: datetime = None, until: datetime = None,
+                        window: dict = None):
+    """
+    Yield raw GNews tech articles published after `since` (default: the last
+    24 hours) and up to `until`, newest first. When given, `window` records
+    the newest and oldest publishedAt yielded and whether GNews had nothing
+    more in the range ("complete").
+    """
     
-    # Calculate 24 hours ago in Central Time
-    now_central = datetime.now(CENTRAL_TZ)
-    yesterday_central = now_central - timedelta(days=1)
+    if since is None:
+        # Calculate 24 hours ago in Central Time
+        now_central = datetime.now(CENTRAL_TZ)
+        since = now_central - timedelta(days=1)
     
     # Convert to UTC for API (GNews expects UTC)
-    yesterday_utc = yesterday_central.astimezone(pytz.UTC)
-    from_date = yesterday_utc.strftime("%Y-%m-%dT%H:%M:%SZ")
-    
-    url = "https://gnews.io/api/v4/search"
+    from_date = _gnews_time(since)
     params = {
-        "q": "technology",  # General tech query
         "lang": "en",
-        "max": max_articles,
         "from": from_date,
         "sortby": "publishedAt",
-        "token": GNEWS_API_KEY
     }
-
+    if until is not None:
+        params["to"] = _gnews_time(until, round_up=True)
+    window = window if window is not None else {}
+    window.update(newest=None, oldest=None, complete=False)
+    
+    # General tech query; further pages are fetched as the pipeline consumes them
+    count = 0
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        articles = []
-        for article in data.get("articles", []):
-            # Combine title and content for keyword checking
-            full_text = f"{article['title']} {article.get('description', '')} {article.get('content', '')}"
-              # Only include if it's tech-related
-            if is_tech_related(full_text):
-                articles.append({
-                    "title": article["title"],
-                    "content": f"{article.get('description', '')}\n{article.get('content', '')}",
-                    "url": article["url"],
-                    "published_at": article.get("publishedAt", ""),
-                    "urlToImage": article.get("image", "")  # Include the image URL from GNews API
-                })
-        
-        print(f"Fetched {len(articles)} tech articles from the last 24 hours")
-        return articles
-        
-    except Exception as e:
-        print(f"Error fetching articles: {e}")
-        return []
+        for article in gnews.iter_search("technology", max_articles, **params):
+            count += 1
+            published = parse_published_at(article.get("publishedAt"))
+            if published:
+                window["newest"] = max(window["newest"] or published, published)
+                window["oldest"] = min(window["oldest"] or published, published)
+            yield article
+    except requests.RequestException as e:
+        # Raised on to the pipeline, which counts it as a source error and fails the run
+        print(f"Error fetching articles after {count}: {e}")
+        raise
+    
+    # Fewer articles than could be requested means the range is exhausted
+    window["complete"] = count < min(max_articles, GNEWS_PAGE_SIZE * GNEWS_MAX_PAGES)
+    print(f"Fetched {count} articles published between {from_date} and {params.get('to', 'now')}"
+          + ("" if window["complete"] else " (more left)"))
+
+def iter_fetch_windows(windows: list, max_articles: int = PREFETCH_MAX_ARTICLES):
+    """Raw articles of each fetch window in turn, sharing one budget of `max_articles`"""
+    budget = max_articles
+    for window in windows:
+        if budget <= 0:
+            break
+        for article in iter_gnews_articles(budget, window["from"], window.get("to"), window):
+            budget -= 1
+            yield article
+
+def tech_article(article: dict):
+    """Summarizer fields for a raw GNews article if it is tech-related, else None"""
+    # Combine title and content for keyword checking
+    full_text = f"{article['title']} {article.get('description', '')} {article.get('content', '')}"
+    keywords = match_tech_keywords(full_text)
+    if not keywords:
+        return None
+    result = to_article(article)
+    # Matched keywords, most frequent first, kept for scoring
+    result["keywords"] = [k for k, _ in keywords.most_common()]
+    return result
+
+def to_article(article: dict) -> dict:
+    """Article fields used by the summarizer, from a raw GNews article"""
+    # Description + content without repeats or truncation tails, trimmed to ARTICLE_TOKEN_BUDGET
+    content, tokens_saved = compact_content(article.get('description', ''), article.get('content', ''))
+    return {
+        "title": article["title"],
+        "content": content,
+        "tokens_saved": tokens_saved,
+        "url": article["url"],
+        "source_url": canonical_url(article["url"]),
+        "published_at": article.get("publishedAt", ""),
+        "urlToImage": article.get("image", "")  # Include the image URL from GNews API
+    }
+
+def fetch_latest_tech_articles(max_articles: int = 50, since: datetime = None):
+    """Fetch tech articles published after `since` (default: the last 24 hours)"""
+    # Only include if it's tech-related
+    articles = [a for a in map(tech_article, iter_gnews_articles(max_articles, since)) if a]
+    print(f"Fetched {len(articles)} tech articles")
+    return articles
+
+# Bump when either summary prompt changes so cached results are regenerated
+SUMMARY_PROMPT_VERSION = "article-summary-v2"
+
+class BatchSummaryItem(BaseModel):
+    """One element of the JSON array returned for a batched prompt"""
+    index: int
+    title: str
+    topic: Optional[str] = None  # only asked for articles the local classifier left open
+    summary: str
+
+def clean_summary_result(title: str, topic: str, summary: str) -> dict:
+    """Strip markdown from the generated title/summary and map the topic to a canonical id"""
+    title = re.sub(r'([\*_\-`#>|])', '', title).strip()
+    summary = re.sub(r'([\*_\-`#>|]|\n\s*\n|\n\s*\*|\n\s*\d+\.|\n\s*\-|\n\s*\+)', ' ', summary)
+    summary = re.sub(r'\s+', ' ', summary).strip()
+    
+    # Canonical lowercase topic id
+    topic = normalize_topic(topic)
+    
+    return {
+        "title": title,
+        "topic": topic,
+        "summary": summary
+    }
 
-def generate_summary_and_topic(article: dict) -> dict:
-    """Generate both summary and topic for a single article using Gemini"""
+def article_cache_key(article: dict) -> str:
+    """LLM cache key for an article's summary; results with and without an LLM topic are kept apart"""
+    version = SUMMARY_PROMPT_VERSION if article.get("topic") else f"{SUMMARY_PROMPT_VERSION}+topic"
+    return llm_cache_key(version, GEMINI_MODEL, article.get('url', ''),
+                         f"{article['title']}\n{article['content']}")
+
+def apply_classified_topic(article: dict, result: dict) -> dict:
+    """Prefer the local classifier's topic over the LLM's and record where it came from"""
+    if article.get("topic"):
+        return {**result, "topic": article["topic"], "topic_source": "classifier"}
+    return {**result, "topic_source": "llm"}
+
+def log_prompt_tokens(prompt: str, articles: list):
+    """Per-call prompt size and what compaction saved on it"""
+    saved = sum(article.get("tokens_saved", 0) for article in articles)
+    print(f"Prompt for {len(articles)} article(s): ~{estimate_tokens(prompt)} tokens "
+          f"(~{saved} saved by compaction)")
+
+def generate_summary_and_topic(article: dict, use_cache: bool = True) -> dict:
+    """Generate the summary (and the topic, unless already classified) for a single article using Gemini"""
     
+    key = article_cache_key(article)
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached:
+            return apply_classified_topic(article, cached)
+    
+    # Only ask for a topic the local classifier could not settle
+    classify = not article.get("topic")
+    topic_step = f"3. Classify it into ONE of these tech topics: {', '.join(TOPICS[:-1])}, or Other\n" if classify else ""
+    topic_line = "TOPIC: [single topic from the list above]\n" if classify else ""
     prompt = f"""
 You are a tech news analyzer. For the following tech article, you need to:
 
 1. Generate a clear, informative title (if different from original)
 2. Create a concise 1-2 paragraph summary
-3. Classify it into ONE of these tech topics: AI, Machine Learning, Cybersecurity, Cloud Computing, Software Engineering, Data Science, Hardware, Startups, Web Development, Programming Languages, Semiconductors, Blockchain, IoT, DevOps, or Other
-
+{topic_step}
 Article Title: {article['title']}
 Article Content: {article['content']}
 
 Return your response in this exact format:
 TITLE: [generated title]
-TOPIC: [single topic from the list above]
-SUMMARY: [1-2 paragraph summary in plain text]
+{topic_line}SUMMARY: [1-2 paragraph summary in plain text]
 """
 
     try:
-        model = genai.GenerativeModel("models/gemini-1.5-pro-latest")
-        response = model.generate_content(prompt)
-        text = response.text.strip()
+        log_prompt_tokens(prompt, [article])
+        text = generate_text(prompt)
         
         # Parse the response
         lines = text.split('\n')
@@ -118,40 +248,223 @@ SUMMARY: [1-2 paragraph summary in plain text]
         
         summary = ' '.join(summary_lines).strip()
         
-        # Clean up text
-        title = re.sub(r'([\*_\-`#>|])', '', title).strip()
-        summary = re.sub(r'([\*_\-`#>|]|\n\s*\n|\n\s*\*|\n\s*\d+\.|\n\s*\-|\n\s*\+)', ' ', summary)
-        summary = re.sub(r'\s+', ' ', summary).strip()
-        
-        # Ensure topic is lowercase for consistency
-        topic = topic.lower()
-        
-        return {
-            "title": title,
-            "topic": topic,
-            "summary": summary
-        }
+        result = clean_summary_result(title, topic, summary)
+        if result["summary"]:
+            llm_cache.put(key, result)
+        return apply_classified_topic(article, result)
         
     except Exception as e:
         print(f"Error generating summary and topic: {e}")
-        return {
+        return apply_classified_topic(article, {
             "title": article['title'],
             "topic": "other",
             "summary": article['content'][:500] + "..." if len(article['content']) > 500 else article['content']
-        }
+        })
 
-def clear_todays_summaries():
-    """Clear existing summaries from today to avoid duplicates"""
-    today_central = datetime.now(CENTRAL_TZ).replace(hour=0, minute=0, second=0, microsecond=0)
+def build_batch_prompt(articles: list) -> str:
+    """
+    One prompt covering several articles; the shared instructions are sent
+    once. Topics are only requested for articles marked "Classify: yes".
+    """
+    classify = [not article.get("topic") for article in articles]
+    # Mark the articles to classify only when some of them already have a topic
+    mark = any(classify) and not all(classify)
+    topic_step, topic_note = "", ""
+    fields = '"index": <article number>, "title": "...", "summary": "..."'
+    if any(classify):
+        which = 'articles marked "Classify: yes" into' if mark else "it into"
+        topic_step = f"3. Classify {which} ONE of these tech topics: {', '.join(TOPICS[:-1])}, or Other\n"
+        fields = '"index": <article number>, "title": "...", "topic": "...", "summary": "..."'
+        if mark:
+            topic_note = ' Include "topic" only for articles marked "Classify: yes".'
+    prompt = f"""
+You are a tech news analyzer. For EACH of the following {len(articles)} tech articles:
+
+1. Generate a clear, informative title (if different from original)
+2. Create a concise 1-2 paragraph summary in plain text
+{topic_step}
+Return ONLY a JSON array with one object per article, in any order:{topic_note}
+[{{{fields}}}]
+
+"""
+    for i, article in enumerate(articles):
+        prompt += (
+            f"Article {i}:\n"
+            + ("Classify: yes\n" if mark and classify[i] else "")
+            + f"Title: {article['title']}\n"
+            f"Content: {article['content']}\n\n"
+        )
+    return prompt
+
+def parse_batch_response(text: str, count: int) -> dict:
+    """
+    Validate a batched JSON response; returns {article index: result} for the
+    items that passed. Missing, duplicate or malformed items are left out;
+    a missing or unknown topic becomes "other".
+    """
+    # Tolerate a markdown code fence around the JSON
+    text = re.sub(r'^```(?:json)?\s*|\s*```$', '', text.strip())
+    try:
+        items = json.loads(text)
+    except ValueError as e:
+        print(f"Batch response is not valid JSON: {e}")
+        return {}
+    if not isinstance(items, list):
+        print("Batch response is not a JSON array")
+        return {}
     
-    # Convert to UTC for MongoDB query
-    today_utc = today_central.astimezone(pytz.UTC)
+    results = {}
+    for raw in items:
+        try:
+            item = BatchSummaryItem(**raw)
+        except (TypeError, ValidationError):
+            continue
+        if not 0 <= item.index < count or item.index in results:
+            continue
+        if not item.summary.strip() or not item.title.strip():
+            continue
+        results[item.index] = clean_summary_result(item.title, item.topic, item.summary)
+    return results
+
+def summarize_batch(articles: list) -> list:
+    """
+    Summarize several articles with one Gemini request. Articles already in
+    the LLM cache are not sent; articles whose item is missing or invalid in
+    the response fall back to a per-article call.
+    """
+    keys = [article_cache_key(article) for article in articles]
+    cached = llm_cache.get_many(keys)
+    results = {i: apply_classified_topic(articles[i], cached[key]) for i, key in enumerate(keys) if key in cached}
+    pending = [i for i in range(len(articles)) if i not in results]
     
-    result = summaries_collection.delete_many({
-        "date": {"$gte": today_utc}
-    })
+    if len(pending) > 1:
+        batch = [articles[i] for i in pending]
+        try:
+            prompt = build_batch_prompt(batch)
+            log_prompt_tokens(prompt, batch)
+            text = generate_text(
+                prompt,
+                generation_config={"response_mime_type": "application/json"},
+                output_tokens=512 * len(batch),
+            )
+            parsed = parse_batch_response(text, len(batch))
+        except Exception as e:
+            print(f"Error generating batch of {len(batch)} summaries: {e}")
+            parsed = {}
+        
+        for j, result in parsed.items():
+            results[pending[j]] = apply_classified_topic(batch[j], result)
+        llm_cache.put_many({keys[pending[j]]: result for j, result in parsed.items()})
+        if len(parsed) < len(batch):
+            print(f"Batch returned {len(parsed)}/{len(batch)} valid items; summarizing {len(batch) - len(parsed)} individually")
     
-    print(f"Cleared {result.deleted_count} existing summaries from today")
+    for i in range(len(articles)):
+        if i not in results:
+            results[i] = generate_summary_and_topic(articles[i], use_cache=False)
+    return [results[i] for i in range(len(articles))]
+
+def ensure_summary_indexes():
+    """Unique canonical source URL so reruns upsert instead of duplicating"""
+    # Partial so topic summaries without a single source are unaffected
+    summaries_collection.create_index(
+        "source_url", unique=True,
+        partialFilterExpression={"source_url": {"$exists": True}}
+    )
+    # Lets the API workers' summary index refresh find re-embedded summaries without a collection scan
+    summaries_collection.create_index("embedded_at")
+
+def _aware(value):
+    # MongoDB returns naive UTC datetimes
+    return pytz.UTC.localize(value) if value is not None and value.tzinfo is None else value
+
+def get_fetch_state():
+    """
+    (high-water mark, backlog): every article published up to the mark has
+    been handled, except in the backlog's (from, to) publish-time windows,
+    which later runs re-read.
+    """
+    state = job_state_collection.find_one({"_id": "prefetch"}) or {}
+    backlog = [{"from": _aware(w["from"]), "to": _aware(w["to"])} for w in state.get("backlog", [])]
+    return _aware(state.get("published_at_hwm")), backlog
+
+def fetch_windows(force: bool = False) -> list:
+    """
+    Publish-time windows a new run fetches: everything after the high-water
+    mark, then the backlog. --force re-covers the last 24 hours instead.
+    """
+    if force:
+        return [{"from": None}]
+    hwm, backlog = get_fetch_state()
+    return [{"from": hwm}] + sorted(backlog, key=lambda w: w["to"], reverse=True)
+
+def _merge_windows(windows: list) -> list:
+    merged = []
+    for window in sorted(windows, key=lambda w: w["from"]):
+        if merged and window["from"] <= merged[-1]["to"]:
+            merged[-1]["to"] = max(merged[-1]["to"], window["to"])
+        else:
+            merged.append(dict(window))
+    return merged
+
+def failed_article_windows(published: list) -> list:
+    """Backlog windows covering the publish times of articles that were not stored"""
+    times = [p for p in (_aware(p) for p in published) if p]
+    return _merge_windows([{"from": p - timedelta(minutes=1), "to": p} for p in times])
+
+def save_fetch_state(windows: list = (), failed: list = ()):
+    """
+    Record what a run covered. The mark moves to the newest article fetched
+    after it; whatever a window did not get to (the fetch was cut short by
+    the article budget or an error) and the windows in `failed` go to the
+    backlog, so no article is skipped for good.
+    """
+    hwm, backlog = get_fetch_state()
+    if windows:
+        # The run re-read the whole backlog (or tried to); what is left of it is added back below
+        backlog = []
+    for i, window in enumerate(windows):
+        if "complete" not in window:
+            # Out of budget before this window was fetched
+            if window.get("to"):
+                backlog.append({"from": window["from"], "to": window["to"]})
+            continue
+        if i == 0 and window["newest"]:
+            hwm = max(hwm or window["newest"], window["newest"])
+        if window["complete"]:
+            continue
+        # Articles older than the last one fetched are still to be read
+        upper = window["oldest"] or window.get("to")
+        if upper is not None:
+            lower = window["from"] or datetime.now(pytz.UTC) - timedelta(days=1)
+            backlog.append({"from": lower, "to": upper})
+    backlog = _merge_windows(backlog + list(failed))
+    if len(backlog) > PREFETCH_MAX_BACKLOG:
+        dropped = backlog[:-PREFETCH_MAX_BACKLOG]
+        print(f"Dropping {len(dropped)} oldest backlog windows (up to {dropped[-1]['to'].isoformat()})")
+        backlog = backlog[-PREFETCH_MAX_BACKLOG:]
+    update = {"$set": {"backlog": backlog}}
+    if hwm is not None:
+        # $max keeps the mark monotonic even if runs overlap
+        update["$max"] = {"published_at_hwm": hwm}
+    job_state_collection.update_one({"_id": "prefetch"}, update, upsert=True)
+
+def existing_source_urls(urls: list) -> set:
+    """Canonical URLs that already have a stored summary"""
+    cursor = summaries_collection.find({"source_url": {"$in": urls}}, {"source_url": 1})
+    return {doc["source_url"] for doc in cursor}
+
+def upsert_summaries(docs: list):
+    """Write summaries keyed on source_url; a rerun updates rather than duplicates"""
+    now = datetime.now(pytz.UTC)
+    ops = [
+        UpdateOne(
+            {"source_url": doc["source_url"]},
+            {"$set": doc, "$setOnInsert": {"date": now}},  # keep the first run's date
+            upsert=True
+        )
+        for doc in docs
+    ]
+    return summaries_collection.bulk_write(ops, ordered=False)
 
 def check_todays_summaries():
     """Check if summaries exist for today (Central Time)"""
@@ -180,61 +493,281 @@ def log_last_generation():
     except Exception as e:
         print(f"Warning: Could not write to log file: {e}")
 
-def prefetch_and_cache(force=False):
-    """Main function to fetch articles, generate summaries, and store in MongoDB"""
+def build_summary_doc(article: dict, result: dict) -> dict:
+    """Summary document for MongoDB with the required schema"""
+    doc = {
+        "title": result["title"],
+        "summary": result["summary"],
+        "topic": result["topic"],
+        "topic_source": result.get("topic_source", "llm"),
+        "sources": [article["url"]],
+        "source_url": article["source_url"],
+        "published_at": parse_published_at(article.get("published_at")),
+        "keywords": article.get("keywords", []),
+        "urlToImage": article.get("urlToImage", "")  # Include the image URL in the database
+    }
+    # Article-text embedding the topic centroids are built from
+    if article.get("topic_embedding") is not None:
+        doc["topic_embedding"] = article["topic_embedding"]
+    return doc
+
+def build_prefetch_pipeline(run_id: str, force: bool, resumed: bool, progress: dict,
+                            distributed: bool = False, on_stored=None) -> Pipeline:
+    """
+    Stages: filter -> dedupe -> classify -> summarize -> embed -> write.
+    Items passed after dedupe have the job_run_items shape (key, state,
+    payload, result), so a resumed run feeds its unfinished items straight
+    into classify. With distributed=True the stages after dedupe are
+    replaced by queueing a task per article for prefetch_worker processes;
+    workers run the remaining stages and pass on_stored to acknowledge them.
+    """
+    seen = set()
+    lock = threading.Lock()
     
-    central_now = datetime.now(CENTRAL_TZ)
-    print(f"Starting daily prefetch job at {central_now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+    def filter_stage(batch):
+        return [a for a in map(tech_article, batch) if a]
     
-    # Check if summaries already exist for today
-    if not force:
-        existing_count = check_todays_summaries()
-        if existing_count > 0:
-            print(f"Found {existing_count} existing summaries for today. Use --force to regenerate.")
-            return
+    def dedupe_stage(batch):
+        # Drop duplicate links to the same story within this run
+        fresh = []
+        for article in batch:
+            if article["source_url"] not in seen:
+                seen.add(article["source_url"])
+                fresh.append(article)
+        # Skip articles that already have a summary (unless forced, when the LLM cache keeps reruns cheap)
+        if fresh and not force:
+            stored = existing_source_urls([a["source_url"] for a in fresh])
+            fresh = [a for a in fresh if a["source_url"] not in stored]
+        add_items(run_id, {a["source_url"]: a for a in fresh}, "fetched")
+        return [{"key": a["source_url"], "state": "fetched", "payload": a} for a in fresh]
     
-    # Clear existing summaries from today
-    clear_todays_summaries()
+    def enqueue_stage(batch):
+        queued = enqueue_tasks("prefetch", run_id, [item["key"] for item in batch])
+        with lock:
+            progress["queued"] += queued
+        return batch
     
-    # Fetch latest tech articles
-    articles = fetch_latest_tech_articles(max_articles=100)  # Fetch more to get good variety
+    def classify_stage(batch):
+        # Topics the local classifier is confident about are not asked of the LLM
+        todo = [item for item in batch if item["state"] == "fetched" and not item["payload"].get("topic")]
+        if todo:
+            # Embedded even without centroids: stored on the summary, LLM-labelled ones build the centroids
+            vectors = get_embeddings([article_topic_text(item["payload"]) for item in todo])
+            for item, vector in zip(todo, vectors):
+                item["payload"]["topic_embedding"] = encode_embedding(vector, "float32")
+        if todo and len(topic_classifier):
+            for item, (topic, score) in zip(todo, topic_classifier.classify(vectors)):
+                if topic:
+                    item["payload"]["topic"] = topic
+                    item["payload"]["topic_confidence"] = round(score, 3)
+            with lock:
+                progress["classified"] += sum(1 for item in todo if item["payload"].get("topic"))
+        return batch
     
-    if not articles:
-        print("No articles found to process")
-        return
+    def summarize_stage(batch):
+        todo = [item for item in batch if item["state"] == "fetched"]
+        if todo:
+            for item, result in zip(todo, summarize_batch([item["payload"] for item in todo])):
+                item["result"], item["state"] = result, "summarized"
+                print(f"Processed article: {result['title']} (Topic: {result['topic']})")
+            advance_items(run_id, {item["key"]: item["result"] for item in todo}, "summarized")
+        return batch
     
-    processed_count = 0
+    def embed_stage(batch):
+        # Embed a batch at a time so personalization sees these summaries
+        todo = [item for item in batch if item["state"] == "summarized"]
+        docs = [build_summary_doc(item["payload"], item["result"]) for item in todo]
+        if docs:
+            try:
+                attach_summary_embeddings(docs)
+            except Exception as e:
+                print(f"Error embedding summaries, storing without embeddings (run backfill_embeddings later): {e}")
+                return batch
+            for item, doc in zip(todo, docs):
+                item["result"], item["state"] = doc, "embedded"
+            advance_items(run_id, {item["key"]: item["result"] for item in todo}, "embedded")
+        return batch
     
-    for article in articles:
-        try:
-            # Generate summary and topic
-            result = generate_summary_and_topic(article)            # Prepare document for MongoDB with required schema
-            doc = {
-                "title": result["title"],
-                "summary": result["summary"],
-                "topic": result["topic"],
-                "date": datetime.now(pytz.UTC),  # Store in UTC using timezone-aware datetime
-                "sources": [article["url"]],
-                "urlToImage": article.get("urlToImage", "")  # Include the image URL in the database
-            }
-            
-            # Insert into MongoDB
-            summaries_collection.insert_one(doc)
-            processed_count += 1
-            
-            print(f"Processed article {processed_count}: {result['title']} (Topic: {result['topic']})")
-            
-        except Exception as e:
-            print(f"Error processing article '{article['title']}': {e}")
-            continue
+    def write_stage(batch):
+        # Unembedded summaries are stored as they are
+        docs = [
+            item["result"] if item["state"] == "embedded" else build_summary_doc(item["payload"], item["result"])
+            for item in batch
+        ]
+        result = upsert_summaries(docs)
+        advance_items(run_id, {item["key"]: {"source_url": item["key"]} for item in batch}, "stored")
+        if on_stored:
+            on_stored(batch)
+        with lock:
+            progress["stored"] += len(docs)
+            progress["new"] += result.upserted_count
+            progress["updated"] += result.modified_count
+        return batch
     
-    print(f"Prefetch job completed. Processed {processed_count} articles.")
+    stages = [Stage("enqueue", enqueue_stage, batch_size=100)] if distributed else [
+        Stage("classify", classify_stage, batch_size=64),
+        Stage("summarize", summarize_stage, workers=PREFETCH_CONCURRENCY, batch_size=PREFETCH_BATCH_SIZE),
+        Stage("embed", embed_stage, batch_size=64),
+        Stage("write", write_stage, batch_size=100),
+    ]
+    if not resumed:
+        stages = [Stage("filter", filter_stage, batch_size=20), Stage("dedupe", dedupe_stage, batch_size=50)] + stages
+    return Pipeline("prefetch", stages, source_name="resume" if resumed else "fetch")
+
+def print_pipeline_stats(stats: dict):
+    for name, s in stats.items():
+        if "received" not in s:
+            print(f"  {name}: {s['emitted']} items ({s['per_second']}/s), {s['errors']} errors")
+            continue
+        print(f"  {name}: {s['received']} in, {s['emitted']} out ({s['per_second']}/s), "
+              f"busy {s['busy_seconds']}s, max queue {s['max_queue_depth']}/{s['queue_size']}, {s['errors']} errors")
+
+def new_progress() -> dict:
+    """Counters the prefetch pipeline stages update"""
+    return {"stored": 0, "new": 0, "updated": 0, "classified": 0, "queued": 0}
+
+def publish_summaries():
+    """Make newly stored summaries visible to the API"""
+    # Publish a new shared embedding snapshot for the API workers (if SUMMARY_SNAPSHOT_DIR is set)
+    try:
+        export_snapshot(summaries_collection)
+    except Exception as e:
+        print(f"Error exporting summary snapshot: {e}")
+    # Pick up the new summaries in this process's similarity index, if it has one loaded;
+    # the job and workers never search it, and API processes refresh on their own
+    summary_index.refresh(load_if_missing=False)
     log_last_generation()
 
+def unstored_published(items: list) -> list:
+    """Publish times of run items that were not stored"""
+    return [parse_published_at(item["payload"].get("published_at")) for item in items if item["state"] != "stored"]
+
+def finalize_distributed_run(run_id: str) -> bool:
+    """
+    Finish a distributed run once all its articles are enqueued and no task
+    is queued or leased. Safe to call from every worker: only one of them
+    finishes the run and publishes. Returns True for that caller.
+    """
+    run = runs_collection.find_one({"_id": run_id})
+    if not run or not run.get("enqueued") or not run_finished(run_id):
+        return False
+    counts = run_task_counts(run_id)
+    status = "failed" if counts["failed"] else "completed"
+    if not finish_run_once(run_id, status, summary={"stored": counts["done"], "failed": counts["failed"]}):
+        return False
+    print(f"Prefetch run {run_id} {status}: {counts['done']} articles stored, {counts['failed']} failed")
+    if counts["failed"]:
+        # Later runs re-read the failed articles' publish times
+        failed = get_items(run_id, keys=run_task_keys(run_id, "failed"))
+        save_fetch_state(failed=failed_article_windows(unstored_published(failed)))
+        print("Rerun with --resume --distributed to retry the failed articles")
+    if counts["done"]:
+        publish_summaries()
+    return True
+
+def prefetch_and_cache(force=False, resume=False, distributed=False):
+    """
+    Main function to fetch articles, generate summaries, and store in MongoDB.
+    Articles stream through a staged pipeline and are checkpointed per article;
+    resume=True continues the latest unfinished run instead of starting over.
+    distributed=True only fetches and dedupes here and queues the articles
+    for prefetch_worker processes to summarize and store.
+    """
+    
+    central_now = datetime.now(CENTRAL_TZ)
+    print(f"Starting prefetch job at {central_now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+    
+    ensure_summary_indexes()
+    llm_cache.reset_stats()
+    reset_compaction_stats()
+    
+    # Centroids are (re)built from the labelled summaries at most every TOPIC_REBUILD_HOURS
+    if not distributed:
+        if topic_classifier.needs_build():
+            topic_classifier.build(summaries_collection)
+        elif not len(topic_classifier):
+            topic_classifier.load()
+    
+    run_id, resumed = resume_or_start("prefetch", resume, {"force": force, "distributed": distributed})
+    print(f"{'Resuming' if resumed else 'Started'} prefetch run {run_id}")
+    progress = new_progress()
+    try:
+        pipeline = build_prefetch_pipeline(run_id, force, resumed, progress, distributed=distributed)
+        if resumed:
+            if distributed:
+                requeue_failed(run_id)
+            source = get_items(run_id, ["fetched", "summarized", "embedded"])
+        else:
+            # Only ask for articles newer than the last run, plus the backlog it left
+            windows = fetch_windows(force)
+            source = iter_fetch_windows(windows)
+        stats = pipeline.run(source)
+        errors = sum(s["errors"] for s in stats.values())
+        
+        # Articles lost before they were checkpointed cannot be found again, so the fetch state stays put
+        checkpointed = not any(stats[name]["errors"] for name in ("filter", "dedupe", "enqueue") if name in stats)
+        if not resumed and not force and checkpointed:
+            unstored = [] if distributed else get_items(run_id, ["fetched", "summarized", "embedded"])
+            save_fetch_state(windows, failed_article_windows(unstored_published(unstored)))
+        
+        if distributed:
+            if errors:
+                finish_run(run_id, "failed", summary={"errors": errors})
+            else:
+                update_run(run_id, enqueued=True)
+        else:
+            cache_stats = llm_cache.stats()
+            finish_run(run_id, "failed" if errors else "completed",
+                       summary={"stored": progress["stored"], "errors": errors,
+                                "classified_locally": progress["classified"],
+                                "compaction_tokens_saved": compaction_stats()["tokens_saved"],
+                                "llm_cache_hit_rate": cache_stats["hit_rate"]})
+    except Exception:
+        finish_run(run_id, "failed")
+        print(f"Prefetch run {run_id} failed; rerun with --resume to continue it")
+        raise
+    
+    if distributed:
+        print(f"Queued {progress['queued']} articles for run {run_id}.")
+        print_pipeline_stats(stats)
+        if errors:
+            print(f"{errors} batches failed; rerun with --resume --distributed to queue them")
+        elif not finalize_distributed_run(run_id):
+            print("Start workers with: python -m app.utils.prefetch_worker")
+        return
+    
+    processed_count = progress["stored"]
+    print(f"Prefetch job completed. Processed {processed_count} articles "
+          f"({progress['new']} new, {progress['updated']} updated).")
+    print(f"Topics classified locally: {progress['classified']}/{processed_count} "
+          f"({len(topic_classifier)} centroids)")
+    print_pipeline_stats(stats)
+    print(f"GNews client: {gnews.stats()}")
+    if errors:
+        print(f"{errors} batches failed; rerun with --resume to retry them")
+    print(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+          f"(hit rate {cache_stats['hit_rate']:.0%})")
+    compaction = compaction_stats()
+    if compaction["texts"]:
+        print(f"Compaction: {compaction['texts']} articles, ~{compaction['tokens_before']} -> "
+              f"~{compaction['tokens_after']} tokens ({compaction['saved_rate']:.0%} saved)")
+    if not processed_count:
+        return
+    publish_summaries()
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Prefetch and cache tech news summaries')
     parser.add_argument('--force', action='store_true', 
-                       help='Force regeneration even if summaries exist for today')
+                       help='Re-summarize the last 24 hours, including articles already stored')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue the latest unfinished run from its checkpoints')
+    parser.add_argument('--distributed', action='store_true',
+                       help='Queue the articles for prefetch_worker processes instead of summarizing them here')
+    parser.add_argument('--status', action='store_true',
+                       help='Show the state of the latest run and exit')
     
     args = parser.parse_args()
-    prefetch_and_cache(force=args.force)
+    if args.status:
+        print(format_run_status("prefetch"))
+    else:
+        prefetch_and_cache(force=args.force, resume=args.resume, distributed=args.distributed)
@@ -0,0 +1,137 @@
+"""
+Prefetch worker: summarizes, embeds and stores articles queued by
+`prefetch_job --distributed`. Start as many copies as needed, on one host
+or several. Each keeps PREFETCH_CONCURRENCY batches in flight and claims
+the tasks of a batch (PREFETCH_BATCH_SIZE articles) only when it is ready
+to summarize them, so the articles of a run spread across all workers.
+Leases are renewed while a batch is being worked on; a crashed worker's
+articles are picked up by the others once its leases expire.
+
+    python -m app.utils.prefetch_worker            # drain the queue and exit
+    python -m app.utils.prefetch_worker --forever  # keep polling for new runs
+"""
+import os
+import time
+import socket
+import argparse
+import threading
+
+from app.db.job_runs import get_items, latest_run, runs_collection, format_run_status
+from app.db.task_queue import (claim_tasks, complete_tasks, extend_leases, release_tasks,
+                               run_task_counts, TASK_LEASE_SECONDS)
+from app.utils.topic_classifier import topic_classifier
+from app.utils.prefetch_job import (build_prefetch_pipeline, new_progress, print_pipeline_stats,
+                                    finalize_distributed_run, PREFETCH_BATCH_SIZE, PREFETCH_CONCURRENCY)
+
+#seconds between queue polls when idle with --forever
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "10"))
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def process_run(run_id: str, first_tasks: list, worker: str) -> dict:
+    """Work through the run's tasks a batch at a time, on PREFETCH_CONCURRENCY threads, until none are left."""
+    run = runs_collection.find_one({"_id": run_id}) or {}
+    force = run.get("params", {}).get("force", False)
+    #article key -> task id of every task this worker currently holds
+    held = {}
+    lock = threading.Lock()
+    released = {"queued": 0, "failed": 0}
+
+    def on_stored(batch):
+        with lock:
+            task_ids = [held.pop(item["key"]) for item in batch if item["key"] in held]
+        complete_tasks(task_ids, worker)
+
+    progress = new_progress()
+    pipeline = build_prefetch_pipeline(run_id, force, True, progress, on_stored=on_stored)
+
+    def process_batches(tasks):
+        while True:
+            tasks = tasks or claim_tasks("prefetch", worker, PREFETCH_BATCH_SIZE, run_id)
+            if not tasks:
+                break
+            with lock:
+                held.update((task["key"], task["_id"]) for task in tasks)
+            try:
+                items = get_items(run_id, keys=[task["key"] for task in tasks])
+                found = {item["key"] for item in items}
+                #stored by a worker whose lease ran out before it acknowledged, or no longer in the run
+                on_stored([item for item in items if item["state"] == "stored"] +
+                          [{"key": task["key"]} for task in tasks if task["key"] not in found])
+                pipeline.process([item for item in items if item["state"] != "stored"])
+            except Exception as e:
+                print(f"[{worker}] batch of {len(tasks)} articles failed: {e}")
+            #whatever was not stored failed in a stage; hand it back now rather than at lease expiry
+            with lock:
+                failed = [held.pop(task["key"]) for task in tasks if task["key"] in held]
+            if failed:
+                exhausted = release_tasks(failed, worker, "prefetch stage failed")
+                with lock:
+                    released["failed"] += exhausted
+                    released["queued"] += len(failed) - exhausted
+            tasks = None
+
+    def renew_leases(stop):
+        while not stop.wait(TASK_LEASE_SECONDS / 3):
+            with lock:
+                task_ids = list(held.values())
+            extend_leases(task_ids, worker)
+
+    stop = threading.Event()
+    renewer = threading.Thread(target=renew_leases, args=(stop,), daemon=True)
+    renewer.start()
+    threads = [
+        threading.Thread(target=process_batches, args=(first_tasks if i == 0 else None,))
+        for i in range(PREFETCH_CONCURRENCY)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+
+    print(f"[{worker}] run {run_id}: stored {progress['stored']} articles "
+          f"({progress['classified']} topics classified locally)")
+    print_pipeline_stats(pipeline.stats())
+    if released["queued"] or released["failed"]:
+        print(f"[{worker}] {released['queued']} failed articles requeued, "
+              f"{released['failed']} out of attempts marked failed")
+    return progress
+
+
+def run_worker(forever: bool = False, worker: str = None):
+    worker = worker or worker_name()
+    print(f"[{worker}] prefetch worker started")
+    topic_classifier.load()
+    while True:
+        tasks = claim_tasks("prefetch", worker, PREFETCH_BATCH_SIZE)
+        if not tasks:
+            if not forever:
+                break
+            time.sleep(WORKER_POLL_SECONDS)
+            continue
+        run_id = tasks[0]["run_id"]
+        process_run(run_id, tasks, worker)
+        print(f"[{worker}] run {run_id} tasks: {run_task_counts(run_id)}")
+        finalize_distributed_run(run_id)
+    print(f"[{worker}] no queued articles left; exiting")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process queued prefetch articles")
+    parser.add_argument("--forever", action="store_true",
+                        help="Keep polling for new runs instead of exiting when the queue is empty")
+    parser.add_argument("--status", action="store_true",
+                        help="Show the state of the latest prefetch run and its queue, then exit")
+
+    args = parser.parse_args()
+    if args.status:
+        print(format_run_status("prefetch"))
+        run = latest_run("prefetch")
+        if run:
+            print("  tasks: " + ", ".join(f"{state}={count}" for state, count in run_task_counts(run["_id"]).items()))
+    else:
+        run_worker(forever=args.forever)
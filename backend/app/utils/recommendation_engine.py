@@ -1,71 +1,69 @@
-import os
-import json
-from typing import List, Dict
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List, Dict, Optional
 import numpy as np
 from dotenv import load_dotenv
-from backend.app.utils.embedder import get_embedding
+from backend.app.utils.embedder import get_embeddings
+from backend.app.db.embedding_codec import decode_embedding
+from backend.app.db import user_profile_store
 
 load_dotenv()
 
+#legacy JSON profile file; import it with `python -m app.db.user_profile_store --import-json <path>`
 USER_DATA_PATH = "backend/app/db/user_data.json"
 
-def ensure_user_data():
-    if not os.path.exists(USER_DATA_PATH):
-        with open(USER_DATA_PATH, 'w') as f:
-            json.dump({}, f)
-
 #like article and store full content per user
 def like_article(user_id: str, article: Dict):
-    ensure_user_data()
-    with open(USER_DATA_PATH, 'r+') as f:
-        data = json.load(f)
-        if user_id not in data:
-            data[user_id] = {"liked_articles": []}
-        data[user_id]["liked_articles"].append(article)
-        f.seek(0)
-        json.dump(data, f, indent=2)
-        f.truncate()
+    user_profile_store.add_liked_article(user_id, article)
 
 #embed liked articles for a user
 def store_user_embedding(user_id: str):
-    ensure_user_data()
-    with open(USER_DATA_PATH, 'r+') as f:
-        data = json.load(f)
-        if user_id not in data or not data[user_id].get("liked_articles"):
-            return
+    liked_articles = user_profile_store.get_liked_articles(user_id)
+    if not liked_articles:
+        return
+
+    texts = [a["title"] + ". " + a["content"] for a in liked_articles]
+    embeddings = get_embeddings(texts)
 
-        embeddings = []
-        for article in data[user_id]["liked_articles"]:
-            text = article["title"] + ". " + article["content"]
-            embeddings.append(get_embedding(text))
+    user_profile_store.set_user_embedding(user_id, np.mean(embeddings, axis=0))
 
-        avg_embedding = np.mean(embeddings, axis=0).tolist()
-        data[user_id]["user_embedding"] = avg_embedding
-        f.seek(0)
-        json.dump(data, f, indent=2)
-        f.truncate()
+def article_embeddings(articles: List[Dict]) -> np.ndarray:
+    """
+    Embeddings for a batch of articles as one float32 matrix. Articles that
+    already carry an "embedding" (e.g. summaries from MongoDB) are decoded;
+    the rest are embedded together in a single forward pass.
+    """
+    stored = [decode_embedding(a.get("embedding")) for a in articles]
+    missing = [i for i, emb in enumerate(stored) if emb is None]
+    if missing:
+        texts = [articles[i]["title"] + ". " + articles[i]["content"] for i in missing]
+        for i, emb in zip(missing, get_embeddings(texts)):
+            stored[i] = emb
+    return np.vstack(stored).astype(np.float32)
 
 #recommend new articles to a user
-def recommend_articles(user_id: str, articles: List[Dict], threshold: float = 0.85):
-    ensure_user_data()
-    with open(USER_DATA_PATH, 'r') as f:
-        data = json.load(f)
-        user_embedding = data.get(user_id, {}).get("user_embedding")
-        if not user_embedding:
-            return []
+def recommend_articles(user_id: str, articles: List[Dict], threshold: float = 0.85,
+                       embeddings: Optional[np.ndarray] = None,
+                       user_embedding: Optional[np.ndarray] = None):
+    """
+    Score candidate articles against the user's embedding in one pass.
+    `embeddings` may hold precomputed vectors aligned with `articles`, and
+    `user_embedding` may override the stored profile (e.g. with the vector
+    from get_user_preference_vector).
+    """
+    if user_embedding is None:
+        user_embedding = user_profile_store.get_user_embedding(user_id)
+    if user_embedding is None or not articles:
+        return []
 
-    user_embedding = np.array(user_embedding).reshape(1, -1)
-    recommended = []
+    matrix = article_embeddings(articles) if embeddings is None else np.asarray(embeddings, dtype=np.float32)
 
-    for article in articles:
-        text = article["title"] + ". " + article["content"]
-        emb = get_embedding(text).reshape(1, -1)
-        score = cosine_similarity(user_embedding, emb)[0][0]
-        if score >= threshold:
-            recommended.append({"score": score, **article})
+    #cosine similarity as a single normalized matrix-vector product
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(user_embedding)
+    norms[norms == 0] = 1.0
+    scores = (matrix @ user_embedding) / norms
 
-    return sorted(recommended, key=lambda x: x["score"], reverse=True)
+    keep = np.flatnonzero(scores >= threshold)
+    keep = keep[np.argsort(-scores[keep], kind="stable")]
+    return [{"score": float(scores[i]), **articles[i]} for i in keep]
 
 #testing the recommendation engine
 if __name__ == "__main__":
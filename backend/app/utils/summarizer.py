@@ -1,18 +1,35 @@
-import os
-from dotenv import load_dotenv
-import google.generativeai as genai
+import logging
+from app.utils.gemini_client import generate_text, GEMINI_MODEL
+from app.utils.compaction import compact_content, estimate_tokens
+from app.db.mongodb import llm_cache
+from app.db.llm_cache import llm_cache_key
 from app.utils.retriever import ingest_articles, retrieve_relevant_articles
 from app.utils.news_fetcher import fetch_articles
 import re
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Bump when the prompt below changes so cached results are regenerated
+TOPIC_PROMPT_VERSION = "topic-summary-v1"
+
+logger = logging.getLogger("summarizer")
 
 def summarize_topic(topic: str, top_k: int = 3, articles: list = None) -> dict:
     docs = articles if articles is not None else retrieve_relevant_articles(topic, top_k)
     if not docs:
         return {"title": topic.title(), "summary": "", "sources": []}
 
+    # Strip repeats and truncation tails and cap each article at ARTICLE_TOKEN_BUDGET;
+    # docs arrive uncompacted (fetch_articles and the vector store keep the raw text)
+    compacted = [compact_content(d['content']) for d in docs]
+    docs = [{**d, "content": content} for d, (content, _) in zip(docs, compacted)]
+    tokens_saved = sum(saved for _, saved in compacted)
+
+    key = llm_cache_key(TOPIC_PROMPT_VERSION, GEMINI_MODEL, topic, "\n".join(
+        f"{d.get('id', '')}\n{d['title']}\n{d['content']}" for d in docs
+    ))
+    cached = llm_cache.get(key)
+    if cached:
+        return cached
+
     prompt = (
         "You are a tech news summarizer.\n"
         f"Summarize the following {len(docs)} articles about '{topic}' in 1-2 short, well-structured paragraphs. "
@@ -28,9 +45,8 @@ def summarize_topic(topic: str, top_k: int = 3, articles: list = None) -> dict:
             f"Content: {d['content']}\n"
             f"URL: {d.get('id', '')}\n\n"
         )
-    model = genai.GenerativeModel("models/gemini-1.5-pro-latest")
-    response = model.generate_content(prompt)
-    text = response.text.strip()
+    logger.info(f"Topic prompt for '{topic}': ~{estimate_tokens(prompt)} tokens (~{tokens_saved} saved by compaction)")
+    text = generate_text(prompt)
 
     # Extract title, summary, and sources
     title = topic.title()
@@ -49,7 +65,10 @@ def summarize_topic(topic: str, top_k: int = 3, articles: list = None) -> dict:
     summary = re.sub(r'([\*_\-`#>|]|\n\s*\n|\n\s*\*|\n\s*\d+\.|\n\s*\-|\n\s*\+)', ' ', summary)
     summary = re.sub(r'\s+', ' ', summary).strip()
     title = re.sub(r'([\*_\-`#>|])', '', title).strip()
-    return {"title": title, "summary": summary, "sources": sources}
+    result = {"title": title, "summary": summary, "sources": sources}
+    if summary:
+        llm_cache.put(key, result)
+    return result
 
 if __name__ == "__main__":
     topic = "artificial intelligence"
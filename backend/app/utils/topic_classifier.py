@@ -0,0 +1,221 @@
+"""
+Local topic classifier for summaries.
+
+Each topic has a centroid: the mean normalized embedding of the article
+text (title and content, stored on summaries as `topic_embedding`) of
+summaries labelled with it, so centroids and the articles classified
+against them come from the same kind of text. An article is assigned the
+nearest centroid when its cosine score and its lead over the runner-up
+clear the thresholds; otherwise the caller falls back to asking the LLM.
+Topic ids are the lowercase names in TOPICS, and normalize_topic maps
+free-text labels onto them.
+
+Rebuild centroids from the labelled summaries:
+    python -m app.utils.topic_classifier --build
+"""
+import os
+import re
+import argparse
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pytz
+from pymongo import UpdateOne
+
+from app.db.mongodb import db, summaries_collection
+from app.db.embedding_codec import encode_embedding, decode_embedding
+
+logger = logging.getLogger("topic_classifier")
+
+#display names; the lowercase form is the canonical topic id stored on summaries
+TOPICS = [
+    "AI", "Machine Learning", "Cybersecurity", "Cloud Computing", "Software Engineering",
+    "Data Science", "Hardware", "Startups", "Web Development", "Programming Languages",
+    "Semiconductors", "Blockchain", "IoT", "DevOps", "Other",
+]
+TOPIC_IDS = [t.lower() for t in TOPICS]
+
+#common variants of the labels the LLM returns
+_TOPIC_ALIASES = {
+    "artificial intelligence": "ai",
+    "generative ai": "ai",
+    "ml": "machine learning",
+    "deep learning": "machine learning",
+    "cyber security": "cybersecurity",
+    "security": "cybersecurity",
+    "cloud": "cloud computing",
+    "software": "software engineering",
+    "software development": "software engineering",
+    "data": "data science",
+    "data analytics": "data science",
+    "startup": "startups",
+    "web dev": "web development",
+    "programming": "programming languages",
+    "programming language": "programming languages",
+    "semiconductor": "semiconductors",
+    "chips": "semiconductors",
+    "crypto": "blockchain",
+    "internet of things": "iot",
+    "dev ops": "devops",
+}
+
+#minimum cosine score to the nearest centroid
+TOPIC_CONFIDENCE_THRESHOLD = float(os.getenv("TOPIC_CONFIDENCE_THRESHOLD", "0.45"))
+#minimum lead of the nearest centroid over the second nearest
+TOPIC_MARGIN_THRESHOLD = float(os.getenv("TOPIC_MARGIN_THRESHOLD", "0.05"))
+#topics with fewer labelled summaries get no centroid
+TOPIC_MIN_EXAMPLES = int(os.getenv("TOPIC_MIN_EXAMPLES", "20"))
+#the prefetch job rebuilds centroids older than this, picking up newly labelled summaries
+TOPIC_REBUILD_HOURS = float(os.getenv("TOPIC_REBUILD_HOURS", "24"))
+
+topic_centroids_collection = db['topic_centroids']
+#centroid collection document recording the last build, so runs without centroids do not rescan
+_BUILD_ID = "_build"
+
+
+def article_topic_text(article: dict) -> str:
+    """Text an article is embedded from for topic classification."""
+    return f"{article.get('title', '')}\n{article.get('content', '')}"
+
+
+def normalize_topic(label: Optional[str]) -> str:
+    """Canonical topic id for a free-text label; unknown labels become 'other'."""
+    key = re.sub(r"[^a-z0-9 ]+", " ", (label or "").lower())
+    key = " ".join(key.split())
+    key = _TOPIC_ALIASES.get(key, key)
+    return key if key in TOPIC_IDS else "other"
+
+
+class TopicClassifier:
+    def __init__(self, collection, threshold: float = TOPIC_CONFIDENCE_THRESHOLD,
+                 margin: float = TOPIC_MARGIN_THRESHOLD):
+        self.collection = collection
+        self.threshold = threshold
+        self.margin = margin
+        self._topics: List[str] = []
+        self._matrix = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        topics, vectors = [], []
+        for doc in self.collection.find({}, {"vector": 1}):
+            vector = decode_embedding(doc.get("vector"))
+            if vector is None or (vectors and vector.shape != vectors[0].shape):
+                continue
+            topics.append(doc["_id"])
+            vectors.append(vector / (np.linalg.norm(vector) or 1.0))
+        with self._lock:
+            self._topics = topics
+            self._matrix = np.vstack(vectors).astype(np.float32) if vectors else None
+            self._loaded = True
+        logger.info(f"Loaded {len(topics)} topic centroids")
+
+    def __len__(self):
+        return len(self._topics)
+
+    def needs_build(self, max_age_hours: float = TOPIC_REBUILD_HOURS) -> bool:
+        """True if centroids were never built or the last build is older than `max_age_hours`."""
+        build = self.collection.find_one({"_id": _BUILD_ID}) or {}
+        built_at = build.get("built_at")
+        if built_at is None:
+            return True
+        if built_at.tzinfo is None:
+            built_at = pytz.UTC.localize(built_at)
+        return (datetime.now(pytz.UTC) - built_at).total_seconds() > max_age_hours * 3600
+
+    def classify(self, embeddings) -> List[Tuple[Optional[str], float]]:
+        """
+        (topic id, score) per embedding. The topic is None when the nearest
+        centroid is not confident enough and the LLM should decide.
+        """
+        if not self._loaded:
+            self.load()
+        with self._lock:
+            topics, matrix = self._topics, self._matrix
+        vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if matrix is None or not vectors.size or vectors.shape[1] != matrix.shape[1]:
+            return [(None, 0.0)] * len(vectors)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        scores = (vectors / np.where(norms > 0, norms, 1.0)) @ matrix.T
+        order = np.argsort(-scores, axis=1)
+        rows = np.arange(len(vectors))
+        best = scores[rows, order[:, 0]]
+        runner_up = scores[rows, order[:, 1]] if len(topics) > 1 else np.full(len(vectors), -1.0)
+        confident = (best >= self.threshold) & (best - runner_up >= self.margin)
+        return [
+            (topics[order[i, 0]] if confident[i] else None, float(best[i]))
+            for i in range(len(vectors))
+        ]
+
+    def build(self, summaries, min_examples: int = TOPIC_MIN_EXAMPLES) -> Dict[str, int]:
+        """
+        Recompute centroids from labelled summaries with an article-text
+        embedding. Summaries the classifier labelled itself are left out so
+        centroids do not drift towards their own mistakes. The build is
+        recorded even when no topic has enough examples yet. Returns example
+        counts per topic.
+        """
+        sums, counts = {}, {}
+        cursor = summaries.find(
+            {"topic_embedding": {"$exists": True}, "topic": {"$exists": True}, "topic_source": {"$ne": "classifier"}},
+            {"topic_embedding": 1, "topic": 1}
+        )
+        dim = None
+        for doc in cursor:
+            topic = normalize_topic(doc.get("topic"))
+            vector = decode_embedding(doc.get("topic_embedding"))
+            if topic == "other" or vector is None:
+                continue
+            if dim is None:
+                dim = vector.shape[0]
+            if vector.shape[0] != dim:
+                continue
+            norm = np.linalg.norm(vector)
+            if not norm:
+                continue
+            sums[topic] = sums.get(topic, 0) + vector / norm
+            counts[topic] = counts.get(topic, 0) + 1
+
+        kept = {topic for topic, count in counts.items() if count >= min_examples}
+        now = datetime.now(pytz.UTC)
+        ops = [
+            UpdateOne(
+                {"_id": topic},
+                {"$set": {"vector": encode_embedding(sums[topic] / counts[topic], "float32"),
+                          "count": counts[topic], "updated_at": now}},
+                upsert=True
+            )
+            for topic in kept
+        ]
+        ops.append(UpdateOne({"_id": _BUILD_ID}, {"$set": {"built_at": now, "counts": counts}}, upsert=True))
+        self.collection.bulk_write(ops, ordered=False)
+        self.collection.delete_many({"_id": {"$nin": list(kept) + [_BUILD_ID]}})
+        self.load()
+        return counts
+
+
+#process-wide classifier, centroids loaded on first use
+topic_classifier = TopicClassifier(topic_centroids_collection)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Topic centroid maintenance")
+    parser.add_argument("--build", action="store_true",
+                        help="Rebuild topic centroids from labelled summaries")
+    parser.add_argument("--min-examples", type=int, default=TOPIC_MIN_EXAMPLES,
+                        help="Labelled summaries a topic needs to get a centroid")
+
+    args = parser.parse_args()
+    if not args.build:
+        parser.print_help()
+    else:
+        counts = topic_classifier.build(summaries_collection, args.min_examples)
+        for topic, count in sorted(counts.items(), key=lambda item: -item[1]):
+            marker = "" if count >= args.min_examples else " (too few, skipped)"
+            print(f"{topic}: {count}{marker}")
+        print(f"{len(topic_classifier)} topic centroids stored")
@@ -0,0 +1,222 @@
+"""
+Incrementally maintained user preference vectors.
+
+Each user document carries a `preference` field holding a running weighted
+sum of the embeddings of items they liked or read, decayed exponentially
+with PREFERENCE_HALF_LIFE_DAYS, plus its norm. When each like happened is
+kept too, so an unlike subtracts exactly what that like still contributes.
+Feed and recommendation code can score against it with one dot product
+instead of re-embedding the user's history.
+
+Rebuild every user (e.g. after changing weights):
+    python -m app.utils.user_preferences --rebuild
+"""
+import os
+import argparse
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pytz
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.db.mongodb import users_collection, summaries_collection
+from app.db.embedding_codec import encode_embedding, decode_embedding
+
+logger = logging.getLogger("user_preferences")
+
+PREFERENCE_HALF_LIFE_DAYS = float(os.getenv("PREFERENCE_HALF_LIFE_DAYS", "14"))
+
+#contribution of each interaction to the preference sum
+INTERACTION_WEIGHTS = {
+    "like": 1.0,
+    "read": 0.25,
+}
+
+#optimistic-concurrency retries when two interactions for one user race
+_MAX_UPDATE_ATTEMPTS = 5
+
+
+def _as_summary_id(item_id: str):
+    try:
+        return ObjectId(item_id)
+    except (InvalidId, TypeError):
+        return None
+
+
+def item_embeddings(item_ids: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Normalized embeddings for liked/read items. Summary ids use the stored
+    summary embedding; anything else (e.g. a liked topic string) is embedded
+    as text, all in one batch.
+    """
+    vectors = {}
+    summary_ids = {item_id: _as_summary_id(item_id) for item_id in item_ids}
+    object_ids = [oid for oid in summary_ids.values() if oid is not None]
+    if object_ids:
+        for doc in summaries_collection.find({"_id": {"$in": object_ids}}, {"embedding": 1}):
+            vector = decode_embedding(doc.get("embedding"))
+            if vector is not None:
+                vectors[str(doc["_id"])] = vector
+
+    texts = [item_id for item_id in item_ids if item_id not in vectors and summary_ids[item_id] is None]
+    if texts:
+        from app.utils.embedder import get_embeddings
+        for text, vector in zip(texts, get_embeddings(texts)):
+            vectors[text] = vector
+
+    for item_id, vector in vectors.items():
+        norm = np.linalg.norm(vector)
+        vectors[item_id] = vector / norm if norm else vector
+    return vectors
+
+
+def _decay(elapsed_seconds: float) -> float:
+    if elapsed_seconds <= 0:
+        return 1.0
+    return 0.5 ** (elapsed_seconds / 86400.0 / PREFERENCE_HALF_LIFE_DAYS)
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return pytz.UTC.localize(value)
+    return value
+
+
+def update_user_preference(user_filter: dict, item_id: str, interaction: str, at: datetime = None) -> bool:
+    """
+    Fold one interaction ("like", "unlike" or "read") into the user's
+    preference vector. `user_filter` selects the user document, e.g.
+    {"email": ...} or {"user_id": ...}.
+    """
+    vector = item_embeddings([item_id]).get(item_id)
+    if vector is None:
+        logger.debug(f"No embedding for item {item_id}; preference unchanged")
+        return False
+    at = at or datetime.now(pytz.UTC)
+
+    for _ in range(_MAX_UPDATE_ATTEMPTS):
+        user = users_collection.find_one(user_filter, {"preference": 1, "email": 1, "summaries_read": 1})
+        if not user:
+            return False
+        current = user.get("preference") or {}
+        total = decode_embedding(current.get("vector"))
+        version = current.get("version", 0)
+        liked = [entry for entry in current.get("liked", []) if entry["item"] != item_id]
+
+        if total is None or total.shape != vector.shape:
+            total = np.zeros_like(vector)
+            weight_sum = 0.0
+        else:
+            updated_at = _aware(current.get("updated_at"))
+            decay = _decay((at - updated_at).total_seconds()) if updated_at else 1.0
+            total = total * decay
+            weight_sum = current.get("weight", 0.0) * decay
+
+        if interaction == "unlike":
+            liked_at = next((_aware(entry["at"]) for entry in current.get("liked", []) if entry["item"] == item_id), None)
+            if liked_at is None:
+                #liked before like times were recorded; recompute from the remaining likes instead
+                return rebuild_user_preference(user)
+            weight = -INTERACTION_WEIGHTS["like"] * _decay((at - liked_at).total_seconds())
+        else:
+            weight = INTERACTION_WEIGHTS[interaction]
+            if interaction == "like":
+                liked.append({"item": item_id, "at": at})
+
+        total = total + weight * vector
+        preference = {
+            "vector": encode_embedding(total, "float32"),
+            "norm": float(np.linalg.norm(total)),
+            "weight": max(0.0, weight_sum + weight),
+            "liked": liked,
+            "updated_at": at,
+            "version": version + 1,
+        }
+        #only apply if nobody else updated the preference since we read it
+        result = users_collection.update_one(
+            {"_id": user["_id"], "preference.version": version} if version
+            else {"_id": user["_id"], "preference.version": {"$exists": False}},
+            {"$set": {"preference": preference}}
+        )
+        if result.modified_count:
+            return True
+    logger.warning(f"Gave up updating preference for {user_filter} after {_MAX_UPDATE_ATTEMPTS} attempts")
+    return False
+
+
+def get_user_preference_vector(user_filter: dict) -> Optional[np.ndarray]:
+    """The user's unit-length preference vector, or None if they have no usable history."""
+    user = users_collection.find_one(user_filter, {"preference": 1})
+    preference = (user or {}).get("preference") or {}
+    vector = decode_embedding(preference.get("vector"))
+    norm = preference.get("norm", 0.0)
+    if vector is None or not norm or preference.get("weight", 0.0) <= 0:
+        return None
+    return vector / norm
+
+
+def rebuild_user_preference(user: dict) -> bool:
+    """Recompute one user's preference from their current likes and read history."""
+    from app.db.likes_db import get_liked_articles
+
+    liked = get_liked_articles(user["email"]) if user.get("email") else []
+    read = user.get("summaries_read", [])
+    vectors = item_embeddings(list(dict.fromkeys(liked + read)))
+
+    total = None
+    weight_sum = 0.0
+    #likes and reads carry no timestamps, so history is folded in undecayed as of now
+    for item_ids, weight in ((liked, INTERACTION_WEIGHTS["like"]), (read, INTERACTION_WEIGHTS["read"])):
+        for item_id in item_ids:
+            vector = vectors.get(item_id)
+            if vector is None:
+                continue
+            total = weight * vector if total is None else total + weight * vector
+            weight_sum += weight
+
+    if total is None:
+        users_collection.update_one({"_id": user["_id"]}, {"$unset": {"preference": ""}})
+        return False
+    version = ((user.get("preference") or {}).get("version") or 0) + 1
+    now = datetime.now(pytz.UTC)
+    users_collection.update_one(
+        {"_id": user["_id"]},
+        {"$set": {"preference": {
+            "vector": encode_embedding(total, "float32"),
+            "norm": float(np.linalg.norm(total)),
+            "weight": weight_sum,
+            "liked": [{"item": item_id, "at": now} for item_id in dict.fromkeys(liked) if item_id in vectors],
+            "updated_at": now,
+            "version": version,
+        }}}
+    )
+    return True
+
+
+def rebuild_all_preferences(user_filter: dict = None) -> int:
+    rebuilt = 0
+    cursor = users_collection.find(user_filter or {}, {"email": 1, "summaries_read": 1, "preference.version": 1})
+    for user in cursor:
+        try:
+            if rebuild_user_preference(user):
+                rebuilt += 1
+        except Exception as e:
+            logger.error(f"Error rebuilding preference for {user.get('email')}: {e}")
+    return rebuilt
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain user preference vectors")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Recompute preference vectors from likes and read history")
+    parser.add_argument("--email", help="Only rebuild this user")
+
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+    else:
+        count = rebuild_all_preferences({"email": args.email} if args.email else None)
+        print(f"Rebuilt preference vectors for {count} users")
@@ -2,9 +2,9 @@ import os
 import chromadb
 
 try:
-    from .embedder import get_embedding
+    from .embedder import get_embedding, get_embeddings
 except ImportError:
-    from app.utils.embedder import get_embedding
+    from app.utils.embedder import get_embedding, get_embeddings
 
 client = chromadb.PersistentClient(path="chromadb")
 
@@ -21,10 +21,9 @@ def add_articles(articles: list[dict]):
     ids       = [a["id"] for a in articles]
     metadatas = [{"title": a["title"]} for a in articles]
     documents = [a["content"] for a in articles]
-    embeddings = [
-        get_embedding(a["title"] + "\n" + a["content"])
-        for a in articles
-    ]
+    embeddings = get_embeddings(
+        [a["title"] + "\n" + a["content"] for a in articles]
+    ).tolist()
 
     collection.add(
         ids=ids,
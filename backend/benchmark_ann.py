@@ -0,0 +1,93 @@
+# benchmark_ann.py
+# Compares the IVF summary index against exact search: recall@k and per-query latency
+# for a range of nprobe values. Runs on synthetic clustered vectors by default, or on
+# the live summary embeddings with --source mongo.
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Add the root directory to the Python path
+root_dir = Path(__file__).parent
+sys.path.append(str(root_dir))
+
+from app.db.ivf_index import IVFIndex
+
+
+def synthetic_matrix(rows: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    matrix = centers[rng.integers(0, clusters, rows)] + 0.5 * rng.normal(size=(rows, dim))
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix.astype(np.float32)
+
+
+def mongo_matrix() -> np.ndarray:
+    from app.db.mongodb import summary_index
+    summary_index.load()
+    return np.array(summary_index._matrix[:len(summary_index)])
+
+
+def exact_top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = matrix @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def ivf_top_k(ivf: IVFIndex, matrix: np.ndarray, query: np.ndarray, k: int, nprobe: int) -> np.ndarray:
+    rows = ivf.candidates(query, nprobe)
+    if len(rows) <= k:
+        return rows
+    scores = matrix[rows] @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return rows[top[np.argsort(-scores[top])]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency benchmark for the IVF summary index")
+    parser.add_argument("--source", choices=["synthetic", "mongo"], default="synthetic")
+    parser.add_argument("--rows", type=int, default=200_000, help="Synthetic rows")
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic dimension")
+    parser.add_argument("--clusters", type=int, default=200, help="Synthetic topic clusters")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default 4*sqrt(rows))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    matrix = mongo_matrix() if args.source == "mongo" else synthetic_matrix(args.rows, args.dim, args.clusters)
+    if len(matrix) <= args.k:
+        print(f"Need more than {args.k} rows to benchmark, found {len(matrix)}")
+        return 1
+
+    rng = np.random.default_rng(1)
+    if args.queries > len(matrix):
+        print(f"Only {len(matrix)} rows; using {len(matrix)} queries instead of {args.queries}")
+    queries = matrix[rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    ivf = IVFIndex(nlist=args.nlist)
+    ivf.train(matrix)
+    print(f"{len(matrix)} rows x {matrix.shape[1]} dims, {ivf.nlist} lists, trained in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    truth = [set(exact_top_k(matrix, q, args.k).tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"{'exact':>10}  recall@{args.k}=1.000  {exact_ms:8.3f} ms/query")
+
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        found = [set(ivf_top_k(ivf, matrix, q, args.k, nprobe).tolist()) for q in queries]
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(f & t) / args.k for f, t in zip(found, truth)])
+        print(f"nprobe={nprobe:<4}  recall@{args.k}={recall:.3f}  {ms:8.3f} ms/query  ({exact_ms / ms:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
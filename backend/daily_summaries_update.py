@@ -23,7 +23,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger("daily_updates")
 
-def main():
+# Topics fetched and summarized at once; Gemini request rates are limited in gemini_client
+DAILY_CONCURRENCY = int(os.getenv("DAILY_CONCURRENCY", "8"))
+
+def assign_articles(fetched, claimed=()):
+    """
+    Give each article (by canonical URL) to exactly one topic so overlapping
+    keywords do not summarize the same story twice. Topics take turns by
+    result rank, so an article goes to the topic that ranked it highest.
+    `fetched` maps topic -> articles in rank order; URLs in `claimed` are
+    already covered by another summary. Returns topic -> unique articles.
+    """
+    from app.utils.news_fetcher import canonical_url
+    
+    claimed = {canonical_url(url) for url in claimed}
+    assigned = {topic: [] for topic in fetched}
+    depth = max((len(articles) for articles in fetched.values()), default=0)
+    for rank in range(depth):
+        for topic, articles in fetched.items():
+            if rank < len(articles):
+                url = canonical_url(articles[rank]["id"])
+                if url not in claimed:
+                    claimed.add(url)
+                    assigned[topic].append(articles[rank])
+    return assigned
+
+def main(resume=False):
     """Main function to run daily summary updates"""
     try:
         logger.info("Starting daily summaries update process")
@@ -34,61 +59,132 @@ def main():
         logger.info(f"Current time in Central Time: {now_central.strftime('%Y-%m-%d %H:%M:%S %Z')}")
         
         # Import news fetcher and summarizer here to avoid circular imports
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
         from app.utils.news_fetcher import fetch_articles, TECH_KEYWORDS
+        from app.db.mongodb import db
+        from app.db.job_runs import resume_or_start, add_items, advance_items, get_items, finish_run
+        summaries_collection = db['summaries']
         
         # Temporarily disabled due to PyTorch issues - replace with actual import when fixed
         # from app.utils.summarizer import summarize_topic
         # Use placeholder function for now
-        def summarize_topic(topic):
-            from app.db.mongodb import db
-            import datetime
+        def summarize_topic(topic, articles=None):
             return {
                 "title": f"Tech News Summary: {topic}",
                 "summary": f"This is a placeholder summary for {topic}. The full summarization feature will be implemented in production.",
                 "topic": topic,
-                "sources": ["placeholder-source.com"],
-                "date": datetime.datetime.now(),
-                "_id": f"temp-{topic}-summary"
+                "sources": [a["id"] for a in articles] if articles else ["placeholder-source.com"],
+                "urlToImage": next((a["urlToImage"] for a in articles or [] if a.get("urlToImage")), "")
             }
         
         # Log which topics we're processing
         logger.info(f"Processing {len(TECH_KEYWORDS)} topics: {', '.join(TECH_KEYWORDS)}")
         
-        # Process each topic
-        for topic in TECH_KEYWORDS:
-            try:
-                logger.info(f"Processing topic: {topic}")
-                
-                # Fetch articles for the topic
-                articles = fetch_articles(topic)
+        # Each topic is checkpointed: pending -> fetched -> summarized -> stored (or empty)
+        run_id, resumed = resume_or_start("daily_summaries", resume)
+        logger.info(f"{'Resuming' if resumed else 'Started'} run {run_id}")
+        if not resumed:
+            add_items(run_id, {topic: {"topic": topic} for topic in TECH_KEYWORDS}, "pending")
+        
+        failed = 0
+        with ThreadPoolExecutor(max_workers=DAILY_CONCURRENCY) as pool:
+            # Fetch every pending topic concurrently
+            pending = [item["key"] for item in get_items(run_id, ["pending"])]
+            #errors propagate so a failed fetch leaves its topic pending for --resume
+            futures = {pool.submit(fetch_articles, topic, raise_errors=True): topic for topic in pending}
+            for future in as_completed(futures):
+                topic = futures[future]
+                try:
+                    articles = future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Error fetching articles for topic {topic}: {str(e)}")
+                    continue
                 logger.info(f"Fetched {len(articles)} articles for topic {topic}")
-                
                 if articles:
-                    # Generate summary for the topic
-                    summary = summarize_topic(topic)
-                    
-                    # Save summary to database
-                    from app.db.mongodb import db
-                    summaries_collection = db['summaries']
-                    
-                    # Insert new summary with current date
-                    summary_id = summaries_collection.insert_one({
-                        "title": summary.get("title", f"Tech News: {topic}"),
-                        "summary": summary.get("summary", ""),
-                        "topic": topic,
-                        "sources": summary.get("sources", []),
-                        "date": datetime.datetime.now(pytz.UTC),
-                        "urlToImage": summary.get("urlToImage", "")
-                    }).inserted_id
-                    
-                    logger.info(f"Inserted new summary for {topic} with ID: {summary_id}")
+                    advance_items(run_id, {topic: {"articles": articles}}, "fetched")
                 else:
                     logger.warning(f"No articles found for topic: {topic}")
+                    advance_items(run_id, {topic: {"articles": 0}}, "empty")
+            
+            # Dedupe by URL across topics before summarizing; articles already
+            # covered by a summary from this run (when resuming) stay with it
+            items = get_items(run_id, ["fetched", "summarized", "stored"])
+            claimed = [url for item in items if item["state"] != "fetched" for url in item["result"].get("sources", [])]
+            fetched = {item["key"]: item["result"]["articles"] for item in items if item["state"] == "fetched"}
+            assigned = assign_articles(fetched, claimed)
+            total = sum(len(articles) for articles in fetched.values())
+            unique = sum(len(articles) for articles in assigned.values())
+            logger.info(f"{unique} unique articles across {len(fetched)} topics ({total - unique} duplicates dropped)")
+            duplicates_only = [topic for topic, articles in assigned.items() if not articles]
+            if duplicates_only:
+                logger.info(f"All articles already covered by other topics: {', '.join(duplicates_only)}")
+                advance_items(run_id, {topic: {"articles": 0, "duplicates": len(fetched[topic])} for topic in duplicates_only}, "empty")
             
-            except Exception as e:
-                logger.error(f"Error processing topic {topic}: {str(e)}")
-                import traceback
-                logger.error(traceback.format_exc())
+            # Summarize the topics that still have articles of their own
+            futures = {
+                pool.submit(summarize_topic, topic, articles=articles): topic
+                for topic, articles in assigned.items() if articles
+            }
+            for future in as_completed(futures):
+                topic = futures[future]
+                try:
+                    advance_items(run_id, {topic: future.result()}, "summarized")
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Error summarizing topic {topic}: {str(e)}")
+        
+        # Store every summarized topic in one bulk write; upserting on
+        # (run, topic) means a resumed run never stores a topic twice
+        summarized = get_items(run_id, ["summarized"])
+        stored = []
+        if summarized:
+            now = datetime.datetime.now(pytz.UTC)
+            ops = [
+                UpdateOne(
+                    {"run_id": run_id, "topic": item["key"]},
+                    {"$set": {
+                        "title": item["result"].get("title", f"Tech News: {item['key']}"),
+                        "summary": item["result"].get("summary", ""),
+                        "topic": item["key"],
+                        "sources": item["result"].get("sources", []),
+                        "date": now,
+                        "urlToImage": item["result"].get("urlToImage", "")
+                    }},
+                    upsert=True
+                )
+                for item in summarized
+            ]
+            try:
+                summaries_collection.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                logger.error(f"Some topic summaries failed to store: {e.details.get('writeErrors')}")
+            ids = {
+                doc["topic"]: doc["_id"]
+                for doc in summaries_collection.find(
+                    {"run_id": run_id, "topic": {"$in": [item["key"] for item in summarized]}}, {"topic": 1}
+                )
+            }
+            #a topic whose upsert failed stays summarized and is stored again on --resume
+            stored = [item for item in summarized if ids.get(item["key"]) is not None]
+            if stored:
+                advance_items(run_id, {
+                    item["key"]: {"summary_id": str(ids[item["key"]]), "sources": item["result"].get("sources", [])}
+                    for item in stored
+                }, "stored")
+            unstored = len(summarized) - len(stored)
+            if unstored:
+                failed += unstored
+                logger.error(f"{unstored} topic summaries were not stored")
+            logger.info(f"Stored {len(stored)} topic summaries")
+        
+        if failed:
+            finish_run(run_id, "failed", summary={"failed_topics": failed})
+            logger.warning(f"{failed} topics failed; rerun with --resume to retry them")
+        else:
+            finish_run(run_id, summary={"stored_topics": len(stored)})
         
         logger.info("Daily summaries update completed successfully")
     
@@ -101,5 +197,17 @@ def main():
     return 0
 
 if __name__ == "__main__":
-    exit_code = main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Update the daily topic summaries")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the latest unfinished run from its checkpoints")
+    parser.add_argument("--status", action="store_true",
+                        help="Show the state of the latest run and exit")
+    args = parser.parse_args()
+    
+    if args.status:
+        from app.db.job_runs import format_run_status
+        print(format_run_status("daily_summaries"))
+        sys.exit(0)
+    exit_code = main(resume=args.resume)
     sys.exit(exit_code)
@@ -0,0 +1,21 @@
+from app.utils.news_fetcher import is_tech_related, match_tech_keywords
+
+
+def test_keywords_match_whole_words_only():
+    assert not is_tech_related("Send us an email about the rapid response")
+    assert is_tech_related("The new AI model ships today")
+
+
+def test_plurals_match_their_keyword():
+    assert match_tech_keywords("Startups ship new APIs") == {"startup": 1, "api": 1}
+
+
+def test_two_letter_acronyms_have_no_plural():
+    #'mls' is the soccer league and 'ais' ship tracking, not 'ml' or 'ai'
+    assert not is_tech_related("MLS soccer game tonight")
+    assert not is_tech_related("AIS vessel positions")
+    assert match_tech_keywords("MLS and AIS") == {}
+
+
+def test_phrase_does_not_also_count_its_words():
+    assert match_tech_keywords("Software engineering teams") == {"software engineering": 1}
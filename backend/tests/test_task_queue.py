@@ -0,0 +1,116 @@
+import inspect
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.db import task_queue
+from app.db.task_queue import (claim_task, claim_tasks, complete_tasks, enqueue_tasks, extend_leases,
+                               release_tasks, run_finished, run_task_counts, TASK_MAX_ATTEMPTS)
+
+
+@pytest.fixture(autouse=True)
+def tasks(monkeypatch):
+    #pymongo >= 4.9 passes a sort to bulk updates, which older mongomock does not accept
+    builder = mongomock.collection.BulkOperationBuilder
+    if "sort" not in inspect.signature(builder.add_update).parameters:
+        add_update = builder.add_update
+        monkeypatch.setattr(builder, "add_update",
+                            lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs))
+    collection = mongomock.MongoClient().db.job_tasks
+    monkeypatch.setattr(task_queue, "tasks_collection", collection)
+    monkeypatch.setattr(task_queue, "_indexed", False)
+    return collection
+
+
+def expire(tasks, task):
+    #as if the lease ran out
+    claim = tasks.find_one({"_id": task["_id"]})
+    tasks.update_one({"_id": task["_id"]}, {"$set": {"lease_until": claim["lease_until"].replace(year=2000)}})
+
+
+def test_claim_leases_tasks_in_order():
+    enqueue_tasks("prefetch", "run1", ["a", "b"])
+    first = claim_task("prefetch", "w1")
+    second = claim_task("prefetch", "w2")
+    assert (first["key"], first["worker"], first["attempts"]) == ("a", "w1", 1)
+    assert second["key"] == "b"
+    assert claim_task("prefetch", "w3") is None
+
+
+def test_enqueue_keeps_existing_tasks():
+    assert enqueue_tasks("prefetch", "run1", ["a"]) == 1
+    claim_task("prefetch", "w1")
+    assert enqueue_tasks("prefetch", "run1", ["a", "b"]) == 1
+    assert run_task_counts("run1") == {"queued": 1, "leased": 1, "done": 0, "failed": 0}
+
+
+def test_claim_tasks_stays_in_one_run():
+    enqueue_tasks("prefetch", "run1", ["a", "b"])
+    enqueue_tasks("prefetch", "run2", ["c"])
+    assert [t["key"] for t in claim_tasks("prefetch", "w1", 5)] == ["a", "b"]
+    assert [t["key"] for t in claim_tasks("prefetch", "w1", 5, run_id="run2")] == ["c"]
+
+
+def test_expired_lease_is_reclaimed(tasks):
+    enqueue_tasks("prefetch", "run1", ["a"])
+    task = claim_task("prefetch", "w1")
+    assert claim_task("prefetch", "w2") is None
+    expire(tasks, task)
+    reclaimed = claim_task("prefetch", "w2")
+    assert (reclaimed["key"], reclaimed["worker"], reclaimed["attempts"]) == ("a", "w2", 2)
+
+
+def test_extended_lease_is_not_reclaimed(tasks):
+    enqueue_tasks("prefetch", "run1", ["a"])
+    task = claim_task("prefetch", "w1")
+    expire(tasks, task)
+    assert extend_leases([task["_id"]], "w2") == 0
+    assert extend_leases([task["_id"]], "w1") == 1
+    assert claim_task("prefetch", "w2") is None
+
+
+def test_task_fails_after_last_lease_expires(tasks):
+    enqueue_tasks("prefetch", "run1", ["a"])
+    for attempt in range(TASK_MAX_ATTEMPTS):
+        task = claim_task("prefetch", f"w{attempt}")
+        expire(tasks, task)
+    assert claim_task("prefetch", "w9") is None
+    assert tasks.find_one({"key": "a"})["status"] == "failed"
+    assert run_finished("run1")
+
+
+def test_only_lease_holder_completes(tasks):
+    enqueue_tasks("prefetch", "run1", ["a"])
+    task = claim_task("prefetch", "w1")
+    expire(tasks, task)
+    reclaimed = claim_task("prefetch", "w2")
+    #the first worker lost the lease, so its late ack is ignored
+    assert complete_tasks([task["_id"]], "w1") == 0
+    assert not run_finished("run1")
+    assert complete_tasks([reclaimed["_id"]], "w2") == 1
+    assert run_finished("run1")
+    assert run_task_counts("run1")["done"] == 1
+
+
+def test_release_requeues_then_fails(tasks):
+    enqueue_tasks("prefetch", "run1", ["a"])
+    for attempt in range(1, TASK_MAX_ATTEMPTS):
+        task = claim_task("prefetch", "w1")
+        assert release_tasks([task["_id"]], "w1", "boom") == 0
+        assert tasks.find_one({"key": "a"})["status"] == "queued"
+    task = claim_task("prefetch", "w1")
+    assert release_tasks([task["_id"]], "w2", "boom") == 0
+    assert release_tasks([task["_id"]], "w1", "boom") == 1
+    doc = tasks.find_one({"key": "a"})
+    assert (doc["status"], doc["error"], doc["attempts"]) == ("failed", "boom", TASK_MAX_ATTEMPTS)
+    assert run_finished("run1")
+
+
+def test_completion_clears_released_error(tasks):
+    enqueue_tasks("prefetch", "run1", ["a"])
+    task = claim_task("prefetch", "w1")
+    release_tasks([task["_id"]], "w1", "boom")
+    task = claim_task("prefetch", "w1")
+    assert complete_tasks([task["_id"]], "w1") == 1
+    assert "error" not in tasks.find_one({"key": "a"})
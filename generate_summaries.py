@@ -3,16 +3,34 @@
 
 import sys
 import os
+import argparse
 sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
 
+parser = argparse.ArgumentParser(description="Generate today's summaries")
+parser.add_argument('--resume', action='store_true',
+                    help='Continue the latest unfinished prefetch run from its checkpoints')
+parser.add_argument('--status', action='store_true',
+                    help='Show the state of the latest prefetch run and exit')
+args = parser.parse_args()
+
 try:
     from app.utils.prefetch_job import prefetch_and_cache, check_todays_summaries
     
+    if args.status:
+        from app.db.job_runs import format_run_status
+        print(format_run_status("prefetch"))
+        sys.exit(0)
+    
     print("Checking if today's summaries exist...")
     existing_count = check_todays_summaries()
     print(f"Found {existing_count} existing summaries for today")
     
-    if existing_count == 0:
+    if args.resume:
+        print("Resuming the latest unfinished run...")
+        result = prefetch_and_cache(resume=True)
+        print(f"Generation result: {result}")
+        print(f"After generation: {check_todays_summaries()} summaries now exist for today")
+    elif existing_count == 0:
         print("No summaries found for today. Generating new ones...")
         result = prefetch_and_cache(force=False)
         print(f"Generation result: {result}")